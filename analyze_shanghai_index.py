@@ -6,6 +6,7 @@ import requests
 from datetime import datetime
 import logging
 import numpy as np
+import instock.core.crawling.kline_parser as kp
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
@@ -46,16 +47,9 @@ def fetch_sh_index_hist(start_date, end_date, index_code='000001'):
             return pd.DataFrame()
             
         # 解析数据
-        records = []
-        for line in data['data']['klines']:
-            fields = line.split(',')
-            records.append({
-                'date': fields[0],
-                'close': float(fields[2]),
-                'change_pct': float(fields[8])
-            })
-            
-        df = pd.DataFrame(records)
+        df = kp.parse_klines(data['data']['klines'], kp.KLINE_COLUMNS)
+        df = df[['日期', '收盘', '涨跌幅']]
+        df.columns = ['date', 'close', 'change_pct']
         df['date'] = pd.to_datetime(df['date'])
         return df
         
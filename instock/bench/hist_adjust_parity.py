@@ -0,0 +1,58 @@
+#!/usr/local/bin/python3
+# -*- coding: utf-8 -*-
+
+import os.path
+import sys
+import argparse
+import numpy as np
+
+cpath_current = os.path.dirname(os.path.dirname(__file__))
+cpath = os.path.abspath(os.path.join(cpath_current, os.pardir))
+sys.path.append(cpath)
+import instock.core.crawling.stock_hist_em as she
+import instock.core.storage.hist_store as hst
+
+__author__ = 'myh '
+__date__ = '2026/10/18 '
+
+# 本地计算的前复权价格(hist_store.adjust_hist)和东方财富接口返回的前复权价格对比，需要联网。
+# python instock/bench/hist_adjust_parity.py --start 20200101
+# 默认的股票有现金分红(贵州茅台、中国平安、格力电器)和送转股(宁德时代2022年10转增8、比亚迪)。
+# 接口价格保留2位小数，差别不超过 hist_store.ADJUST_API_TOLERANCE 为一致；
+# 同时列出只按前收盘价比值等比复权(不用分红送转数据)的差别。
+CODES = ('600519', '601318', '000651', '300750', '002594')
+PRICES = ('open', 'close', 'high', 'low')
+
+
+def max_diff(expect, result):
+    return max(float(np.max(np.abs(expect[name].values - result[name].values))) for name in PRICES)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='本地前复权和接口前复权价格对比')
+    parser.add_argument('--codes', default=','.join(CODES), help='股票代码，逗号分隔')
+    parser.add_argument('--start', default='20200101', help='开始日期 yyyymmdd')
+    args = parser.parse_args()
+
+    failed = 0
+    print(f"{'代码':<8}{'行数':>6}{'除权次数':>8}{'分红送转复权误差':>18}{'等比复权误差':>14}")
+    for code in args.codes.split(','):
+        raw = hst.normalize(she.stock_zh_a_hist(symbol=code, start_date=args.start, adjust=''))
+        expect = hst.normalize(she.stock_zh_a_hist(symbol=code, start_date=args.start, adjust='qfq'))
+        if raw is None or expect is None or not np.array_equal(raw['date'].values, expect['date'].values):
+            print(f"{code:<8}接口没有返回数据或者日期不一致")
+            failed += 1
+            continue
+        data = hst._add_factor(raw)
+        events = hst.get_events(code, data['date'].iloc[0])
+        diff = max_diff(expect, hst.adjust_hist(data, 'qfq', events=events))
+        ratio_diff = max_diff(expect, hst.adjust_hist(data, 'qfq'))
+        print(f"{code:<8}{len(data.index):>6}{len(events):>8}{diff:>18.4f}{ratio_diff:>14.4f}")
+        failed += diff > hst.ADJUST_API_TOLERANCE
+    print("结果一致" if failed == 0 else f"结果不一致：{failed}")
+    sys.exit(0 if failed == 0 else 1)
+
+
+# main函数入口
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+#!/usr/local/bin/python3
+# -*- coding: utf-8 -*-
+
+import os.path
+import sys
+import time
+import shutil
+import tempfile
+import argparse
+import concurrent.futures
+import numpy as np
+import pandas as pd
+
+cpath_current = os.path.dirname(os.path.dirname(__file__))
+cpath = os.path.abspath(os.path.join(cpath_current, os.pardir))
+sys.path.append(cpath)
+import instock.core.tablestructure as tbs
+import instock.core.storage.codec as cdc
+
+__author__ = 'myh '
+__date__ = '2026/10/18 '
+
+# 历史数据缓存序列化方式测试：生成全市场的模拟K线，测试每种方式的写入、多线程读取速度和磁盘占用。
+# python instock/bench/hist_codec_bench.py --stocks 5000 --days 730 --workers 16 --dir /data/tmp
+# 结果里选择读取最快的方式，设置环境变量 hist_cache_codec。
+
+
+def make_universe(stocks, days, seed=0):
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(end='2023-03-10', periods=days).strftime('%Y-%m-%d').values
+    columns = list(tbs.CN_STOCK_HIST_DATA['columns'])
+    universe = {}
+    for i in range(stocks):
+        close = np.round(10 * np.exp(np.cumsum(rng.normal(0, 0.02, days))), 2)
+        ups_downs = np.round(np.diff(close, prepend=close[0]), 2)
+        data = pd.DataFrame({
+            'date': dates,
+            'open': np.round(close * (1 + rng.normal(0, 0.01, days)), 2),
+            'close': close,
+            'high': np.round(close * (1 + np.abs(rng.normal(0, 0.01, days))), 2),
+            'low': np.round(close * (1 - np.abs(rng.normal(0, 0.01, days))), 2),
+            'volume': rng.integers(1000, 1000000, days).astype(np.int64),
+            'amount': np.round(rng.random(days) * 1e8, 1),
+            'amplitude': np.round(rng.random(days) * 10, 2),
+            'quote_change': np.round(ups_downs / close * 100, 2),
+            'ups_downs': ups_downs,
+            'turnover': np.round(rng.random(days) * 5, 2),
+        }, columns=columns)
+        universe[f"{i:06d}qfq"] = data
+    return universe
+
+
+def run(codec, universe, path, workers):
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    os.makedirs(path)
+    files = {k: os.path.join(path, f"{k}.{codec.suffix}") for k in universe}
+
+    start = time.time()
+    for k, data in universe.items():
+        codec.write(data, files[k])
+    write_time = time.time() - start
+    size = sum(os.path.getsize(f) for f in files.values())
+
+    start = time.time()
+    for f in files.values():
+        codec.read(f)
+    read_time = time.time() - start
+
+    start = time.time()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(codec.read, files.values()))
+    read_mt_time = time.time() - start
+
+    shutil.rmtree(path)
+    return write_time, read_time, read_mt_time, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description='历史数据缓存序列化方式测试')
+    parser.add_argument('--stocks', type=int, default=5000)
+    parser.add_argument('--days', type=int, default=730)
+    parser.add_argument('--workers', type=int, default=16)
+    parser.add_argument('--dir', default=None, help='测试目录，默认系统临时目录，应该和缓存在同一块磁盘')
+    parser.add_argument('--codecs', default=','.join(cdc.CODECS.keys()))
+    args = parser.parse_args()
+
+    universe = make_universe(args.stocks, args.days)
+    raw = sum(d.memory_usage(index=True, deep=True).sum() for d in universe.values())
+    root = tempfile.mkdtemp(prefix='instock_codec_', dir=args.dir)
+    print(f"{args.stocks}只股票 x {args.days}天，内存{raw / 1024 / 1024:.1f}MB，读取线程{args.workers}")
+    print(f"{'codec':<10}{'写入s':>10}{'读取s':>10}{'多线程读取s':>14}{'读取MB/s':>12}{'磁盘MB':>10}{'压缩比':>8}")
+    try:
+        for name in args.codecs.split(','):
+            codec = cdc.CODECS.get(name)
+            if codec is None or not codec.is_available():
+                print(f"{name:<10}依赖没有安装，跳过")
+                continue
+            write_time, read_time, read_mt_time, size = run(codec, universe, os.path.join(root, name), args.workers)
+            print(f"{name:<10}{write_time:>10.2f}{read_time:>10.2f}{read_mt_time:>14.2f}"
+                  f"{raw / 1024 / 1024 / read_mt_time:>12.1f}{size / 1024 / 1024:>10.1f}{raw / size:>8.2f}")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+# main函数入口
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+#!/usr/local/bin/python3
+# -*- coding: utf-8 -*-
+
+import os.path
+import sys
+import json
+import time
+import threading
+import argparse
+import concurrent.futures
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import requests
+
+cpath_current = os.path.dirname(os.path.dirname(__file__))
+cpath = os.path.abspath(os.path.join(cpath_current, os.pardir))
+sys.path.append(cpath)
+import instock.core.crawling.http_client as hc
+
+__author__ = 'myh '
+__date__ = '2026/10/18 '
+
+# HTTP 会话测试：本地启动一个模拟东方财富K线接口的服务，分别用 requests.get(每次新建连接)和共用连接池的
+# http_client.get 请求，比较每秒请求数。
+# python instock/bench/http_client_bench.py --requests 5000 --workers 9
+
+_KLINES = [f"2023-03-{d:02d},10.00,10.10,10.20,9.90,123456,124000000.00,3.00,1.00,0.10,0.50" for d in range(1, 31)]
+_BODY = json.dumps({'rc': 0, 'data': {'code': '000001', 'klines': _KLINES * 24}}).encode('utf-8')
+
+
+class _handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # 支持 keep-alive
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(_BODY)))
+        self.end_headers()
+        self.wfile.write(_BODY)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run(get, url, total, workers):
+    params = {'secid': '0.000001', 'klt': '101', 'fqt': '0'}
+
+    def fetch(i):
+        return len(get(url, params=params).json()['data']['klines'])
+
+    start = time.time()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(fetch, range(total)))
+    return total / (time.time() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='HTTP 会话连接池测试')
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=9)
+    args = parser.parse_args()
+
+    server = start_server()
+    url = f"http://127.0.0.1:{server.server_address[1]}/api/qt/stock/kline/get"
+    try:
+        before = run(requests.get, url, args.requests, args.workers)
+        after = run(hc.get, url, args.requests, args.workers)
+    finally:
+        server.shutdown()
+    print(f"{args.requests}个请求，{args.workers}个线程")
+    print(f"requests.get    {before:>10.1f} 请求/秒")
+    print(f"http_client.get {after:>10.1f} 请求/秒  {after / before:.2f}x")
+
+
+# main函数入口
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+#!/usr/local/bin/python3
+# -*- coding: utf-8 -*-
+
+import logging
+import os.path
+import sys
+import random
+import asyncio
+import argparse
+
+import tornado.httpserver
+import tornado.ioloop
+import tornado.web
+
+cpath_current = os.path.dirname(os.path.dirname(__file__))
+cpath = os.path.abspath(os.path.join(cpath_current, os.pardir))
+sys.path.append(cpath)
+import instock.core.crawling.http_record as hrec
+
+__author__ = 'myh '
+__date__ = '2026/10/18 '
+
+# 爬虫响应回放服务：用 http_record 录制的响应代替东方财富、新浪的接口，可以在没有外网的机器上压测和分析抓取。
+# 可以设置响应延迟、5xx 错误、429 限流、空数据和超时的比例，测试 http_client 的重试、限流和熔断。
+# python instock/bench/http_replay_server.py --record /data/record --latency 50 --jitter 20 --error-rate 0.01
+# http_replay=http://127.0.0.1:9989 http_cache=0 python instock/job/execute_daily_job.py
+
+# 东方财富接口没有数据时的返回
+EMPTY_BODY = b'{"rc":0,"rt":0,"svr":0,"lt":1,"full":0,"data":null}'
+
+
+class ReplayHandler(tornado.web.RequestHandler):
+    async def get(self, path):
+        opts = self.application.opts
+        stats = self.application.stats
+        stats['request'] += 1
+        delay = max(0.0, random.gauss(opts.latency, opts.jitter)) / 1000
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        roll = random.random()
+        for name, rate in (('error', opts.error_rate), ('throttle', opts.throttle_rate),
+                           ('empty', opts.empty_rate), ('hang', opts.hang_rate)):
+            if roll < rate:
+                stats[name] += 1
+                break
+            roll -= rate
+        else:
+            name = None
+        if name == 'error':
+            self.set_status(500)
+            return
+        if name == 'throttle':
+            self.set_status(429)
+            return
+        if name == 'empty':
+            self.set_header('Content-Type', 'application/json; charset=UTF-8')
+            self.write(EMPTY_BODY)
+            return
+        if name == 'hang':
+            await asyncio.sleep(opts.hang)  # 超过客户端读取超时，客户端会超时重试
+
+        key, text = hrec.get_key(f"http://{path}?{self.request.query}")
+        record = hrec.load(key, opts.record)
+        if record is None:
+            stats['miss'] += 1
+            logging.error(f"http_replay_server没有录制：{text}")
+            self.set_status(404)
+            return
+        meta, content = record
+        stats['hit'] += 1
+        if meta.get('content_type'):
+            self.set_header('Content-Type', meta['content_type'])
+        self.write(content)
+
+
+class Application(tornado.web.Application):
+    def __init__(self, opts):
+        self.opts = opts
+        self.stats = {'request': 0, 'hit': 0, 'miss': 0, 'error': 0, 'throttle': 0, 'empty': 0, 'hang': 0}
+        # 压测时不输出每个请求的访问日志
+        super(Application, self).__init__([(r"/(.+)", ReplayHandler)], log_function=lambda handler: None)
+
+
+def log_stats(stats):
+    print(' '.join(f"{k}={v}" for k, v in stats.items()), flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='爬虫响应回放服务')
+    parser.add_argument('--record', default=hrec.record_path, help='录制目录，默认环境变量 http_record')
+    parser.add_argument('--port', type=int, default=9989)
+    parser.add_argument('--latency', type=float, default=0, help='平均响应延迟ms')
+    parser.add_argument('--jitter', type=float, default=0, help='延迟标准差ms')
+    parser.add_argument('--error-rate', type=float, default=0, help='返回500的比例')
+    parser.add_argument('--throttle-rate', type=float, default=0, help='返回429的比例')
+    parser.add_argument('--empty-rate', type=float, default=0, help='返回空数据的比例')
+    parser.add_argument('--hang-rate', type=float, default=0, help='延迟 --hang 秒再返回的比例')
+    parser.add_argument('--hang', type=float, default=60, help='超时请求的延迟秒数')
+    parser.add_argument('--stats', type=float, default=10, help='输出统计的间隔秒数')
+    opts = parser.parse_args()
+    if not opts.record or not os.path.isdir(opts.record):
+        parser.error(f"录制目录不存在：{opts.record}")
+
+    app = Application(opts)
+    http_server = tornado.httpserver.HTTPServer(app)
+    http_server.listen(opts.port)
+    print(f"回放服务已启动：http://127.0.0.1:{opts.port}/ 录制目录：{opts.record}", flush=True)
+    if opts.stats > 0:
+        tornado.ioloop.PeriodicCallback(lambda: log_stats(app.stats), opts.stats * 1000).start()
+    tornado.ioloop.IOLoop.current().start()
+
+
+# main函数入口
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+#!/usr/local/bin/python3
+# -*- coding: utf-8 -*-
+
+import os.path
+import sys
+import time
+import argparse
+import tracemalloc
+import importlib.util
+import numpy as np
+
+cpath_current = os.path.dirname(os.path.dirname(__file__))
+cpath = os.path.abspath(os.path.join(cpath_current, os.pardir))
+sys.path.append(cpath)
+import instock.core.tablestructure as tbs
+import instock.core.indicator.calculate_indicator as idr
+from instock.bench.panel_indicator_parity import make_stocks
+
+__author__ = 'myh '
+__date__ = '2026/10/18 '
+
+# 单只股票指标计算(calculate_indicator.get_indicators / get_indicator)的耗时和内存峰值。
+# python instock/bench/indicator_kernel_bench.py --stocks 200 --days 500
+# --baseline 指定另一个版本的 calculate_indicator.py(例如 git show 导出的旧文件)，
+# 同样的数据分别计算，对比耗时、内存峰值，并检查两个版本的指标结果完全相同。
+# --columns kdjk,kdjd,kdjj,rsi_6,cci,cr,wr_6,vr 只计算部分指标(对比的版本仍然计算全部，只比较这些列)。
+
+
+def load_module(path):
+    spec = importlib.util.spec_from_file_location('baseline_calculate_indicator', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def run(module, data, stock_column, threshold, repeat, columns=None):
+    kwargs = {} if columns is None else {'columns': columns}
+    result = {}
+    start = time.time()
+    for _ in range(repeat):
+        for k, frame in data.items():
+            # 旧版本没有指定 end_date 时直接在输入的 DataFrame 上增加列，每次传入副本
+            result[k] = module.get_indicators(frame.copy(), threshold=threshold, **kwargs)
+    indicators_time = (time.time() - start) / repeat
+
+    start = time.time()
+    for _ in range(repeat):
+        for k, frame in data.items():
+            module.get_indicator(k, frame, stock_column)
+    indicator_time = (time.time() - start) / repeat
+
+    k, frame = next(iter(data.items()))
+    frame = frame.copy()
+    tracemalloc.start()
+    module.get_indicators(frame, threshold=threshold, **kwargs)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, indicators_time, indicator_time, peak
+
+
+def compare(expect, result):
+    failed = 0
+    for k, a in expect.items():
+        b = result.get(k)
+        if a is None or b is None:
+            failed += (a is None) != (b is None)
+            continue
+        for name in b.columns:
+            if name not in a.columns:
+                failed += 1
+                continue
+            x = a[name].values
+            y = b[name].values
+            if x.dtype.kind == 'f' or y.dtype.kind == 'f':
+                same = np.array_equal(x.astype(np.float64), y.astype(np.float64), equal_nan=True)
+            else:
+                same = np.array_equal(x, y)
+            if not same:
+                print(f"结果不同：{k[1]} {name}")
+                failed += 1
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='单只股票指标计算的耗时和内存')
+    parser.add_argument('--stocks', type=int, default=200)
+    parser.add_argument('--days', type=int, default=500)
+    parser.add_argument('--threshold', type=int, default=360, help='get_indicators 返回的行数')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--baseline', default=None, help='对比的 calculate_indicator.py 文件')
+    parser.add_argument('--columns', default=None, help='只计算的指标，逗号分隔，默认全部')
+    args = parser.parse_args()
+
+    data = make_stocks(args.stocks, args.days, args.seed)
+    columns = None if args.columns is None else tuple(args.columns.split(','))
+    stock_column = ['date', 'code'] + list(tbs.STOCK_STATS_DATA['columns'] if columns is None else columns)
+    modules = [('当前', idr, columns)]
+    if args.baseline is not None:
+        modules.insert(0, ('对比', load_module(args.baseline), None))
+
+    print(f"{len(data)}只股票 x {args.days}天，返回{args.threshold}行")
+    print(f"{'版本':<8}{'get_indicators(ms/只)':>24}{'get_indicator(ms/只)':>24}{'内存峰值(KB)':>16}")
+    results = []
+    for name, module, module_columns in modules:
+        result, indicators_time, indicator_time, peak = run(module, data, stock_column, args.threshold, args.repeat,
+                                                            module_columns)
+        results.append(result)
+        print(f"{name:<8}{indicators_time * 1000 / len(data):>24.3f}{indicator_time * 1000 / len(data):>24.3f}"
+              f"{peak / 1024:>16.1f}")
+
+    if len(results) > 1:
+        failed = compare(results[0], results[1])
+        print("结果一致" if failed == 0 else f"结果不一致：{failed}")
+        sys.exit(0 if failed == 0 else 1)
+
+
+# main函数入口
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+#!/usr/local/bin/python3
+# -*- coding: utf-8 -*-
+
+import os.path
+import sys
+import time
+import argparse
+import concurrent.futures
+import numpy as np
+import pandas as pd
+
+cpath_current = os.path.dirname(os.path.dirname(__file__))
+cpath = os.path.abspath(os.path.join(cpath_current, os.pardir))
+sys.path.append(cpath)
+import instock.core.crawling.kline_parser as kp
+
+__author__ = 'myh '
+__date__ = '2026/10/18 '
+
+# K线解析测试：生成东方财富格式的K线字符串，比较原来逐行 split + 逐列 pd.to_numeric 和 kline_parser 的耗时，
+# 并检查两种方式的结果完全一致。多线程一列是下载线程池里同时解析的情况，解析持有 GIL 的部分越少越快。
+# python instock/bench/kline_parser_bench.py --stocks 5000 --days 730 --workers 16
+
+
+def make_klines(stocks, days, seed=0):
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(end='2023-03-10', periods=days).strftime('%Y-%m-%d').values
+    payloads = []
+    for i in range(stocks):
+        close = 10 * np.exp(np.cumsum(rng.normal(0, 0.02, days)))
+        volume = rng.integers(1000, 1000000, days)
+        amount = rng.random(days) * 1e8
+        change = rng.normal(0, 2, days)
+        payloads.append([
+            f"{dates[j]},{close[j] * 0.99:.2f},{close[j]:.2f},{close[j] * 1.01:.2f},{close[j] * 0.98:.2f},"
+            f"{volume[j]},{amount[j]:.1f},{abs(change[j]) * 1.5:.2f},{change[j]:.2f},{close[j] * change[j] / 100:.2f},"
+            f"{rng.random() * 5:.2f}" for j in range(days)])
+    return payloads
+
+
+# 原来的解析方式
+def parse_split(lines, columns=kp.KLINE_COLUMNS):
+    data = pd.DataFrame([item.split(",") for item in lines])
+    data.columns = columns
+    for name in columns[1:]:
+        data[name] = pd.to_numeric(data[name])
+    return data
+
+
+def run(parse, payloads, workers):
+    start = time.time()
+    for lines in payloads:
+        parse(lines)
+    serial = time.time() - start
+    start = time.time()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(parse, payloads))
+    return serial, time.time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='K线解析测试')
+    parser.add_argument('--stocks', type=int, default=5000)
+    parser.add_argument('--days', type=int, default=730)
+    parser.add_argument('--workers', type=int, default=16)
+    args = parser.parse_args()
+
+    payloads = make_klines(args.stocks, args.days)
+    for lines in payloads[:100]:
+        pd.testing.assert_frame_equal(parse_split(lines), kp.parse_klines(lines))
+    print(f"{args.stocks}只股票 x {args.days}天，解析线程{args.workers}，结果一致")
+    print(f"{'方式':<14}{'单线程s':>10}{'多线程s':>10}{'每只ms':>10}")
+    for name, parse in (('split', parse_split), ('kline_parser', kp.parse_klines)):
+        serial, threaded = run(parse, payloads, args.workers)
+        print(f"{name:<14}{serial:>10.2f}{threaded:>10.2f}{serial / args.stocks * 1000:>10.3f}")
+
+
+# main函数入口
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,237 @@
+#!/usr/local/bin/python3
+# -*- coding: utf-8 -*-
+
+import os.path
+import sys
+import time
+import shutil
+import tempfile
+import argparse
+import datetime
+import numpy as np
+import pandas as pd
+
+cpath_current = os.path.dirname(os.path.dirname(__file__))
+cpath = os.path.abspath(os.path.join(cpath_current, os.pardir))
+sys.path.append(cpath)
+import instock.core.tablestructure as tbs
+import instock.core.indicator.calculate_indicator as idr
+import instock.core.indicator.panel_indicator as pid
+import instock.core.storage.hist_panel as hpl
+import instock.core.storage.indicator_state as ist
+from instock.bench.hist_codec_bench import make_universe
+
+__author__ = 'myh '
+__date__ = '2026/10/18 '
+
+# 全市场指标计算(panel_indicator)和逐只股票计算(calculate_indicator.get_indicator)的结果对比和耗时。
+# python instock/bench/panel_indicator_parity.py --stocks 300 --days 250
+# 模拟数据包括上市晚于开始日期、中间停牌、只有一行数据的股票，分别用字典数据和面板数据计算。
+# talib 不同版本的编译选项不同(例如乘加合并)，最后几位会有差别，按 rtol/atol 比较。
+# --incremental 3 检查最后3天逐日增量计算的结果和从全部历史数据计算的结果相同，状态保存在临时目录。
+# --rolling 20 模拟每日作业：历史数据的开始日期和结束日期每步都后移一天，每步有一只股票的历史价格变化(除权后前复权价格变化)
+# 需要重新计算。检查增量计算的结果和每只股票从状态记录的起点开始计算的结果相同，
+# 和起点无关的指标(ORIGIN_COLUMNS 以外)和90行窗口计算的结果相同。
+
+
+def make_stocks(stocks, days, seed=0):
+    rng = np.random.default_rng(seed)
+    universe = make_universe(stocks, days, seed)
+    data = {}
+    for i, (name, frame) in enumerate(universe.items()):
+        frame = frame.copy()
+        # 最高价、最低价包含开盘价和收盘价
+        frame['high'] = frame[['open', 'close', 'high']].max(axis=1)
+        frame['low'] = frame[['open', 'close', 'low']].min(axis=1)
+        frame['volume'] = frame['volume'].astype(np.float64)
+        if i % 7 == 1:
+            frame = frame.iloc[rng.integers(1, days - 1):]  # 新股
+        if i % 5 == 2:
+            frame = frame.drop(frame.index[rng.choice(len(frame.index) - 1, size=len(frame.index) // 10, replace=False)])
+        if i % 50 == 3:
+            frame = frame.tail(n=1)
+        frame = frame.reset_index(drop=True)
+        frame.loc[:, 'p_change'] = pd.Series(frame['close']).pct_change().fillna(0).values * 100
+        code = name[:6]
+        data[(frame['date'].values[-1], code, f"股票{code}")] = frame
+    return data
+
+
+def to_panel(data):
+    stock_keys = list(data.keys())
+    dates = np.unique(np.concatenate([data[k]['date'].values.astype(str) for k in stock_keys]))
+    size = (len(dates), len(stock_keys))
+    fields = {name: np.full(size, np.nan, order='F') for name in hpl.FIELDS}
+    for j, k in enumerate(stock_keys):
+        frame = data[k]
+        rows = np.searchsorted(dates, frame['date'].values.astype(str))
+        for name in hpl.FIELDS:
+            fields[name][rows, j] = frame[name].values
+    panel = hpl.HistPanel(None, dates.astype(object), [k[1] for k in stock_keys], [k[2] for k in stock_keys],
+                          set(), fields)
+    return panel.to_dict(stock_keys)
+
+
+def compare(expect, result, columns, rtol, atol):
+    failed = 0
+    missing = set(expect) ^ set(result)
+    if missing:
+        print(f"股票不一致：{sorted(missing)[:10]}")
+        failed += len(missing)
+    keys = [k for k in expect if k in result]
+    a = np.array([expect[k][columns].values.astype(np.float64) for k in keys])
+    b = np.array([result[k][columns].values.astype(np.float64) for k in keys])
+    print(f"{'指标':<16}{'最大绝对误差':>14}{'最大相对误差':>14}{'超出误差':>10}")
+    for i, name in enumerate(columns):
+        diff = np.abs(a[:, i] - b[:, i])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rel = np.where(np.abs(a[:, i]) > atol, diff / np.abs(a[:, i]), 0)
+        bad = int(np.sum(~np.isclose(b[:, i], a[:, i], rtol=rtol, atol=atol)))
+        failed += bad
+        if bad or diff.max(initial=0) > 0:
+            print(f"{name:<16}{diff.max(initial=0):>14.3e}{rel.max(initial=0):>14.3e}{bad:>10}")
+    return failed
+
+
+def check_incremental(data, stock_column, days):
+    columns = stock_column[2:]
+    dates = sorted(set(np.concatenate([frame['date'].values for frame in data.values()])))[-days:]
+    window = max(len(frame.index) for frame in data.values())
+    state_path = ist.indicator_state_path
+    ist.indicator_state_path = tempfile.mkdtemp(prefix='instock_state_')
+    failed = 0
+    try:
+        for date in dates:
+            date = datetime.datetime.strptime(date, "%Y-%m-%d").date()
+            start = time.time()
+            result = pid.get_indicator_data_incremental(data, stock_column, date=date)
+            use_time = time.time() - start
+            expect = pid.get_indicator_data(data, stock_column, date=date, window=window)
+            bad = len(set(expect) ^ set(result))
+            for k in expect:
+                if k in result and not np.array_equal(expect[k][columns].values, result[k][columns].values):
+                    bad += 1
+            print(f"增量计算{date}：{use_time:.2f}s，和全部历史数据计算不同的股票{bad}")
+            failed += bad
+    finally:
+        shutil.rmtree(ist.indicator_state_path, ignore_errors=True)
+        ist.indicator_state_path = state_path
+    return failed
+
+
+# 历史数据中 [start, end] 日期之间的行，没有数据的股票不返回
+def slice_stocks(data, start, end):
+    result = {}
+    for k, frame in data.items():
+        frame = frame.loc[(frame['date'] >= start) & (frame['date'] <= end)].reset_index(drop=True)
+        if len(frame.index) > 0:
+            result[k] = frame
+    return result
+
+
+def check_rolling(data, stock_column, days, rtol, atol):
+    columns = stock_column[2:]
+    windowed = [name for name in columns if name not in pid.ORIGIN_COLUMNS]
+    data = {k: frame.copy() for k, frame in data.items()}
+    dates = sorted(set(np.concatenate([frame['date'].values for frame in data.values()])))
+    length = len(dates) - days
+    keys = list(data)
+    state_path = ist.indicator_state_path
+    ist.indicator_state_path = tempfile.mkdtemp(prefix='instock_state_')
+    failed = 0
+    try:
+        for i in range(days + 1):
+            start, end = dates[i], dates[i + length - 1]
+            if i > 0:
+                # 除权后前复权价格整体变化，这只股票的状态和历史数据不一致，需要重新计算
+                frame = data[keys[i % len(keys)]]
+                for name in ('open', 'close', 'high', 'low'):
+                    frame[name] = frame[name].values * 0.9
+            window_data = slice_stocks(data, start, end)
+            date = datetime.datetime.strptime(end, "%Y-%m-%d").date()
+            result = pid.get_indicator_data_incremental(window_data, stock_column, date=date)
+            _, codes, state = ist.load_state((date + datetime.timedelta(days=1)).isoformat())
+            origin = dict(zip(codes, state['origin']))
+
+            # 每只股票从起点开始计算
+            from_origin = {k: frame.loc[(frame['date'] >= origin.get(k[1], start)) & (frame['date'] <= end)]
+                           for k, frame in data.items()}
+            from_origin = {k: frame.reset_index(drop=True) for k, frame in from_origin.items() if len(frame.index) > 0}
+            expect = pid.get_indicator_data(from_origin, stock_column, date=date,
+                                            window=max(len(frame.index) for frame in from_origin.values()))
+            bad = len(set(expect) ^ set(result))
+            for k in expect:
+                if k in result and not np.array_equal(expect[k][columns].values, result[k][columns].values):
+                    bad += 1
+
+            # 和起点无关的指标和90行窗口相同
+            baseline = pid.get_indicator_data(window_data, stock_column, date=date)
+            bad_windowed = 0
+            for k in baseline:
+                if k in result and not np.allclose(baseline[k][windowed].values.astype(np.float64),
+                                                   result[k][windowed].values.astype(np.float64), rtol=rtol, atol=atol):
+                    bad_windowed += 1
+            moved = sum(1 for k in window_data if origin.get(k[1], start) > dates[0])
+            print(f"开始日期{start}结束日期{end}：和从起点计算不同的股票{bad}，窗口指标和90行计算不同的股票{bad_windowed}，"
+                  f"起点晚于第一天的股票{moved}")
+            failed += bad + bad_windowed
+    finally:
+        shutil.rmtree(ist.indicator_state_path, ignore_errors=True)
+        ist.indicator_state_path = state_path
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='全市场指标计算和逐只股票计算的结果对比')
+    parser.add_argument('--stocks', type=int, default=300)
+    parser.add_argument('--days', type=int, default=250)
+    parser.add_argument('--date', default=None, help='计算日期 yyyy-mm-dd，默认最后一天')
+    parser.add_argument('--rtol', type=float, default=1e-9)
+    parser.add_argument('--atol', type=float, default=1e-9)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--incremental', type=int, default=0, help='检查最后几天的增量计算')
+    parser.add_argument('--rolling', type=int, default=0, help='历史数据的开始日期逐日后移，检查几天的增量计算')
+    args = parser.parse_args()
+
+    data = make_stocks(args.stocks, args.days, args.seed)
+    if args.date is None:
+        date = datetime.datetime.strptime(max(k[0] for k in data), "%Y-%m-%d").date()
+    else:
+        date = datetime.datetime.strptime(args.date, "%Y-%m-%d").date()
+    columns = list(tbs.STOCK_STATS_DATA['columns'])
+    stock_column = ['date', 'code'] + columns
+
+    start = time.time()
+    expect = {}
+    for k, frame in data.items():
+        r = idr.get_indicator(k, frame, stock_column, date=date)
+        if r is not None:
+            expect[k] = r
+    stock_time = time.time() - start
+
+    start = time.time()
+    result = pid.get_indicator_data(data, stock_column, date=date)
+    dict_time = time.time() - start
+
+    panel = to_panel(data)
+    start = time.time()
+    panel_result = pid.get_indicator_data(panel, stock_column, date=date)
+    panel_time = time.time() - start
+
+    print(f"{len(data)}只股票 x {args.days}天，计算日期{date}")
+    print(f"逐只计算{stock_time:.2f}s，全市场计算(字典){dict_time:.2f}s，全市场计算(面板){panel_time:.2f}s")
+    print("字典数据：")
+    failed = compare(expect, result, columns, args.rtol, args.atol)
+    print("面板数据：")
+    failed += compare(expect, panel_result, columns, args.rtol, args.atol)
+    if args.incremental > 0:
+        failed += check_incremental(panel, stock_column, args.incremental)
+    if args.rolling > 0:
+        failed += check_rolling(data, stock_column, args.rolling, args.rtol, args.atol)
+    print("结果一致" if failed == 0 else f"结果不一致：{failed}")
+    sys.exit(0 if failed == 0 else 1)
+
+
+# main函数入口
+if __name__ == '__main__':
+    main()
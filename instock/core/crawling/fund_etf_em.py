@@ -5,10 +5,32 @@ Date: 2023/1/4 12:18
 Desc: 东方财富-ETF 行情
 https://quote.eastmoney.com/sh513500.html
 """
+import time
+import threading
 from functools import lru_cache
 
 import pandas as pd
-import requests
+import instock.core.crawling.http_client as hc
+import instock.core.crawling.kline_parser as kp
+import instock.core.crawling.clist_parser as cp
+
+# 实时行情的字段：(接口字段, 列名, 类型)，按返回的列顺序，请求参数 fields 只取这些字段
+_SPOT_FIELDS = (
+    ("f12", "代码", cp.STR),
+    ("f14", "名称", cp.STR),
+    ("f2", "最新价", cp.NUM),
+    ("f3", "涨跌幅", cp.NUM),
+    ("f4", "涨跌额", cp.NUM),
+    ("f5", "成交量", cp.NUM),
+    ("f6", "成交额", cp.NUM),
+    ("f17", "开盘价", cp.NUM),
+    ("f15", "最高价", cp.NUM),
+    ("f16", "最低价", cp.NUM),
+    ("f18", "昨收", cp.NUM),
+    ("f8", "换手率", cp.NUM),
+    ("f21", "流通市值", cp.NUM),
+    ("f20", "总市值", cp.NUM),
+)
 
 
 def fund_etf_spot_em() -> pd.DataFrame:
@@ -30,62 +52,15 @@ def fund_etf_spot_em() -> pd.DataFrame:
         "wbp2u": "|0|0|0|web",
         "fid": "f3",
         "fs": "b:MK0021,b:MK0022,b:MK0023,b:MK0024",
-        "fields": "f1,f2,f3,f4,f5,f6,f7,f8,f9,f10,f12,f13,f14,f15,f16,f17,f18,f20,f21,f23,f24,f25,f22,f11,f62,f128,f136,f115,f152",
+        "fields": cp.get_fields_param(_SPOT_FIELDS),
         "_": "1672806290972",
     }
-    r = requests.get(url, params=params)
-    data_json = r.json()
-    temp_df = pd.DataFrame(data_json["data"]["diff"])
-    temp_df.rename(
-        columns={
-            "f12": "代码",
-            "f14": "名称",
-            "f2": "最新价",
-            "f3": "涨跌幅",
-            "f4": "涨跌额",
-            "f5": "成交量",
-            "f6": "成交额",
-            "f17": "开盘价",
-            "f15": "最高价",
-            "f16": "最低价",
-            "f18": "昨收",
-            "f8": "换手率",
-            "f21": "流通市值",
-            "f20": "总市值",
-        },
-        inplace=True,
-    )
-    temp_df = temp_df[
-        [
-            "代码",
-            "名称",
-            "最新价",
-            "涨跌幅",
-            "涨跌额",
-            "成交量",
-            "成交额",
-            "开盘价",
-            "最高价",
-            "最低价",
-            "昨收",
-            "换手率",
-            "流通市值",
-            "总市值",
-        ]
-    ]
-    temp_df["最新价"] = pd.to_numeric(temp_df["最新价"], errors="coerce")
-    temp_df["涨跌幅"] = pd.to_numeric(temp_df["涨跌幅"], errors="coerce")
-    temp_df["涨跌额"] = pd.to_numeric(temp_df["涨跌额"], errors="coerce")
-    temp_df["成交量"] = pd.to_numeric(temp_df["成交量"], errors="coerce")
-    temp_df["成交额"] = pd.to_numeric(temp_df["成交额"], errors="coerce")
-    temp_df["开盘价"] = pd.to_numeric(temp_df["开盘价"], errors="coerce")
-    temp_df["最高价"] = pd.to_numeric(temp_df["最高价"], errors="coerce")
-    temp_df["最低价"] = pd.to_numeric(temp_df["最低价"], errors="coerce")
-    temp_df["昨收"] = pd.to_numeric(temp_df["昨收"], errors="coerce")
-    temp_df["换手率"] = pd.to_numeric(temp_df["换手率"], errors="coerce")
-    temp_df["流通市值"] = pd.to_numeric(temp_df["流通市值"], errors="coerce")
-    temp_df["总市值"] = pd.to_numeric(temp_df["总市值"], errors="coerce")
-    return temp_df
+    r = hc.get(url, params=params)
+    return cp.parse_clist(r.content, _SPOT_FIELDS)
+
+# 上次重新下载 ETF 代码和市场标识映射的时间
+_refreshed = None
+_refresh_lock = threading.Lock()
 
 
 @lru_cache()
@@ -96,6 +71,31 @@ def _fund_etf_code_id_map_em() -> dict:
     :return: ETF 代码和市场标识映射
     :rtype: pandas.DataFrame
     """
+    return _fund_etf_code_id_map(hc.hcc.TTL_CODE_ID_MAP)
+
+
+def _fund_etf_code_id(symbol: str) -> int:
+    """
+    ETF 代码对应的市场标识，缓存的映射里没有时(缓存之后上市的 ETF)不使用缓存重新下载映射再查一次，
+    每个进程 REFRESH_CODE_ID_MAP 秒内最多重新下载一次，仍然没有时抛出 KeyError
+    :param symbol: ETF 代码
+    :type symbol: str
+    :return: 市场标识
+    :rtype: int
+    """
+    global _refreshed
+    code_id_dict = _fund_etf_code_id_map_em()
+    if symbol not in code_id_dict:
+        with _refresh_lock:
+            if _refreshed is None or time.monotonic() - _refreshed >= hc.hcc.REFRESH_CODE_ID_MAP:
+                _refreshed = time.monotonic()  # 下载失败也计时，不反复请求
+                _fund_etf_code_id_map_em.cache_clear()
+                _fund_etf_code_id_map(0)  # 有效期为0，重新请求并更新磁盘缓存
+        code_id_dict = _fund_etf_code_id_map_em()
+    return code_id_dict[symbol]
+
+
+def _fund_etf_code_id_map(ttl) -> dict:
     url = "http://88.push2.eastmoney.com/api/qt/clist/get"
     params = {
         "pn": "1",
@@ -111,10 +111,8 @@ def _fund_etf_code_id_map_em() -> dict:
         "fields": "f12,f13",
         "_": "1672806290972",
     }
-    r = requests.get(url, params=params)
-    data_json = r.json()
-    temp_df = pd.DataFrame(data_json["data"]["diff"])
-    temp_dict = dict(zip(temp_df["f12"], temp_df["f13"]))
+    r = hc.get(url, params=params, ttl=ttl)
+    temp_dict = {row["f12"]: row["f13"] for row in cp.get_rows(r.content)}
     return temp_dict
 
 def fund_etf_hist_em(
@@ -140,7 +138,6 @@ def fund_etf_hist_em(
     :return: 每日行情
     :rtype: pandas.DataFrame
     """
-    code_id_dict = _fund_etf_code_id_map_em()
     adjust_dict = {"qfq": "1", "hfq": "2", "": "0"}
     period_dict = {"daily": "101", "weekly": "102", "monthly": "103"}
     url = "http://push2his.eastmoney.com/api/qt/stock/kline/get"
@@ -150,43 +147,16 @@ def fund_etf_hist_em(
         "ut": "7eea3edcaed734bea9cbfc24409ed989",
         "klt": period_dict[period],
         "fqt": adjust_dict[adjust],
-        "secid": f"{code_id_dict[symbol]}.{symbol}",
+        "secid": f"{_fund_etf_code_id(symbol)}.{symbol}",
         "beg": start_date,
         "end": end_date,
         "_": "1623766962675",
     }
-    r = requests.get(url, params=params)
+    r = hc.get(url, params=params, retry_if=hc.empty_klines)
     data_json = r.json()
     if not (data_json["data"] and data_json["data"]["klines"]):
         return pd.DataFrame()
-    temp_df = pd.DataFrame([item.split(",") for item in data_json["data"]["klines"]])
-    temp_df.columns = [
-        "日期",
-        "开盘",
-        "收盘",
-        "最高",
-        "最低",
-        "成交量",
-        "成交额",
-        "振幅",
-        "涨跌幅",
-        "涨跌额",
-        "换手率",
-    ]
-    temp_df.index = pd.to_datetime(temp_df["日期"])
-    temp_df.reset_index(inplace=True, drop=True)
-
-    temp_df["开盘"] = pd.to_numeric(temp_df["开盘"])
-    temp_df["收盘"] = pd.to_numeric(temp_df["收盘"])
-    temp_df["最高"] = pd.to_numeric(temp_df["最高"])
-    temp_df["最低"] = pd.to_numeric(temp_df["最低"])
-    temp_df["成交量"] = pd.to_numeric(temp_df["成交量"])
-    temp_df["成交额"] = pd.to_numeric(temp_df["成交额"])
-    temp_df["振幅"] = pd.to_numeric(temp_df["振幅"])
-    temp_df["涨跌幅"] = pd.to_numeric(temp_df["涨跌幅"])
-    temp_df["涨跌额"] = pd.to_numeric(temp_df["涨跌额"])
-    temp_df["换手率"] = pd.to_numeric(temp_df["换手率"])
-    return temp_df
+    return kp.parse_klines(data_json["data"]["klines"], kp.KLINE_COLUMNS)
 
 
 def fund_etf_hist_min_em(
@@ -212,7 +182,6 @@ def fund_etf_hist_min_em(
     :return: 每日分时行情
     :rtype: pandas.DataFrame
     """
-    code_id_dict = _fund_etf_code_id_map_em()
     adjust_map = {
         "": "0",
         "qfq": "1",
@@ -226,10 +195,10 @@ def fund_etf_hist_min_em(
             "ut": "7eea3edcaed734bea9cbfc24409ed989",
             "ndays": "5",
             "iscr": "0",
-            "secid": f"{code_id_dict[symbol]}.{symbol}",
+            "secid": f"{_fund_etf_code_id(symbol)}.{symbol}",
             "_": "1623766962675",
         }
-        r = requests.get(url, params=params)
+        r = hc.get(url, params=params)
         data_json = r.json()
         temp_df = pd.DataFrame(
             [item.split(",") for item in data_json["data"]["trends"]]
@@ -264,12 +233,12 @@ def fund_etf_hist_min_em(
             "ut": "7eea3edcaed734bea9cbfc24409ed989",
             "klt": period,
             "fqt": adjust_map[adjust],
-            "secid": f"{code_id_dict[symbol]}.{symbol}",
+            "secid": f"{_fund_etf_code_id(symbol)}.{symbol}",
             "beg": "0",
             "end": "20500000",
             "_": "1630930917857",
         }
-        r = requests.get(url, params=params)
+        r = hc.get(url, params=params)
         data_json = r.json()
         temp_df = pd.DataFrame(
             [item.split(",") for item in data_json["data"]["klines"]]
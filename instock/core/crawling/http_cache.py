@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os.path
+import time
+import pickle
+import hashlib
+import logging
+import threading
+
+__author__ = 'myh '
+__date__ = '2026/10/18 '
+
+# 基础数据接口的响应磁盘缓存：代码和市场对照表、交易日历、分红配送、龙虎榜统计这类很少变化的数据，
+# 每个作业进程和 web 服务都会重新请求。缓存按 url 和参数保存响应内容，每个接口有自己的有效期，
+# 过期后服务器支持的话带 ETag/Last-Modified 做条件请求，返回 304 时继续使用缓存。
+# 由 http_client.get(url, params, ttl=秒) 使用，可以用环境变量 http_cache=0 关闭。
+cpath_current = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+http_cache_path = os.path.join(cpath_current, 'cache', 'http')
+
+enabled = os.environ.get('http_cache', '1') != '0'
+
+# 各接口的缓存有效期(秒)
+TTL_CODE_ID_MAP = 86400  # 代码和市场对照表，新股上市才会变化，查不到代码时不用缓存重新下载
+REFRESH_CODE_ID_MAP = 600  # 查不到代码时重新下载对照表的最短间隔，退市或者错误的代码不会每次都请求
+TTL_TRADE_DATE = 7 * 86400  # 交易日历，每年底公布下一年
+TTL_BONUS = 86400  # 分红配送，按报告期
+TTL_LHB = 12 * 3600  # 龙虎榜统计，按日期范围
+
+# 过期超过这个时间的缓存文件由 evict 删除
+STALE_EXPIRE = 30 * 86400
+
+_SUFFIX = '.pickle'
+_lock = threading.Lock()
+
+# 本进程的统计：hit 有效期内，revalidated 条件请求返回304，miss 重新下载。
+stats = {'hit': 0, 'revalidated': 0, 'miss': 0}
+
+
+def count(name):
+    with _lock:
+        stats[name] += 1
+
+
+def get_key(url, params=None):
+    text = url
+    if params:
+        text = f"{url}?{'&'.join(f'{k}={params[k]}' for k in sorted(params))}"
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def get_file(key):
+    return os.path.join(http_cache_path, f"{key}{_SUFFIX}")
+
+
+# 读取缓存项 {url, time, ttl, etag, last_modified, encoding, headers, content}，没有或者损坏返回 None。
+def load(key):
+    cache_file = get_file(key)
+    if not os.path.isfile(cache_file):
+        return None
+    try:
+        with open(cache_file, 'rb') as f:
+            return pickle.load(f)
+    except Exception as e:
+        logging.error(f"http_cache.load处理异常：{cache_file}{e}")
+        try:
+            os.remove(cache_file)
+        except OSError:
+            pass
+    return None
+
+
+def is_fresh(entry, ttl):
+    return time.time() - entry['time'] < ttl
+
+
+# 条件请求的请求头，服务器没有返回 ETag/Last-Modified 时为空。
+def validators(entry):
+    headers = {}
+    if entry.get('etag'):
+        headers['If-None-Match'] = entry['etag']
+    if entry.get('last_modified'):
+        headers['If-Modified-Since'] = entry['last_modified']
+    return headers
+
+
+# 保存响应，先写临时文件再改名，多个进程同时写不会读到写了一半的文件。
+def save(key, url, r, ttl):
+    entry = {
+        'url': url,
+        'time': time.time(),
+        'ttl': ttl,
+        'etag': r.headers.get('ETag'),
+        'last_modified': r.headers.get('Last-Modified'),
+        'encoding': r.encoding,
+        'headers': dict(r.headers),
+        'content': r.content,
+    }
+    _write(key, entry)
+    return entry
+
+
+# 条件请求返回304，缓存内容不变，重新计算有效期。
+def refresh(key, entry):
+    entry['time'] = time.time()
+    _write(key, entry)
+
+
+def _write(key, entry):
+    cache_file = get_file(key)
+    tmp_file = f"{cache_file}.tmp{os.getpid()}_{threading.get_ident()}"
+    try:
+        if not os.path.exists(http_cache_path):
+            os.makedirs(http_cache_path)
+        with open(tmp_file, 'wb') as f:
+            pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_file, cache_file)
+    except Exception as e:
+        logging.error(f"http_cache.save处理异常：{cache_file}{e}")
+        try:
+            os.remove(tmp_file)
+        except OSError:
+            pass
+
+
+# 删除过期很久的缓存文件和被杀进程留下的临时文件。
+def evict(limit=None):
+    if limit is None:
+        limit = STALE_EXPIRE
+    if not os.path.isdir(http_cache_path):
+        return 0
+    removed = 0
+    now = time.time()
+    with os.scandir(http_cache_path) as it:
+        for f in it:
+            if not f.is_file():
+                continue
+            try:
+                if f.name.endswith(_SUFFIX):
+                    entry = load(f.name[:-len(_SUFFIX)])
+                    if entry is not None and now - entry['time'] < entry['ttl'] + limit:
+                        continue
+                elif now - f.stat().st_mtime < 3600:
+                    continue
+                os.remove(f.path)
+                removed += 1
+            except OSError:
+                continue
+    logging.info(f"http_cache.evict删除缓存：{removed}项")
+    return removed
+
+
+def log_stats():
+    total = sum(stats.values())
+    if total > 0:
+        logging.info(f"http_cache缓存命中率：{(stats['hit'] + stats['revalidated']) / total:.2%}，"
+                     f"命中{stats['hit']}，304{stats['revalidated']}，下载{stats['miss']}")
@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import time
+import json
+import random
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+import instock.core.crawling.http_cache as hcc
+import instock.core.crawling.http_record as hrec
+
+__author__ = 'myh '
+__date__ = '2026/10/18 '
+
+# 爬虫共用的 HTTP 会话：按主机复用连接(keep-alive)，不再每个请求新建一个 TCP 连接。
+# 每个主机有令牌桶限速、并发数自适应(成功时加法增加，被限流时减半)、熔断(连续失败后暂停一段时间，之后自动恢复)，
+# 超时、5xx、429 和 retry_if 判断的空数据按指数退避加随机抖动重试。
+# 连接池大小、超时、限速等可以用环境变量覆盖。录制和回放响应见 http_record。
+pool_connections = 20  # 缓存连接池的主机数
+pool_maxsize = 64  # 每个主机保持的连接数，不小于抓取线程数
+connect_timeout = 5.0
+read_timeout = 30.0
+
+max_retries = 3  # 超时、5xx、429 重试次数
+empty_retries = 1  # retry_if 判断为空数据的重试次数，停牌股票确实没有数据
+backoff_base = 0.5  # 退避时间 backoff_base * 2^n 秒，再加随机抖动
+backoff_max = 30.0
+
+default_rate = 50.0  # 每个主机每秒请求数
+rate_limits = {}  # 主机 -> 每秒请求数，环境变量 http_rate_limits=push2his.eastmoney.com=50,finance.sina.com.cn=5
+
+concurrency_init = 8  # 每个主机初始并发数
+breaker_failures = 5  # 连续失败次数达到后熔断
+breaker_cooldown = 30.0  # 熔断暂停秒数，再次熔断时加倍
+breaker_cooldown_max = 300.0
+
+page_workers = 8  # 分页接口同时抓取的页数，实际并发还受主机并发数限制
+
+_env = os.environ.get('http_pool_connections')
+if _env is not None:
+    pool_connections = int(_env)
+_env = os.environ.get('http_pool_maxsize')
+if _env is not None:
+    pool_maxsize = int(_env)
+_env = os.environ.get('http_connect_timeout')
+if _env is not None:
+    connect_timeout = float(_env)
+_env = os.environ.get('http_read_timeout')
+if _env is not None:
+    read_timeout = float(_env)
+_env = os.environ.get('http_max_retries')
+if _env is not None:
+    max_retries = int(_env)
+_env = os.environ.get('http_rate')
+if _env is not None:
+    default_rate = float(_env)
+_env = os.environ.get('http_page_workers')
+if _env is not None:
+    page_workers = int(_env)
+_env = os.environ.get('http_rate_limits')
+if _env is not None:
+    for _item in _env.split(','):
+        _host, _rate = _item.split('=')
+        rate_limits[_host.strip()] = float(_rate)
+
+_session = None
+_lock = threading.Lock()
+_guards = {}
+
+
+# 单个主机的限速、并发和熔断状态，线程和协程共用。
+class host_guard:
+    def __init__(self, host, rate):
+        self.host = host
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.limit = float(concurrency_init)  # 当前允许的并发数
+        self.slow_start = True  # 第一次被限流前每次成功并发数加1，之后每轮加1
+        self.in_flight = 0
+        self.failures = 0  # 连续失败次数
+        self.open_until = 0.0  # 熔断到这个时间
+        self.cooldown = breaker_cooldown
+        self.cond = threading.Condition()
+        self.waiters = []  # 等待并发名额的协程：(事件循环, Future)
+
+    # 预约一个令牌，返回需要等待的秒数。令牌可以预支成负数，等待时间按排队的请求数计算。
+    def reserve(self):
+        with self.cond:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            delay = 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+            return max(delay, self.open_until - now)
+
+    def _try_enter(self):
+        if self.in_flight < max(1, int(self.limit)) and time.monotonic() >= self.open_until:
+            self.in_flight += 1
+            return True
+        return False
+
+    def enter(self):
+        with self.cond:
+            while not self._try_enter():
+                self.cond.wait(timeout=max(0.05, self.open_until - time.monotonic()))
+
+    # 协程不在事件循环里阻塞等待：没有名额时登记一个 Future，由 leave 通过 call_soon_threadsafe 唤醒，
+    # 熔断中按熔断结束时间超时后重试。self.cond 只用来保护状态，持有的时间很短。
+    async def enter_async(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            with self.cond:
+                if self._try_enter():
+                    return
+                waiter = loop.create_future()
+                self.waiters.append((loop, waiter))
+                wait = self.open_until - time.monotonic()
+            try:
+                await asyncio.wait_for(waiter, timeout=max(0.05, wait) if wait > 0 else None)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                with self.cond:
+                    if (loop, waiter) in self.waiters:
+                        self.waiters.remove((loop, waiter))
+
+    def is_open(self):
+        return time.monotonic() < self.open_until
+
+    # 请求结束。成功时并发数增加，被限流或超时时减半，连续失败达到次数后熔断。
+    def leave(self, ok, throttled):
+        with self.cond:
+            self.in_flight -= 1
+            if ok:
+                self.failures = 0
+                self.cooldown = breaker_cooldown
+                self.limit = min(float(pool_maxsize), self.limit + (1.0 if self.slow_start else 1.0 / self.limit))
+            elif throttled:
+                self.failures += 1
+                self.slow_start = False
+                self.limit = max(1.0, self.limit / 2)
+                if self.failures >= breaker_failures:
+                    self.open_until = time.monotonic() + self.cooldown
+                    logging.error(f"http_client熔断：{self.host}连续失败{self.failures}次，暂停{self.cooldown:.0f}秒")
+                    self.cooldown = min(breaker_cooldown_max, self.cooldown * 2)
+                    self.limit = 1.0  # 恢复后先用一个请求试探
+            self.cond.notify_all()
+            waiters, self.waiters = self.waiters, []
+        for loop, waiter in waiters:
+            try:
+                loop.call_soon_threadsafe(_wake, waiter)
+            except RuntimeError:
+                pass  # 事件循环已经关闭
+
+
+def _wake(waiter):
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+def get_guard(url):
+    host = urlparse(url).hostname
+    guard = _guards.get(host)
+    if guard is None:
+        with _lock:
+            guard = _guards.get(host)
+            if guard is None:
+                guard = host_guard(host, rate_limits.get(host, default_rate))
+                _guards[host] = guard
+    return guard
+
+
+def _backoff(attempt):
+    delay = min(backoff_max, backoff_base * (2 ** attempt))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def _new_session():
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def get_session():
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                _session = _new_session()
+    return _session
+
+
+# 东方财富K线接口没有数据或者被限流时返回 "data":null 或者空的 klines，用于 retry_if。
+def empty_klines(content):
+    return b'"data":null' in content or b'"klines":[]' in content
+
+
+# 代替 requests.get，没有指定超时的使用默认超时。retry_if(响应内容 bytes) 返回 True 时重试。
+# 重试用完后返回最后一次的响应，没有响应时抛出最后一次的异常。
+# 指定 ttl(秒) 时使用磁盘响应缓存，有效期内不请求，过期后做条件请求，
+# 请求失败(超时、连接错误、重试后仍是 5xx/429)或者主机熔断中时使用过期的缓存。
+def get(url, params=None, retry_if=None, ttl=None, **kwargs):
+    if ttl is None or not hcc.enabled:
+        return _get(url, params, retry_if, **kwargs)
+    key = hcc.get_key(url, params)
+    entry = hcc.load(key)
+    if entry is not None:
+        if hcc.is_fresh(entry, ttl):
+            hcc.count('hit')
+            return _cached_response(url, entry)
+        if get_guard(url).is_open():
+            logging.error(f"http_client.get处理异常：{url}熔断中使用过期缓存")
+            return _cached_response(url, entry)
+        headers = dict(kwargs.get('headers') or {})
+        headers.update(hcc.validators(entry))
+        kwargs['headers'] = headers
+    try:
+        r = _get(url, params, retry_if, **kwargs)
+    except (requests.Timeout, requests.ConnectionError) as e:
+        if entry is None:
+            raise
+        logging.error(f"http_client.get处理异常：{url}使用过期缓存{e}")
+        return _cached_response(url, entry)
+    if entry is not None and (r.status_code == 429 or r.status_code >= 500):
+        logging.error(f"http_client.get处理异常：{url}使用过期缓存{r.status_code}")
+        return _cached_response(url, entry)
+    if r.status_code == 304 and entry is not None:
+        hcc.count('revalidated')
+        hcc.refresh(key, entry)
+        return _cached_response(url, entry)
+    hcc.count('miss')
+    if r.status_code == 200 and (retry_if is None or not retry_if(r.content)):
+        hcc.save(key, url, r, ttl)
+    return r
+
+
+def _cached_response(url, entry):
+    r = requests.Response()
+    r.status_code = 200
+    r.url = url
+    r.headers = CaseInsensitiveDict(entry['headers'])
+    r.encoding = entry['encoding']
+    r._content = entry['content']
+    return r
+
+
+def _get(url, params=None, retry_if=None, **kwargs):
+    kwargs.setdefault('timeout', (connect_timeout, read_timeout))
+    guard = get_guard(url)
+    target = url if hrec.replay_url is None else hrec.replay(url)
+    r, error, empty = None, None, 0
+    for attempt in range(max_retries + 1):
+        delay = guard.reserve()
+        if delay > 0:
+            time.sleep(delay)
+        guard.enter()
+        ok, throttled = False, False
+        try:
+            r = get_session().get(target, params=params, **kwargs)
+            if r.status_code == 429 or r.status_code >= 500:
+                throttled = True
+            elif retry_if is not None and retry_if(r.content):
+                empty += 1
+                if empty > empty_retries:
+                    ok = True
+            else:
+                ok = True
+        except (requests.Timeout, requests.ConnectionError) as e:
+            r, error, throttled = None, e, True
+        finally:
+            guard.leave(ok, throttled)
+        if ok:
+            if hrec.record_path is not None and r.status_code == 200:
+                hrec.save(url, params, r.status_code, r.headers.get('Content-Type'), r.content)
+            return r
+        if attempt < max_retries:
+            time.sleep(_backoff(attempt))
+    if r is None:
+        raise error
+    return r
+
+
+# 协程版本，返回解析后的 json，重试规则和 get 相同。
+async def get_json_async(session, url, params=None, retry_if=None):
+    guard = get_guard(url)
+    target = url if hrec.replay_url is None else hrec.replay(url)
+    content, error, empty = None, None, 0
+    for attempt in range(max_retries + 1):
+        delay = guard.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        await guard.enter_async()
+        ok, throttled, error = False, False, None
+        try:
+            async with session.get(target, params=params) as r:
+                content = await r.read()
+                status, content_type = r.status, r.headers.get('Content-Type')
+                if r.status == 429 or r.status >= 500:
+                    throttled = True
+                    error = aiohttp.ClientResponseError(r.request_info, r.history, status=r.status)
+                elif retry_if is not None and retry_if(content):
+                    empty += 1
+                    if empty > empty_retries:
+                        ok = True
+                else:
+                    ok = True
+        except (asyncio.TimeoutError, aiohttp.ClientConnectionError) as e:
+            content, error, throttled = None, e, True
+        finally:
+            guard.leave(ok, throttled)
+        if ok:
+            if hrec.record_path is not None and status == 200:
+                hrec.save(url, params, status, content_type, content)
+            return json.loads(content)
+        if attempt < max_retries:
+            await asyncio.sleep(_backoff(attempt))
+    if content is None or error is not None:
+        raise error
+    return json.loads(content)
+
+
+# 东方财富数据中心分页接口的总页数和每页数据。
+def result_pages(data_json):
+    return int(data_json["result"]["pages"])
+
+
+def result_data(data_json):
+    return data_json["result"]["data"]
+
+
+# 分页接口：先取第一页得到总页数，其余页用线程池并发抓取，按页码顺序返回全部行(字典列表)，
+# 调用方最后一次生成 DataFrame，不在循环里 pd.concat。pages(第一页json) 返回总页数，rows(json) 返回一页的行，
+# ttl 同 get，每页分别缓存。
+def get_all_pages(url, params, page_key="pageNumber", pages=result_pages, rows=result_data, workers=None, ttl=None):
+    data_json = get(url, params=params, ttl=ttl).json()
+    total = pages(data_json)
+    data = list(rows(data_json) or [])
+    if total <= 1:
+        return data
+
+    def fetch(page):
+        _params = dict(params)
+        _params[page_key] = page
+        return rows(get(url, params=_params, ttl=ttl).json()) or []
+
+    if workers is None:
+        workers = page_workers
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, total - 1))) as executor:
+        for _data in executor.map(fetch, range(2, total + 1)):
+            data.extend(_data)
+    return data
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os.path
+import json
+import hashlib
+import logging
+import threading
+from urllib.parse import urlsplit, parse_qsl, urlencode
+import requests
+
+__author__ = 'myh '
+__date__ = '2026/10/18 '
+
+# 爬虫响应录制和回放，用于离线压测和性能分析。
+# 录制：设置环境变量 http_record=目录 后正常运行作业，http_client 把每个成功的响应保存到目录，
+#   http_record=/data/record python instock/job/execute_daily_job.py
+# 回放：用 instock/bench/http_replay_server.py 启动回放服务，设置环境变量 http_replay=回放服务地址，
+#   http_client 把请求发到回放服务，原来的主机名放在路径第一段，限速和并发仍然按原来的主机计算。
+#   http_replay=http://127.0.0.1:9989 http_cache=0 python instock/job/execute_daily_job.py
+record_path = os.environ.get('http_record')
+replay_url = os.environ.get('http_replay')
+if replay_url is not None:
+    replay_url = replay_url.rstrip('/')
+
+# 每次请求都变化的参数，不参与匹配，比如毫秒时间戳
+IGNORE_PARAMS = ('_',)
+
+_BODY_SUFFIX = '.body'
+_META_SUFFIX = '.json'
+
+
+# 请求的匹配键：主机、路径和排序后的参数，不区分 http/https，参数写在 url 里和放在 params 里一样。
+def get_key(url, params=None):
+    parts = urlsplit(requests.Request('GET', url, params=params).prepare().url)
+    query = sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k not in IGNORE_PARAMS)
+    text = f"{parts.hostname}{parts.path}?{urlencode(query)}"
+    return hashlib.sha1(text.encode('utf-8')).hexdigest(), text
+
+
+# 回放地址：http://回放服务/原主机/原路径，参数不变。
+def replay(url):
+    parts = urlsplit(url)
+    return f"{replay_url}/{parts.netloc}{parts.path}" + (f"?{parts.query}" if parts.query else "")
+
+
+def _write(file, data):
+    tmp_file = f"{file}.tmp{os.getpid()}_{threading.get_ident()}"
+    with open(tmp_file, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_file, file)
+
+
+# 保存响应内容，同一个请求多次录制时保留最后一次。
+def save(url, params, status, content_type, content, path=None):
+    if path is None:
+        path = record_path
+    key, text = get_key(url, params)
+    try:
+        if not os.path.exists(path):
+            os.makedirs(path)
+        _write(os.path.join(path, f"{key}{_BODY_SUFFIX}"), content)
+        meta = {'request': text, 'status': status, 'content_type': content_type, 'size': len(content)}
+        _write(os.path.join(path, f"{key}{_META_SUFFIX}"), json.dumps(meta, ensure_ascii=False).encode('utf-8'))
+    except Exception as e:
+        logging.error(f"http_record.save处理异常：{text}{e}")
+
+
+# 读取录制的响应，返回 (meta, content)，没有录制返回 None。
+def load(key, path=None):
+    if path is None:
+        path = record_path
+    meta_file = os.path.join(path, f"{key}{_META_SUFFIX}")
+    if not os.path.isfile(meta_file):
+        return None
+    try:
+        with open(meta_file, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        with open(os.path.join(path, f"{key}{_BODY_SUFFIX}"), 'rb') as f:
+            return meta, f.read()
+    except Exception as e:
+        logging.error(f"http_record.load处理异常：{meta_file}{e}")
+    return None
@@ -4,12 +4,61 @@
 Date: 2022/6/19 15:26
 Desc: 东方财富网-行情首页-沪深京 A 股
 """
-import requests
+import instock.core.crawling.http_client as hc
+import instock.core.crawling.kline_parser as kp
+import instock.core.crawling.clist_parser as cp
+import time
+import threading
 import pandas as pd
 
 from functools import lru_cache
 
 
+# 实时行情的字段：(接口字段, 列名, 类型)，按返回的列顺序
+_SPOT_FIELDS = (
+    ("f12", "代码", cp.STR),
+    ("f14", "名称", cp.STR),
+    ("f2", "最新价", cp.NUM),
+    ("f3", "涨跌幅", cp.NUM),
+    ("f4", "涨跌额", cp.NUM),
+    ("f5", "成交量", cp.NUM),
+    ("f6", "成交额", cp.NUM),
+    ("f7", "振幅", cp.NUM),
+    ("f8", "换手率", cp.NUM),
+    ("f10", "量比", cp.NUM),
+    ("f17", "今开", cp.NUM),
+    ("f15", "最高", cp.NUM),
+    ("f16", "最低", cp.NUM),
+    ("f18", "昨收", cp.NUM),
+    ("f22", "涨速", cp.NUM),
+    ("f11", "5分钟涨跌", cp.NUM),
+    ("f24", "60日涨跌幅", cp.NUM),
+    ("f25", "年初至今涨跌幅", cp.NUM),
+    ("f9", "市盈率动", cp.NUM),
+    ("f115", "市盈率TTM", cp.NUM),
+    ("f114", "市盈率静", cp.NUM),
+    ("f23", "市净率", cp.NUM),
+    ("f112", "每股收益", cp.NUM),
+    ("f113", "每股净资产", cp.NUM),
+    ("f61", "每股公积金", cp.NUM),
+    ("f48", "每股未分配利润", cp.NUM),
+    ("f37", "加权净资产收益率", cp.NUM),
+    ("f49", "毛利率", cp.NUM),
+    ("f57", "资产负债率", cp.NUM),
+    ("f40", "营业收入", cp.NUM),
+    ("f41", "营业收入同比增长", cp.NUM),
+    ("f45", "归属净利润", cp.NUM),
+    ("f46", "归属净利润同比增长", cp.NUM),
+    ("f221", "报告期", cp.DATE),
+    ("f38", "总股本", cp.NUM),
+    ("f39", "已流通股份", cp.NUM),
+    ("f20", "总市值", cp.NUM),
+    ("f21", "流通市值", cp.NUM),
+    ("f100", "所处行业", cp.STR),
+    ("f26", "上市时间", cp.DATE),
+)
+
+
 def stock_zh_a_spot_em() -> pd.DataFrame:
     """
     东方财富网-沪深京 A 股-实时行情
@@ -31,136 +80,12 @@ def stock_zh_a_spot_em() -> pd.DataFrame:
         "fields": "f2,f3,f4,f5,f6,f7,f8,f9,f10,f11,f12,f14,f15,f16,f17,f18,f20,f21,f22,f23,f24,f25,f26,f37,f38,f39,f40,f41,f45,f46,f48,f49,f57,f61,f100,f112,f113,f114,f115,f221",
         "_": "1623833739532",
     }
-    r = requests.get(url, params=params)
-    data_json = r.json()
-    if not data_json["data"]["diff"]:
-        return pd.DataFrame()
-    temp_df = pd.DataFrame(data_json["data"]["diff"])
-    temp_df.columns = [
-        "最新价",
-        "涨跌幅",
-        "涨跌额",
-        "成交量",
-        "成交额",
-        "振幅",
-        "换手率",
-        "市盈率动",
-        "量比",
-        "5分钟涨跌",
-        "代码",
-        "名称",
-        "最高",
-        "最低",
-        "今开",
-        "昨收",
-        "总市值",
-        "流通市值",
-        "涨速",
-        "市净率",
-        "60日涨跌幅",
-        "年初至今涨跌幅",
-        "上市时间",
-        "加权净资产收益率",
-        "总股本",
-        "已流通股份",
-        "营业收入",
-        "营业收入同比增长",
-        "归属净利润",
-        "归属净利润同比增长",
-        "每股未分配利润",
-        "毛利率",
-        "资产负债率",
-        "每股公积金",
-        "所处行业",
-        "每股收益",
-        "每股净资产",
-        "市盈率静",
-        "市盈率TTM",
-        "报告期"
-    ]
-    temp_df = temp_df[
-        [
-            "代码",
-            "名称",
-            "最新价",
-            "涨跌幅",
-            "涨跌额",
-            "成交量",
-            "成交额",
-            "振幅",
-            "换手率",
-            "量比",
-            "今开",
-            "最高",
-            "最低",
-            "昨收",
-            "涨速",
-            "5分钟涨跌",
-            "60日涨跌幅",
-            "年初至今涨跌幅",
-            "市盈率动",
-            "市盈率TTM",
-            "市盈率静",
-            "市净率",
-            "每股收益",
-            "每股净资产",
-            "每股公积金",
-            "每股未分配利润",
-            "加权净资产收益率",
-            "毛利率",
-            "资产负债率",
-            "营业收入",
-            "营业收入同比增长",
-            "归属净利润",
-            "归属净利润同比增长",
-            "报告期",
-            "总股本",
-            "已流通股份",
-            "总市值",
-            "流通市值",
-            "所处行业",
-            "上市时间"
-        ]
-    ]
-    temp_df["最新价"] = pd.to_numeric(temp_df["最新价"], errors="coerce")
-    temp_df["涨跌幅"] = pd.to_numeric(temp_df["涨跌幅"], errors="coerce")
-    temp_df["涨跌额"] = pd.to_numeric(temp_df["涨跌额"], errors="coerce")
-    temp_df["成交量"] = pd.to_numeric(temp_df["成交量"], errors="coerce")
-    temp_df["成交额"] = pd.to_numeric(temp_df["成交额"], errors="coerce")
-    temp_df["振幅"] = pd.to_numeric(temp_df["振幅"], errors="coerce")
-    temp_df["量比"] = pd.to_numeric(temp_df["量比"], errors="coerce")
-    temp_df["换手率"] = pd.to_numeric(temp_df["换手率"], errors="coerce")
-    temp_df["最高"] = pd.to_numeric(temp_df["最高"], errors="coerce")
-    temp_df["最低"] = pd.to_numeric(temp_df["最低"], errors="coerce")
-    temp_df["今开"] = pd.to_numeric(temp_df["今开"], errors="coerce")
-    temp_df["昨收"] = pd.to_numeric(temp_df["昨收"], errors="coerce")
-    temp_df["涨速"] = pd.to_numeric(temp_df["涨速"], errors="coerce")
-    temp_df["5分钟涨跌"] = pd.to_numeric(temp_df["5分钟涨跌"], errors="coerce")
-    temp_df["60日涨跌幅"] = pd.to_numeric(temp_df["60日涨跌幅"], errors="coerce")
-    temp_df["年初至今涨跌幅"] = pd.to_numeric(temp_df["年初至今涨跌幅"], errors="coerce")
-    temp_df["市盈率动"] = pd.to_numeric(temp_df["市盈率动"], errors="coerce")
-    temp_df["市盈率TTM"] = pd.to_numeric(temp_df["市盈率TTM"], errors="coerce")
-    temp_df["市盈率静"] = pd.to_numeric(temp_df["市盈率静"], errors="coerce")
-    temp_df["市净率"] = pd.to_numeric(temp_df["市净率"], errors="coerce")
-    temp_df["每股收益"] = pd.to_numeric(temp_df["每股收益"], errors="coerce")
-    temp_df["每股净资产"] = pd.to_numeric(temp_df["每股净资产"], errors="coerce")
-    temp_df["每股公积金"] = pd.to_numeric(temp_df["每股公积金"], errors="coerce")
-    temp_df["每股未分配利润"] = pd.to_numeric(temp_df["每股未分配利润"], errors="coerce")
-    temp_df["加权净资产收益率"] = pd.to_numeric(temp_df["加权净资产收益率"], errors="coerce")
-    temp_df["毛利率"] = pd.to_numeric(temp_df["毛利率"], errors="coerce")
-    temp_df["资产负债率"] = pd.to_numeric(temp_df["资产负债率"], errors="coerce")
-    temp_df["营业收入"] = pd.to_numeric(temp_df["营业收入"], errors="coerce")
-    temp_df["营业收入同比增长"] = pd.to_numeric(temp_df["营业收入同比增长"], errors="coerce")
-    temp_df["归属净利润"] = pd.to_numeric(temp_df["归属净利润"], errors="coerce")
-    temp_df["归属净利润同比增长"] = pd.to_numeric(temp_df["归属净利润同比增长"], errors="coerce")
-    temp_df["报告期"] = pd.to_datetime(temp_df["报告期"], format='%Y%m%d', errors="coerce")
-    temp_df["总股本"] = pd.to_numeric(temp_df["总股本"], errors="coerce")
-    temp_df["已流通股份"] = pd.to_numeric(temp_df["已流通股份"], errors="coerce")
-    temp_df["总市值"] = pd.to_numeric(temp_df["总市值"], errors="coerce")
-    temp_df["流通市值"] = pd.to_numeric(temp_df["流通市值"], errors="coerce")
-    temp_df["上市时间"] = pd.to_datetime(temp_df["上市时间"], format='%Y%m%d', errors="coerce")
+    r = hc.get(url, params=params)
+    return cp.parse_clist(r.content, _SPOT_FIELDS)
 
-    return temp_df
+# 上次重新下载代码和市场对照表的时间
+_refreshed = None
+_refresh_lock = threading.Lock()
 
 
 @lru_cache()
@@ -171,6 +96,40 @@ def code_id_map_em() -> dict:
     :return: 股票和市场代码
     :rtype: dict
     """
+    return _code_id_map_em(hc.hcc.TTL_CODE_ID_MAP)
+
+
+def refresh_code_id_map_em() -> dict:
+    """
+    不使用缓存重新下载股票和市场代码，缓存之后上市的新股不在缓存的对照表里。
+    每个进程 REFRESH_CODE_ID_MAP 秒内最多重新下载一次，这期间返回已有的对照表
+    :return: 股票和市场代码
+    :rtype: dict
+    """
+    global _refreshed
+    with _refresh_lock:
+        if _refreshed is None or time.monotonic() - _refreshed >= hc.hcc.REFRESH_CODE_ID_MAP:
+            _refreshed = time.monotonic()  # 下载失败也计时，不反复请求
+            code_id_map_em.cache_clear()
+            _code_id_map_em(0)  # 有效期为0，重新请求并更新磁盘缓存
+    return code_id_map_em()
+
+
+def get_code_id(symbol: str) -> int:
+    """
+    股票代码对应的市场代码，对照表里没有时重新下载对照表再查一次，仍然没有时抛出 KeyError
+    :param symbol: 股票代码
+    :type symbol: str
+    :return: 市场代码
+    :rtype: int
+    """
+    code_id_dict = code_id_map_em()
+    if symbol not in code_id_dict:
+        code_id_dict = refresh_code_id_map_em()
+    return code_id_dict[symbol]
+
+
+def _code_id_map_em(ttl) -> dict:
     url = "http://80.push2.eastmoney.com/api/qt/clist/get"
     params = {
         "pn": "1",
@@ -185,14 +144,11 @@ def code_id_map_em() -> dict:
         "fields": "f12",
         "_": "1623833739532",
     }
-    r = requests.get(url, params=params)
-    data_json = r.json()
-    if not data_json["data"]["diff"]:
+    r = hc.get(url, params=params, ttl=ttl)
+    rows = cp.get_rows(r.content)
+    if not rows:
         return dict()
-    temp_df = pd.DataFrame(data_json["data"]["diff"])
-    temp_df["market_id"] = 1
-    temp_df.columns = ["sh_code", "sh_id"]
-    code_id_dict = dict(zip(temp_df["sh_code"], temp_df["sh_id"]))
+    code_id_dict = {row["f12"]: 1 for row in rows}
     params = {
         "pn": "1",
         "pz": "50000",
@@ -206,13 +162,11 @@ def code_id_map_em() -> dict:
         "fields": "f12",
         "_": "1623833739532",
     }
-    r = requests.get(url, params=params)
-    data_json = r.json()
-    if not data_json["data"]["diff"]:
+    r = hc.get(url, params=params, ttl=ttl)
+    rows = cp.get_rows(r.content)
+    if not rows:
         return dict()
-    temp_df_sz = pd.DataFrame(data_json["data"]["diff"])
-    temp_df_sz["sz_id"] = 0
-    code_id_dict.update(dict(zip(temp_df_sz["f12"], temp_df_sz["sz_id"])))
+    code_id_dict.update({row["f12"]: 0 for row in rows})
     params = {
         "pn": "1",
         "pz": "50000",
@@ -226,13 +180,11 @@ def code_id_map_em() -> dict:
         "fields": "f12",
         "_": "1623833739532",
     }
-    r = requests.get(url, params=params)
-    data_json = r.json()
-    if not data_json["data"]["diff"]:
+    r = hc.get(url, params=params, ttl=ttl)
+    rows = cp.get_rows(r.content)
+    if not rows:
         return dict()
-    temp_df_sz = pd.DataFrame(data_json["data"]["diff"])
-    temp_df_sz["bj_id"] = 0
-    code_id_dict.update(dict(zip(temp_df_sz["f12"], temp_df_sz["bj_id"])))
+    code_id_dict.update({row["f12"]: 0 for row in rows})
     return code_id_dict
 
 
@@ -259,7 +211,23 @@ def stock_zh_a_hist(
     :return: 每日行情
     :rtype: pandas.DataFrame
     """
-    code_id_dict = code_id_map_em()
+    url, params = stock_zh_a_hist_params(symbol, period, start_date, end_date, adjust)
+    r = hc.get(url, params=params, retry_if=hc.empty_klines)
+    return stock_zh_a_hist_parse(r.json())
+
+
+def stock_zh_a_hist_params(
+    symbol: str = "000001",
+    period: str = "daily",
+    start_date: str = "19700101",
+    end_date: str = "20500101",
+    adjust: str = "",
+) -> tuple:
+    """
+    东方财富网-每日行情请求地址和参数，同步和异步下载共用
+    :return: (url, params)
+    :rtype: tuple
+    """
     adjust_dict = {"qfq": "1", "hfq": "2", "": "0"}
     period_dict = {"daily": "101", "weekly": "102", "monthly": "103"}
     url = "http://push2his.eastmoney.com/api/qt/stock/kline/get"
@@ -269,46 +237,25 @@ def stock_zh_a_hist(
         "ut": "7eea3edcaed734bea9cbfc24409ed989",
         "klt": period_dict[period],
         "fqt": adjust_dict[adjust],
-        "secid": f"{code_id_dict[symbol]}.{symbol}",
+        "secid": f"{get_code_id(symbol)}.{symbol}",
         "beg": start_date,
         "end": end_date,
         "_": "1623766962675",
     }
-    r = requests.get(url, params=params)
-    data_json = r.json()
-    if not (data_json["data"] and data_json["data"]["klines"]):
-        return pd.DataFrame()
-    temp_df = pd.DataFrame(
-        [item.split(",") for item in data_json["data"]["klines"]]
-    )
-    temp_df.columns = [
-        "日期",
-        "开盘",
-        "收盘",
-        "最高",
-        "最低",
-        "成交量",
-        "成交额",
-        "振幅",
-        "涨跌幅",
-        "涨跌额",
-        "换手率",
-    ]
-    temp_df.index = pd.to_datetime(temp_df["日期"])
-    temp_df.reset_index(inplace=True, drop=True)
+    return url, params
 
-    temp_df["开盘"] = pd.to_numeric(temp_df["开盘"])
-    temp_df["收盘"] = pd.to_numeric(temp_df["收盘"])
-    temp_df["最高"] = pd.to_numeric(temp_df["最高"])
-    temp_df["最低"] = pd.to_numeric(temp_df["最低"])
-    temp_df["成交量"] = pd.to_numeric(temp_df["成交量"])
-    temp_df["成交额"] = pd.to_numeric(temp_df["成交额"])
-    temp_df["振幅"] = pd.to_numeric(temp_df["振幅"])
-    temp_df["涨跌幅"] = pd.to_numeric(temp_df["涨跌幅"])
-    temp_df["涨跌额"] = pd.to_numeric(temp_df["涨跌额"])
-    temp_df["换手率"] = pd.to_numeric(temp_df["换手率"])
 
-    return temp_df
+def stock_zh_a_hist_parse(data_json: dict) -> pd.DataFrame:
+    """
+    东方财富网-每日行情接口返回的 json 转成 DataFrame
+    :param data_json: 接口返回的 json
+    :type data_json: dict
+    :return: 每日行情
+    :rtype: pandas.DataFrame
+    """
+    if not (data_json["data"] and data_json["data"]["klines"]):
+        return pd.DataFrame()
+    return kp.parse_klines(data_json["data"]["klines"], kp.KLINE_COLUMNS)
 
 
 def stock_zh_a_hist_min_em(
@@ -334,7 +281,6 @@ def stock_zh_a_hist_min_em(
     :return: 每日分时行情
     :rtype: pandas.DataFrame
     """
-    code_id_dict = code_id_map_em()
     adjust_map = {
         "": "0",
         "qfq": "1",
@@ -348,34 +294,15 @@ def stock_zh_a_hist_min_em(
             "ut": "7eea3edcaed734bea9cbfc24409ed989",
             "ndays": "5",
             "iscr": "0",
-            "secid": f"{code_id_dict[symbol]}.{symbol}",
+            "secid": f"{get_code_id(symbol)}.{symbol}",
             "_": "1623766962675",
         }
-        r = requests.get(url, params=params)
+        r = hc.get(url, params=params)
         data_json = r.json()
-        temp_df = pd.DataFrame(
-            [item.split(",") for item in data_json["data"]["trends"]]
-        )
-        temp_df.columns = [
-            "时间",
-            "开盘",
-            "收盘",
-            "最高",
-            "最低",
-            "成交量",
-            "成交额",
-            "最新价",
-        ]
+        temp_df = kp.parse_klines(data_json["data"]["trends"], kp.TRENDS_COLUMNS)
         temp_df.index = pd.to_datetime(temp_df["时间"])
         temp_df = temp_df[start_date:end_date]
         temp_df.reset_index(drop=True, inplace=True)
-        temp_df["开盘"] = pd.to_numeric(temp_df["开盘"])
-        temp_df["收盘"] = pd.to_numeric(temp_df["收盘"])
-        temp_df["最高"] = pd.to_numeric(temp_df["最高"])
-        temp_df["最低"] = pd.to_numeric(temp_df["最低"])
-        temp_df["成交量"] = pd.to_numeric(temp_df["成交量"])
-        temp_df["成交额"] = pd.to_numeric(temp_df["成交额"])
-        temp_df["最新价"] = pd.to_numeric(temp_df["最新价"])
         temp_df["时间"] = pd.to_datetime(temp_df["时间"]).astype(str)
         return temp_df
     else:
@@ -386,42 +313,17 @@ def stock_zh_a_hist_min_em(
             "ut": "7eea3edcaed734bea9cbfc24409ed989",
             "klt": period,
             "fqt": adjust_map[adjust],
-            "secid": f"{code_id_dict[symbol]}.{symbol}",
+            "secid": f"{get_code_id(symbol)}.{symbol}",
             "beg": "0",
             "end": "20500000",
             "_": "1630930917857",
         }
-        r = requests.get(url, params=params)
+        r = hc.get(url, params=params)
         data_json = r.json()
-        temp_df = pd.DataFrame(
-            [item.split(",") for item in data_json["data"]["klines"]]
-        )
-        temp_df.columns = [
-            "时间",
-            "开盘",
-            "收盘",
-            "最高",
-            "最低",
-            "成交量",
-            "成交额",
-            "振幅",
-            "涨跌幅",
-            "涨跌额",
-            "换手率",
-        ]
+        temp_df = kp.parse_klines(data_json["data"]["klines"], ["时间"] + kp.KLINE_COLUMNS[1:])
         temp_df.index = pd.to_datetime(temp_df["时间"])
         temp_df = temp_df[start_date:end_date]
         temp_df.reset_index(drop=True, inplace=True)
-        temp_df["开盘"] = pd.to_numeric(temp_df["开盘"])
-        temp_df["收盘"] = pd.to_numeric(temp_df["收盘"])
-        temp_df["最高"] = pd.to_numeric(temp_df["最高"])
-        temp_df["最低"] = pd.to_numeric(temp_df["最低"])
-        temp_df["成交量"] = pd.to_numeric(temp_df["成交量"])
-        temp_df["成交额"] = pd.to_numeric(temp_df["成交额"])
-        temp_df["振幅"] = pd.to_numeric(temp_df["振幅"])
-        temp_df["涨跌幅"] = pd.to_numeric(temp_df["涨跌幅"])
-        temp_df["涨跌额"] = pd.to_numeric(temp_df["涨跌额"])
-        temp_df["换手率"] = pd.to_numeric(temp_df["换手率"])
         temp_df["时间"] = pd.to_datetime(temp_df["时间"]).astype(str)
         temp_df = temp_df[
             [
@@ -458,7 +360,6 @@ def stock_zh_a_hist_pre_min_em(
     :return: 每日分时行情包含盘前数据
     :rtype: pandas.DataFrame
     """
-    code_id_dict = code_id_map_em()
     url = "https://push2.eastmoney.com/api/qt/stock/trends2/get"
     params = {
         "fields1": "f1,f2,f3,f4,f5,f6,f7,f8,f9,f10,f11,f12,f13",
@@ -467,10 +368,10 @@ def stock_zh_a_hist_pre_min_em(
         "ndays": "1",
         "iscr": "1",
         "iscca": "0",
-        "secid": f"{code_id_dict[symbol]}.{symbol}",
+        "secid": f"{get_code_id(symbol)}.{symbol}",
         "_": "1623766962675",
     }
-    r = requests.get(url, params=params)
+    r = hc.get(url, params=params)
     data_json = r.json()
     temp_df = pd.DataFrame(
         [item.split(",") for item in data_json["data"]["trends"]]
@@ -3,7 +3,7 @@
 
 import math
 import pandas as pd
-import requests
+import instock.core.crawling.http_client as hc
 import instock.core.tablestructure as tbs
 
 __author__ = 'myh '
@@ -32,23 +32,11 @@ def stock_selection() -> pd.DataFrame:
         "source": "SELECT_SECURITIES",
         "client": "WEB"
     }
-    r = requests.get(url, params=params)
-    data_json = r.json()
-    data = data_json["result"]["data"]
+    data = hc.get_all_pages(url, params, page_key="p",
+                            pages=lambda x: math.ceil((x["result"]["count"] or 0) / page_size) if x["result"]["data"] else 0)
     if not data:
         return pd.DataFrame()
 
-    data_count = data_json["result"]["count"]
-    page_count = math.ceil(data_count/page_size)
-    while page_count > 1:
-        page_current = page_current + 1
-        params["p"] = page_current
-        r = requests.get(url, params=params)
-        data_json = r.json()
-        _data = data_json["result"]["data"]
-        data.extend(_data)
-        page_count =page_count - 1
-
     temp_df = pd.DataFrame(data)
 
     mask = ~temp_df['CONCEPT'].isna()
@@ -83,7 +71,7 @@ def stock_selection_params():
         "client": "WEB"
     }
 
-    r = requests.get(url, params=params)
+    r = hc.get(url, params=params)
     data_json = r.json()
     zxzb = data_json["zxzb"]  # 指标
     print(zxzb)
@@ -6,300 +6,132 @@ Desc: 新浪财经-交易日历
 https://finance.sina.com.cn/realstock/company/klc_td_sh.txt
 此处可以用来更新 calendar.json 文件，注意末尾没有 "," 号
 """
+import math
+import logging
 import datetime
 import pandas as pd
-import requests
-from py_mini_racer import MiniRacer
+import instock.core.crawling.http_client as hc
 
-hk_js_decode = """
-function d(t) {
-    var e, i, n, r, a, o, s, l = (arguments,
-            864e5), u = 7657, c = [], h = [], d = ~(3 << 30), f = 1 << 30,
-        p = [0, 3, 5, 6, 9, 10, 12, 15, 17, 18, 20, 23, 24, 27, 29, 30], m = Math, g = function () {
-            var l, u;
-            for (l = 0; 64 > l; l++)
-                h[l] = m.pow(2, l),
-                26 > l && (c[l] = v(l + 65),
-                    c[l + 26] = v(l + 97),
-                10 > l && (c[l + 52] = v(l + 48)));
-            for (c.push("+", "/"),
-                     c = c.join(""),
-                     i = t.split(""),
-                     n = i.length,
-                     l = 0; n > l; l++)
-                i[l] = c.indexOf(i[l]);
-            return r = {},
-                e = o = 0,
-                a = {},
-                u = w([12, 6]),
-                s = 63 ^ u[1],
-            {
-                _1479: T,
-                _136: _,
-                _200: S,
-                _139: k,
-                _197: _mi_run
-            }["_" + u[0]] || function () {
-                return []
-            }
-        }, v = String.fromCharCode, b = function (t) {
-            return t === {}._
-        }, N = function () {
-            var t, e;
-            for (t = y(),
-                     e = 1; ;) {
-                if (!y())
-                    return e * (2 * t - 1);
-                e++
-            }
-        }, y = function () {
-            var t;
-            return e >= n ? 0 : (t = i[e] & 1 << o,
-                o++,
-            o >= 6 && (o -= 6,
-                e++),
-                !!t)
-        }, w = function (t, r, a) {
-            var s, l, u, c, d;
-            for (l = [],
-                     u = 0,
-                 r || (r = []),
-                 a || (a = []),
-                     s = 0; s < t.length; s++)
-                if (c = t[s],
-                    u = 0,
-                    c) {
-                    if (e >= n)
-                        return l;
-                    if (t[s] <= 0)
-                        u = 0;
-                    else if (t[s] <= 30) {
-                        for (; d = 6 - o,
-                                   d = c > d ? d : c,
-                                   u |= (i[e] >> o & (1 << d) - 1) << t[s] - c,
-                                   o += d,
-                               o >= 6 && (o -= 6,
-                                   e++),
-                                   c -= d,
-                                   !(0 >= c);)
-                            ;
-                        r[s] && u >= h[t[s] - 1] && (u -= h[t[s]])
-                    } else
-                        u = w([30, t[s] - 30], [0, r[s]]),
-                        a[s] || (u = u[0] + u[1] * h[30]);
-                    l[s] = u
-                } else
-                    l[s] = 0;
-            return l
-        }, x = function (t) {
-            var e, i, n;
-            for (t > 1 && (e = 0),
-                     e = 0; t > e; e++)
-                r.d++,
-                    n = r.d % 7,
-                (3 == n || 4 == n) && (r.d += 5 - n);
-            return i = new Date,
-                i.setTime((u + r.d) * l),
-                i
-        }, S = function () {
-            var t, i, a, o, l;
-            if (s >= 1)
-                return [];
-            for (r.d = w([18], [1])[0] - 1,
-                     a = w([3, 3, 30, 6]),
-                     r.p = a[0],
-                     r.ld = a[1],
-                     r.cd = a[2],
-                     r.c = a[3],
-                     r.m = m.pow(10, r.p),
-                     r.pc = r.cd / r.m,
-                     i = [],
-                     t = 0; o = {
-                d: 1
-            },
-                 y() && (a = w([3])[0],
-                     0 == a ? o.d = w([6])[0] : 1 == a ? (r.d = w([18])[0],
-                         o.d = 0) : o.d = a),
-                     l = {
-                         day: x(o.d)
-                     },
-                 y() && (r.ld += N()),
-                     a = w([3 * r.ld], [1]),
-                     r.cd += a[0],
-                     l.close = r.cd / r.m,
-                     i.push(l),
-                 !(e >= n) && (e != n - 1 || 63 & (r.c ^ t + 1)); t++)
-                ;
-            return i[0].prevclose = r.pc,
-                i
-        }, _ = function () {
-            var t, i, a, o, l, u, c, h, d, f, p;
-            if (s > 2)
-                return [];
-            for (c = [],
-                     d = {
-                         v: "volume",
-                         p: "price",
-                         a: "avg_price"
-                     },
-                     r.d = w([18], [1])[0] - 1,
-                     h = {
-                         day: x(1)
-                     },
-                     a = w(1 > s ? [3, 3, 4, 1, 1, 1, 5] : [4, 4, 4, 1, 1, 1, 3]),
-                     t = 0; 7 > t; t++)
-                r[["la", "lp", "lv", "tv", "rv", "zv", "pp"][t]] = a[t];
-            for (r.m = m.pow(10, r.pp),
-                     s >= 1 ? (a = w([3, 3]),
-                         r.c = a[0],
-                         a = a[1]) : (a = 5,
-                         r.c = 2),
-                     r.pc = w([6 * a])[0],
-                     h.pc = r.pc / r.m,
-                     r.cp = r.pc,
-                     r.da = 0,
-                     r.sa = r.sv = 0,
-                     t = 0; !(e >= n) && (e != n - 1 || 7 & (r.c ^ t)); t++) {
-                for (l = {},
-                         o = {},
-                         f = r.tv ? y() : 1,
-                         i = 0; 3 > i; i++)
-                    if (p = ["v", "p", "a"][i],
-                    (f ? y() : 0) && (a = N(),
-                        r["l" + p] += a),
-                        u = "v" == p && r.rv ? y() : 1,
-                        a = w([3 * r["l" + p] + ("v" == p ? 7 * u : 0)], [!!i])[0] * (u ? 1 : 100),
-                        o[p] = a,
-                    "v" == p) {
-                        if (!(l[d[p]] = a) && (s > 1 || 241 > t) && (r.zv ? !y() : 1)) {
-                            o.p = 0;
-                            break
-                        }
-                    } else
-                        "a" == p && (r.da = (1 > s ? 0 : r.da) + o.a);
-                r.sv += o.v,
-                    l[d.p] = (r.cp += o.p) / r.m,
-                    r.sa += o.v * r.cp,
-                    l[d.a] = b(o.a) ? t ? c[t - 1][d.a] : l[d.p] : r.sv ? ((m.floor((r.sa * (2e3 / r.m) + r.sv) / r.sv) >> 1) + r.da) / 1e3 : l[d.p] + r.da / 1e3,
-                    c.push(l)
-            }
-            return c[0].date = h.day,
-                c[0].prevclose = h.pc,
-                c
-        }, T = function () {
-            var t, e, i, n, a, o, l;
-            if (s >= 1)
-                return [];
-            for (r.lv = 0,
-                     r.ld = 0,
-                     r.cd = 0,
-                     r.cv = [0, 0],
-                     r.p = w([6])[0],
-                     r.d = w([18], [1])[0] - 1,
-                     r.m = m.pow(10, r.p),
-                     a = w([3, 3]),
-                     r.md = a[0],
-                     r.mv = a[1],
-                     t = []; a = w([6]),
-                     a.length;) {
-                if (i = {
-                    c: a[0]
-                },
-                    n = {},
-                    i.d = 1,
-                32 & i.c)
-                    for (; ;) {
-                        if (a = w([6])[0],
-                        63 == (16 | a)) {
-                            l = 16 & a ? "x" : "u",
-                                a = w([3, 3]),
-                                i[l + "_d"] = a[0] + r.md,
-                                i[l + "_v"] = a[1] + r.mv;
-                            break
-                        }
-                        if (32 & a) {
-                            o = 8 & a ? "d" : "v",
-                                l = 16 & a ? "x" : "u",
-                                i[l + "_" + o] = (7 & a) + r["m" + o];
-                            break
-                        }
-                        if (o = 15 & a,
-                            0 == o ? i.d = w([6])[0] : 1 == o ? (r.d = o = w([18])[0],
-                                i.d = 0) : i.d = o,
-                            !(16 & a))
-                            break
-                    }
-                n.date = x(i.d);
-                for (o in {
-                    v: 0,
-                    d: 0
-                })
-                    b(i["x_" + o]) || (r["l" + o] = i["x_" + o]),
-                    b(i["u_" + o]) && (i["u_" + o] = r["l" + o]);
-                for (i.l_l = [i.u_d, i.u_d, i.u_d, i.u_d, i.u_v],
-                         l = p[15 & i.c],
-                     1 & i.u_v && (l = 31 - l),
-                     16 & i.c && (i.l_l[4] += 2),
-                         e = 0; 5 > e; e++)
-                    l & 1 << 4 - e && i.l_l[e]++,
-                        i.l_l[e] *= 3;
-                i.d_v = w(i.l_l, [1, 0, 0, 1, 1], [0, 0, 0, 0, 1]),
-                    o = r.cd + i.d_v[0],
-                    n.open = o / r.m,
-                    n.high = (o + i.d_v[1]) / r.m,
-                    n.low = (o - i.d_v[2]) / r.m,
-                    n.close = (o + i.d_v[3]) / r.m,
-                    a = i.d_v[4],
-                "number" == typeof a && (a = [a, a >= 0 ? 0 : -1]),
-                    r.cd = o + i.d_v[3],
-                    l = r.cv[0] + a[0],
-                    r.cv = [l & d, r.cv[1] + a[1] + !!((r.cv[0] & d) + (a[0] & d) & f)],
-                    n.volume = (r.cv[0] & f - 1) + r.cv[1] * f,
-                    t.push(n)
-            }
-            return t
-        }, k = function () {
-            var t, e, i, n;
-            if (s > 1)
-                return [];
-            for (r.l = 0,
-                     n = -1,
-                     r.d = w([18])[0] - 1,
-                     i = w([18])[0]; r.d < i;)
-                e = x(1),
-                    0 >= n ? (y() && (r.l += N()),
-                        n = w([3 * r.l], [0])[0] + 1,
-                    t || (t = [e],
-                        n--)) : t.push(e),
-                    n--;
-            return t
-        };
-    return _mi_run = function () {
-        var t, i, a, o;
-        if (s >= 1)
-            return [];
-        for (r.f = w([6])[0],
-                 r.c = w([6])[0],
-                 a = [],
-                 r.dv = [],
-                 r.dl = [],
-                 t = 0; t < r.f; t++)
-            r.dv[t] = 0,
-                r.dl[t] = 0;
-        for (t = 0; !(e >= n) && (e != n - 1 || 7 & (r.c ^ t)); t++) {
-            for (o = [],
-                     i = 0; i < r.f; i++)
-                y() && (r.dl[i] += N()),
-                    r.dv[i] += w([3 * r.dl[i]], [1])[0],
-                    o[i] = r.dv[i];
-            a.push(o)
-        }
-        return a
-    }
-        ,
-        g()()
-}
-"""
+# 新浪交易日历的解码，原来用 MiniRacer 启动 V8 执行新浪的混淆 js 解码函数，每个进程启动都要付出这个开销。
+# 这里是 js 解码函数的 Python 移植，只移植了交易日历用到的部分(js 中的 _139 分支)，
+# K线、分时等其他分支返回空列表。数据是自定义 base64 的位流，每个字符6位，低位在前。
+_ALPHABET = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/"
+_BASE_DAY = datetime.date(1970, 1, 1) + datetime.timedelta(days=7657)  # 1990-12-19，沪市开市
+_TRADE_DATE_TYPE = 139
+
+
+class _sina_decoder:
+    def __init__(self, text):
+        self.bits = [_ALPHABET.find(ch) for ch in text]
+        self.n = len(self.bits)
+        self.e = 0  # 当前字符
+        self.o = 0  # 当前字符内的位
+        self.d = 0  # 距 _BASE_DAY 的天数
+        self.l = 0  # 游程长度的位数
+
+    # 读1位
+    def bit(self):
+        if self.e >= self.n:
+            return False
+        t = self.bits[self.e] & (1 << self.o)
+        self.o += 1
+        if self.o >= 6:
+            self.o -= 6
+            self.e += 1
+        return t != 0
+
+    # 变长整数：符号位后面连续的1的个数
+    def signed(self):
+        t = self.bit()
+        count = 1
+        while self.bit():
+            count += 1
+        return count * (2 * t - 1)
+
+    # 依次读取 widths 指定位数的整数，signs 对应位置为真时按补码解释，超过30位的分两段读取。
+    # 数据读完时返回已经读到的部分。
+    def read(self, widths, signs=(), raw=()):
+        values = []
+        for s, width in enumerate(widths):
+            if not width:
+                values.append(0)
+                continue
+            if self.e >= self.n:
+                return values
+            sign = s < len(signs) and signs[s]
+            if width <= 0:
+                u = 0
+            elif width <= 30:
+                u, c = 0, width
+                while True:
+                    d = min(6 - self.o, c)
+                    u |= (self.bits[self.e] >> self.o & (1 << d) - 1) << width - c
+                    self.o += d
+                    if self.o >= 6:
+                        self.o -= 6
+                        self.e += 1
+                    c -= d
+                    if c <= 0:
+                        break
+                if sign and u >= 2 ** (width - 1):
+                    u -= 2 ** width
+            else:
+                u = self.read([30, width - 30], [0, sign])
+                if len(u) < 2:
+                    return values
+                if not (s < len(raw) and raw[s]):
+                    u = u[0] + u[1] * 2 ** 30
+            values.append(u)
+        return values
+
+    # 向后移动 t 个工作日
+    def next_day(self, t):
+        for _ in range(t):
+            self.d += 1
+            m = self.d % 7 if self.d >= 0 else -(-self.d % 7)
+            if m == 3 or m == 4:
+                self.d += 5 - m
+        return _BASE_DAY + datetime.timedelta(days=self.d)
+
+    # js 中的 _139：游程编码的工作日序列，每段之间跳过的工作日是节假日。
+    def trade_dates(self):
+        self.l = 0
+        n = -1
+        bounds = self.read([18, 18])
+        if len(bounds) < 2:
+            return []
+        self.d, end = bounds[0] - 1, bounds[1]
+        dates = None
+        while self.d < end:
+            day = self.next_day(1)
+            if n <= 0:
+                if self.bit():
+                    self.l += self.signed()
+                run = self.read([3 * self.l], [0])
+                # 数据读完时 js 得到 NaN，之后的工作日全部算交易日
+                n = run[0] + 1 if run else math.inf
+                if dates is None:
+                    dates = [day]
+                    n -= 1
+            else:
+                dates.append(day)
+            n -= 1
+        return dates or []
+
+    def decode(self):
+        kind, check = self.read([12, 6])
+        if kind != _TRADE_DATE_TYPE or 63 ^ check > 1:
+            return []
+        return self.trade_dates()
+
+
+# 解码新浪交易日历数据，返回 datetime.date 列表
+def decode_trade_dates(text):
+    try:
+        return _sina_decoder(text).decode()
+    except Exception as e:
+        logging.error(f"trade_date_hist.decode_trade_dates处理异常：{e}")
+    return []
 
 
 def tool_trade_date_hist_sina() -> pd.DataFrame:
@@ -310,16 +142,8 @@ def tool_trade_date_hist_sina() -> pd.DataFrame:
     :rtype: pandas.DataFrame
     """
     url = "https://finance.sina.com.cn/realstock/company/klc_td_sh.txt"
-    r = requests.get(url)
-    js_code = MiniRacer()
-    js_code.eval(hk_js_decode)
-    dict_list = js_code.call(
-        "d", r.text.split("=")[1].split(";")[0].replace('"', "")
-    )  # 执行js解密代码
-    temp_df = pd.DataFrame(dict_list)
-    temp_df.columns = ["trade_date"]
-    temp_df["trade_date"] = pd.to_datetime(temp_df["trade_date"]).dt.date
-    temp_list = temp_df["trade_date"].to_list()
+    r = hc.get(url, ttl=hc.hcc.TTL_TRADE_DATE)
+    temp_list = decode_trade_dates(r.text.split("=")[1].split(";")[0].replace('"', ""))  # 解密
     temp_list.append(datetime.date(1992, 5, 4))  # 是交易日但是交易日历缺失该日期
     temp_list.sort()
     temp_df = pd.DataFrame(temp_list, columns=["trade_date"])
@@ -2,6 +2,7 @@
 # -*- coding: utf-8 -*-
 
 import logging
+import functools
 import pandas as pd
 import numpy as np
 import talib as tl
@@ -10,402 +11,595 @@ __author__ = 'myh '
 __date__ = '2023/3/10 '
 
 
-def get_indicators(data, end_date=None, threshold=120, calc_threshold=None):
+# get_indicators 返回的指标列：STOCK_STATS_DATA 的指标，加上K线图使用的均线、乖离率、成交量均线。
+# 计算过程中的中间数据(m_price、prev_close 等)也是计算图的节点，默认不放到返回结果里。
+INDICATOR_COLUMNS = ('macd', 'macds', 'macdh', 'kdjk', 'kdjd', 'kdjj', 'boll_ub', 'boll', 'boll_lb',
+                     'trix', 'trix_20_sma', 'cr', 'cr-ma1', 'cr-ma2', 'cr-ma3', 'rsi', 'rsi_6', 'rsi_12', 'rsi_24',
+                     'vr', 'vr_6_sma', 'tr', 'atr', 'pdi', 'mdi', 'dx', 'adx', 'adxr', 'wr_6', 'wr_10', 'wr_14',
+                     'cci', 'cci_84', 'ma10', 'ma50', 'dma', 'dma_10_sma', 'tema', 'mfi', 'mfisma', 'vwma', 'mvwma',
+                     'ppo', 'ppos', 'ppoh', 'stochrsi_k', 'stochrsi_d', 'wt1', 'wt2',
+                     'supertrend_ub', 'supertrend_lb', 'supertrend', 'roc', 'rocma', 'rocema', 'obv', 'sar',
+                     'psy', 'psyma', 'ar', 'br', 'emv', 'emva', 'ma6', 'ma12', 'ma24', 'bias', 'bias_12', 'bias_24',
+                     'dpo', 'madpo', 'vhf', 'rvi', 'rvis', 'fi', 'force_2', 'force_13', 'ene_ue', 'ene_le', 'ene',
+                     'vol_5', 'vol_10', 'ma20', 'ma200')
+
+
+# NaN 改为 0，直接修改数组
+def _fill(x):
+    x[np.isnan(x)] = 0.0
+    return x
+
+
+# NaN 和 inf 改为 0，直接修改数组
+def _fill_inf(x):
+    x[~np.isfinite(x)] = 0.0
+    return x
+
+
+# 和 pd.Series.shift(n, fill_value=0.0) 相同
+def _shift(x, n):
+    out = np.zeros(len(x))
+    if len(x) > n:
+        out[n:] = x[:-n]
+    return out
+
+
+def _supertrend(close, b_ub, b_lb):
+    size = len(close)
+    ub = np.empty(size, dtype=np.float64)
+    lb = np.empty(size, dtype=np.float64)
+    st = np.full(size, np.nan)
+    for i in range(size):
+        if i == 0:
+            ub[i] = b_ub[i]
+            lb[i] = b_lb[i]
+            if close[i] <= ub[i]:
+                st[i] = ub[i]
+            else:
+                st[i] = lb[i]
+            continue
+
+        last_close = close[i - 1]
+        curr_close = close[i]
+        last_ub = ub[i - 1]
+        last_lb = lb[i - 1]
+        last_st = st[i - 1]
+        curr_b_ub = b_ub[i]
+        curr_b_lb = b_lb[i]
+
+        # calculate current upper band
+        if curr_b_ub < last_ub or last_close > last_ub:
+            ub[i] = curr_b_ub
+        else:
+            ub[i] = last_ub
+
+        # calculate current lower band
+        if curr_b_lb > last_lb or last_close < last_lb:
+            lb[i] = curr_b_lb
+        else:
+            lb[i] = last_lb
+
+        # calculate supertrend
+        if last_st == last_ub:
+            if curr_close <= ub[i]:
+                st[i] = ub[i]
+            else:
+                st[i] = lb[i]
+        elif last_st == last_lb:
+            if curr_close > lb[i]:
+                st[i] = lb[i]
+            else:
+                st[i] = ub[i]
+    return ub, lb, st
+
+
+# 指标计算图：每个节点声明输出和输入，输入是 FIELDS 的行情数据或者其他节点的输出，
+# 例如 adx <- dx <- pdi、mdi <- atr。计算时只执行需要的输出用到的节点，按注册顺序执行(注册时输入必须已经注册)。
+# 节点函数的参数是输入数组，返回输出数组(多个输出返回元组)。
+FIELDS = ('open', 'close', 'high', 'low', 'volume', 'amount', 'p_change')
+
+_nodes = []  # (函数, 输出, 输入)
+_producer = {}  # 输出 -> 节点序号
+
+
+def _node(*outputs, inputs):
+    def register(func):
+        for name in inputs:
+            if name not in FIELDS and name not in _producer:
+                raise ValueError(f"{func.__name__}的输入{name}没有注册")
+        for name in outputs:
+            _producer[name] = len(_nodes)
+        _nodes.append((func, outputs, inputs))
+        return func
+
+    return register
+
+
+@_node('macd', 'macds', 'macdh', inputs=('close',))
+def _macd(close):
+    macd, macds, macdh = tl.MACD(close, fastperiod=12, slowperiod=26, signalperiod=9)
+    return _fill(macd), _fill(macds), _fill(macdh)
+
+
+@_node('kdjk', 'kdjd', 'kdjj', inputs=('high', 'low', 'close'))
+def _kdj(high, low, close):
+    kdjk, kdjd = tl.STOCH(high, low, close, fastk_period=9, slowk_period=5, slowk_matype=1,
+                          slowd_period=5, slowd_matype=1)
+    _fill(kdjk)
+    _fill(kdjd)
+    return kdjk, kdjd, 3 * kdjk - 2 * kdjd
+
+
+# boll 计算结果和stockstats不同boll_ub,boll_lb
+@_node('boll_ub', 'boll', 'boll_lb', inputs=('close',))
+def _boll(close):
+    boll_ub, boll, boll_lb = tl.BBANDS(close, timeperiod=20, nbdevup=2, nbdevdn=2, matype=0)
+    return _fill(boll_ub), _fill(boll), _fill(boll_lb)
+
+
+@_node('trix', inputs=('close',))
+def _trix(close):
+    return _fill(tl.TRIX(close, timeperiod=12))
+
+
+@_node('trix_20_sma', inputs=('trix',))
+def _trix_20_sma(trix):
+    return _fill(tl.MA(trix, timeperiod=20))
+
+
+# 中间数据
+@_node('m_price', 'm_price_sf1', inputs=('amount', 'volume'))
+def _m_price(amount, volume):
+    m_price = amount / volume
+    return m_price, _shift(m_price, 1)
+
+
+@_node('prev_close', 'h_l', 'h_cy', 'cy_l', inputs=('close', 'high', 'low'))
+def _prev_close(close, high, low):
+    prev_close = _shift(close, 1)
+    return prev_close, high - low, high - prev_close, prev_close - low
+
+
+@_node('prev_high', 'prev_low', 'hl_avg', inputs=('high', 'low'))
+def _prev_high(high, low):
+    return _shift(high, 1), _shift(low, 1), (high + low) / 2.0
+
+
+@_node('cr', inputs=('high', 'low', 'm_price_sf1'))
+def _cr(high, low, m_price_sf1):
+    h_m = high - np.minimum(m_price_sf1, high)
+    m_l = m_price_sf1 - np.minimum(m_price_sf1, low)
+    return _fill_inf(tl.SUM(h_m, timeperiod=26) / tl.SUM(m_l, timeperiod=26)) * 100
+
+
+@_node('cr-ma1', inputs=('cr',))
+def _cr_ma1(cr):
+    return _fill(tl.MA(cr, timeperiod=5))
+
+
+@_node('cr-ma2', inputs=('cr',))
+def _cr_ma2(cr):
+    return _fill(tl.MA(cr, timeperiod=10))
+
+
+@_node('cr-ma3', inputs=('cr',))
+def _cr_ma3(cr):
+    return _fill(tl.MA(cr, timeperiod=20))
+
+
+@_node('rsi', inputs=('close',))
+def _rsi(close):
+    return _fill(tl.RSI(close, timeperiod=14))
+
+
+@_node('rsi_6', inputs=('close',))
+def _rsi_6(close):
+    return _fill(tl.RSI(close, timeperiod=6))
+
+
+@_node('rsi_12', inputs=('close',))
+def _rsi_12(close):
+    return _fill(tl.RSI(close, timeperiod=12))
+
+
+@_node('rsi_24', inputs=('close',))
+def _rsi_24(close):
+    return _fill(tl.RSI(close, timeperiod=24))
+
+
+@_node('vr', inputs=('volume', 'p_change'))
+def _vr(volume, p_change):
+    avs = tl.SUM(np.where(p_change > 0, volume, 0), timeperiod=26)
+    bvs = tl.SUM(np.where(p_change < 0, volume, 0), timeperiod=26)
+    cvs = tl.SUM(np.where(p_change == 0, volume, 0), timeperiod=26)
+    return _fill_inf((avs + cvs / 2) / (bvs + cvs / 2)) * 100
+
+
+@_node('vr_6_sma', inputs=('vr',))
+def _vr_6_sma(vr):
+    return _fill(tl.MA(vr, timeperiod=6))
+
+
+@_node('tr', inputs=('h_l', 'h_cy', 'cy_l'))
+def _tr(h_l, h_cy, cy_l):
+    return _fill(np.fmax(np.fmax(h_l, abs(h_cy)), abs(cy_l)))
+
+
+@_node('atr', inputs=('high', 'low', 'close'))
+def _atr(high, low, close):
+    return _fill(tl.ATR(high, low, close, timeperiod=14))
+
+
+# DMI
+# talib计算公式和stockstats不同，使用stockstats计算公式
+@_node('high_m', 'low_m', inputs=('high', 'low'))
+def _dm(high, low):
+    high_delta = np.insert(np.diff(high), 0, 0.0)
+    low_delta = np.insert(-np.diff(low), 0, 0.0)
+    return (high_delta + abs(high_delta)) / 2, (low_delta + abs(low_delta)) / 2
+
+
+@_node('pdi', inputs=('high_m', 'low_m', 'atr'))
+def _pdi(high_m, low_m, atr):
+    pdm = _fill(tl.EMA(np.where(high_m > low_m, high_m, 0), timeperiod=14))
+    return _fill_inf(pdm / atr) * 100
+
+
+@_node('mdi', inputs=('high_m', 'low_m', 'atr'))
+def _mdi(high_m, low_m, atr):
+    mdm = _fill(tl.EMA(np.where(low_m > high_m, low_m, 0), timeperiod=14))
+    return _fill_inf(mdm / atr) * 100
+
+
+@_node('dx', inputs=('pdi', 'mdi'))
+def _dx(pdi, mdi):
+    return _fill_inf(abs(pdi - mdi) / (pdi + mdi)) * 100
+
+
+@_node('adx', inputs=('dx',))
+def _adx(dx):
+    return _fill(tl.EMA(dx, timeperiod=6))
+
+
+@_node('adxr', inputs=('adx',))
+def _adxr(adx):
+    return _fill(tl.EMA(adx, timeperiod=6))
+
+
+@_node('wr_6', inputs=('high', 'low', 'close'))
+def _wr_6(high, low, close):
+    return _fill(tl.WILLR(high, low, close, timeperiod=6))
+
+
+@_node('wr_10', inputs=('high', 'low', 'close'))
+def _wr_10(high, low, close):
+    return _fill(tl.WILLR(high, low, close, timeperiod=10))
+
+
+@_node('wr_14', inputs=('high', 'low', 'close'))
+def _wr_14(high, low, close):
+    return _fill(tl.WILLR(high, low, close, timeperiod=14))
+
+
+# cci 计算方法和结果和stockstats不同，stockstats典型价采用均价(总额/成交量)计算
+@_node('cci', inputs=('high', 'low', 'close'))
+def _cci(high, low, close):
+    return _fill(tl.CCI(high, low, close, timeperiod=14))
+
+
+@_node('cci_84', inputs=('high', 'low', 'close'))
+def _cci_84(high, low, close):
+    return _fill(tl.CCI(high, low, close, timeperiod=84))
+
+
+@_node('ma10', inputs=('close',))
+def _ma10(close):
+    return _fill(tl.MA(close, timeperiod=10))
+
+
+@_node('ma50', inputs=('close',))
+def _ma50(close):
+    return _fill(tl.MA(close, timeperiod=50))
+
+
+@_node('dma', inputs=('ma10', 'ma50'))
+def _dma(ma10, ma50):
+    return ma10 - ma50
+
+
+@_node('dma_10_sma', inputs=('dma',))
+def _dma_10_sma(dma):
+    return _fill(tl.MA(dma, timeperiod=10))
+
+
+@_node('tema', inputs=('close',))
+def _tema(close):
+    return _fill(tl.TEMA(close, timeperiod=14))
+
+
+# mfi 计算方法和结果和stockstats不同，stockstats典型价采用均价(总额/成交量)计算
+@_node('mfi', inputs=('high', 'low', 'close', 'volume'))
+def _mfi(high, low, close, volume):
+    return _fill(tl.MFI(high, low, close, volume, timeperiod=14))
+
+
+@_node('mfisma', inputs=('mfi',))
+def _mfisma(mfi):
+    return tl.MA(mfi, timeperiod=6)
+
+
+@_node('vwma', inputs=('amount', 'volume'))
+def _vwma(amount, volume):
+    return _fill_inf(tl.SUM(amount, timeperiod=14) / tl.SUM(volume, timeperiod=14))
+
+
+@_node('mvwma', inputs=('vwma',))
+def _mvwma(vwma):
+    return tl.MA(vwma, timeperiod=6)
+
+
+@_node('ppo', inputs=('close',))
+def _ppo(close):
+    return _fill(tl.PPO(close, fastperiod=12, slowperiod=26, matype=1))
+
+
+@_node('ppos', inputs=('ppo',))
+def _ppos(ppo):
+    return _fill(tl.EMA(ppo, timeperiod=9))
+
+
+@_node('ppoh', inputs=('ppo', 'ppos'))
+def _ppoh(ppo, ppos):
+    return ppo - ppos
+
+
+# stochrsi
+# talib计算公式和stockstats不同，使用stockstats计算公式
+@_node('stochrsi_k', inputs=('rsi',))
+def _stochrsi_k(rsi):
+    rsi_min = tl.MIN(rsi, timeperiod=14)
+    rsi_max = tl.MAX(rsi, timeperiod=14)
+    return _fill_inf((rsi - rsi_min) / (rsi_max - rsi_min)) * 100
+
+
+@_node('stochrsi_d', inputs=('stochrsi_k',))
+def _stochrsi_d(stochrsi_k):
+    return tl.MA(stochrsi_k, timeperiod=3)
+
+
+@_node('wt1', inputs=('m_price',))
+def _wt1(m_price):
+    esa = _fill(tl.EMA(m_price, timeperiod=10))
+    esa_d = tl.EMA(abs(m_price - esa), timeperiod=10)
+    esa_ci = _fill_inf((m_price - esa) / (0.015 * esa_d))
+    return _fill(tl.EMA(esa_ci, timeperiod=21))
+
+
+@_node('wt2', inputs=('wt1',))
+def _wt2(wt1):
+    return _fill(tl.MA(wt1, timeperiod=4))
+
+
+@_node('supertrend_ub', 'supertrend_lb', 'supertrend', inputs=('close', 'hl_avg', 'atr'))
+def _supertrend_node(close, hl_avg, atr):
+    m_atr = atr * 3
+    return _supertrend(close, hl_avg + m_atr, hl_avg - m_atr)
+
+
+# ----------stockstats没有以下指标-----------------
+@_node('roc', inputs=('close',))
+def _roc(close):
+    return _fill(tl.ROC(close, timeperiod=12))
+
+
+@_node('rocma', inputs=('roc',))
+def _rocma(roc):
+    return _fill(tl.MA(roc, timeperiod=6))
+
+
+@_node('rocema', inputs=('roc',))
+def _rocema(roc):
+    return _fill(tl.EMA(roc, timeperiod=9))
+
+
+@_node('obv', inputs=('close', 'volume'))
+def _obv(close, volume):
+    return _fill(tl.OBV(close, volume))
+
+
+@_node('sar', inputs=('high', 'low'))
+def _sar(high, low):
+    return _fill(tl.SAR(high, low))
+
+
+@_node('psy', inputs=('close', 'prev_close'))
+def _psy(close, prev_close):
+    price_up = np.where(close > prev_close, 1.0, 0.0)
+    return _fill(tl.SUM(price_up, timeperiod=12) / 12.0) * 100
+
+
+@_node('psyma', inputs=('psy',))
+def _psyma(psy):
+    return tl.MA(psy, timeperiod=6)
+
+
+# BRAR
+@_node('ar', inputs=('high', 'low', 'open'))
+def _ar(high, low, open):
+    return _fill_inf(tl.SUM(high - open, timeperiod=26) / tl.SUM(open - low, timeperiod=26)) * 100
+
+
+@_node('br', inputs=('h_cy', 'cy_l'))
+def _br(h_cy, cy_l):
+    return _fill_inf(tl.SUM(h_cy, timeperiod=26) / tl.SUM(cy_l, timeperiod=26)) * 100
+
+
+@_node('emv', inputs=('hl_avg', 'prev_high', 'prev_low', 'h_l', 'amount'))
+def _emv(hl_avg, prev_high, prev_low, h_l, amount):
+    phl_avg = (prev_high + prev_low) / 2.0
+    emva_em = (hl_avg - phl_avg) * h_l / amount
+    return _fill(tl.SUM(emva_em, timeperiod=14))
+
+
+@_node('emva', inputs=('emv',))
+def _emva(emv):
+    return _fill(tl.MA(emv, timeperiod=9))
+
+
+# BIAS
+@_node('ma6', 'bias', inputs=('close',))
+def _bias(close):
+    ma6 = _fill(tl.MA(close, timeperiod=6))
+    return ma6, _fill_inf((close - ma6) / ma6) * 100
+
+
+@_node('ma12', 'bias_12', inputs=('close',))
+def _bias_12(close):
+    ma12 = _fill(tl.MA(close, timeperiod=12))
+    return ma12, _fill_inf((close - ma12) / ma12) * 100
+
+
+@_node('ma24', 'bias_24', inputs=('close',))
+def _bias_24(close):
+    ma24 = _fill(tl.MA(close, timeperiod=24))
+    return ma24, _fill_inf((close - ma24) / ma24) * 100
+
+
+@_node('dpo', inputs=('close',))
+def _dpo(close):
+    c_m_11 = tl.MA(close, timeperiod=11)
+    return _fill(close - _shift(c_m_11, 1))
+
+
+@_node('madpo', inputs=('dpo',))
+def _madpo(dpo):
+    return _fill(tl.MA(dpo, timeperiod=6))
+
+
+@_node('vhf', inputs=('close', 'prev_close'))
+def _vhf(close, prev_close):
+    hcp_lcp = _fill(tl.MAX(close, timeperiod=28) - tl.MIN(close, timeperiod=28))
+    return _fill(np.divide(hcp_lcp, tl.SUM(abs(close - prev_close), timeperiod=28)))
+
+
+@_node('rvi', inputs=('open', 'close', 'high', 'low', 'prev_close', 'prev_high', 'prev_low'))
+def _rvi(open, close, high, low, prev_close, prev_high, prev_low):
+    rvi_x = ((close - open) + 2 * (prev_close - _shift(open, 1)) + 2 * (_shift(close, 2) - _shift(open, 2)) +
+             (_shift(close, 3) - _shift(open, 3))) / 6
+    rvi_y = ((high - low) + 2 * (prev_high - prev_low) + 2 * (_shift(high, 2) - _shift(low, 2)) +
+             (_shift(high, 3) - _shift(low, 3))) / 6
+    return _fill_inf(tl.MA(rvi_x, timeperiod=10) / tl.MA(rvi_y, timeperiod=10))
+
+
+@_node('rvis', inputs=('rvi',))
+def _rvis(rvi):
+    return (rvi + 2 * _shift(rvi, 1) + 2 * _shift(rvi, 2) + _shift(rvi, 3)) / 6
+
+
+@_node('fi', inputs=('close', 'volume'))
+def _fi(close, volume):
+    return np.insert(np.diff(close), 0, 0.0) * volume
+
+
+@_node('force_2', inputs=('fi',))
+def _force_2(fi):
+    return _fill(tl.EMA(fi, timeperiod=2))
+
+
+@_node('force_13', inputs=('fi',))
+def _force_13(fi):
+    return _fill(tl.EMA(fi, timeperiod=13))
+
+
+@_node('ene_ue', 'ene_le', 'ene', inputs=('ma10',))
+def _ene(ma10):
+    ene_ue = (1 + 11 / 100) * ma10
+    ene_le = (1 - 9 / 100) * ma10
+    return ene_ue, ene_le, (ene_ue + ene_le) / 2
+
+
+@_node('vol_5', inputs=('volume',))
+def _vol_5(volume):
+    return _fill(tl.MA(volume, timeperiod=5))
+
+
+@_node('vol_10', inputs=('volume',))
+def _vol_10(volume):
+    return _fill(tl.MA(volume, timeperiod=10))
+
+
+@_node('ma20', inputs=('close',))
+def _ma20(close):
+    return _fill(tl.MA(close, timeperiod=20))
+
+
+@_node('ma200', inputs=('close',))
+def _ma200(close):
+    return _fill(tl.MA(close, timeperiod=200))
+
+
+# 计算 columns 需要执行的节点序号，按注册顺序。FIELDS 里的列不需要计算，其他没有注册的列报错。
+@functools.lru_cache(maxsize=64)
+def _resolve(columns):
+    need = set()
+    stack = [name for name in columns if name not in FIELDS]
+    while stack:
+        name = stack.pop()
+        if name not in _producer:
+            raise KeyError(f"没有指标{name}")
+        i = _producer[name]
+        if i in need:
+            continue
+        need.add(i)
+        stack.extend(n for n in _nodes[i][2] if n not in FIELDS)
+    return sorted(need)
+
+
+# 指标计算，输入开盘、收盘、最高、最低、成交量、成交额、涨跌幅数组，返回 指标名 -> 数组。
+# columns 为需要的指标，默认 INDICATOR_COLUMNS 全部，只执行这些指标和它们的输入用到的节点。
+def calculate(open, close, high, low, volume, amount, p_change, columns=None):
+    if columns is None:
+        columns = INDICATOR_COLUMNS
+    columns = tuple(name for name in columns if name not in FIELDS)
+    r = {'open': open, 'close': close, 'high': high, 'low': low, 'volume': volume, 'amount': amount,
+         'p_change': p_change}
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for i in _resolve(columns):
+            func, outputs, inputs = _nodes[i]
+            values = func(*[r[name] for name in inputs])
+            if len(outputs) == 1:
+                r[outputs[0]] = values
+            else:
+                r.update(zip(outputs, values))
+    return {name: r[name] for name in columns}
+
+
+def _get_arrays(data):
+    return [np.asarray(data[name].values, dtype=np.float64) for name in FIELDS]
+
+
+def _select(data, end_date, calc_threshold):
+    if end_date is not None:
+        data = data.loc[data['date'].values <= end_date]
+    if calc_threshold is not None:
+        data = data.tail(n=calc_threshold)
+    return data
+
+
+# columns 为需要的指标，默认全部，只计算这些指标需要的部分。
+def get_indicators(data, end_date=None, threshold=120, calc_threshold=None, columns=None):
     try:
-        isCopy = False
-        if end_date is not None:
-            mask = (data['date'] <= end_date)
-            data = data.loc[mask]
-            isCopy = True
-        if calc_threshold is not None:
-            data = data.tail(n=calc_threshold)
-            isCopy = True
-
-        if isCopy:
-            data = data.copy()
-
-        # import stockstats
-        # test = data.copy()
-        # test = stockstats.StockDataFrame.retype(test)  # 验证计算结果
-
-        with np.errstate(divide='ignore', invalid='ignore'):
-
-            # macd
-            data.loc[:, 'macd'], data.loc[:, 'macds'], data.loc[:, 'macdh'] = tl.MACD(
-                data['close'].values, fastperiod=12, slowperiod=26, signalperiod=9)
-            data['macd'].values[np.isnan(data['macd'].values)] = 0.0
-            data['macds'].values[np.isnan(data['macds'].values)] = 0.0
-            data['macdh'].values[np.isnan(data['macdh'].values)] = 0.0
-
-            # kdjk
-            data.loc[:, 'kdjk'], data.loc[:, 'kdjd'] = tl.STOCH(
-                data['high'].values, data['low'].values, data['close'].values, fastk_period=9,
-                slowk_period=5, slowk_matype=1, slowd_period=5, slowd_matype=1)
-            data['kdjk'].values[np.isnan(data['kdjk'].values)] = 0.0
-            data['kdjd'].values[np.isnan(data['kdjd'].values)] = 0.0
-            data.loc[:, 'kdjj'] = 3 * data['kdjk'].values - 2 * data['kdjd'].values
-
-            # boll 计算结果和stockstats不同boll_ub,boll_lb
-            data.loc[:, 'boll_ub'], data.loc[:, 'boll'], data.loc[:, 'boll_lb'] = tl.BBANDS \
-                (data['close'].values, timeperiod=20, nbdevup=2, nbdevdn=2, matype=0)
-            data['boll_ub'].values[np.isnan(data['boll_ub'].values)] = 0.0
-            data['boll'].values[np.isnan(data['boll'].values)] = 0.0
-            data['boll_lb'].values[np.isnan(data['boll_lb'].values)] = 0.0
-
-            # trix
-            data.loc[:, 'trix'] = tl.TRIX(data['close'].values, timeperiod=12)
-            data['trix'].values[np.isnan(data['trix'].values)] = 0.0
-            data.loc[:, 'trix_20_sma'] = tl.MA(data['trix'].values, timeperiod=20)
-            data['trix_20_sma'].values[np.isnan(data['trix_20_sma'].values)] = 0.0
-
-            # cr
-            data.loc[:, 'm_price'] = data['amount'].values / data['volume'].values
-            data.loc[:, 'm_price_sf1'] = data['m_price'].shift(1, fill_value=0.0).values
-            data.loc[:, 'h_m'] = data['high'].values - data[['m_price_sf1', 'high']].values.min(axis=1)
-            data.loc[:, 'm_l'] = data['m_price_sf1'].values - data[['m_price_sf1', 'low']].values.min(axis=1)
-            data.loc[:, 'h_m_sum'] = tl.SUM(data['h_m'].values, timeperiod=26)
-            data.loc[:, 'm_l_sum'] = tl.SUM(data['m_l'].values, timeperiod=26)
-            data.loc[:, 'cr'] = data['h_m_sum'].values / data['m_l_sum'].values
-            data['cr'].values[np.isnan(data['cr'].values)] = 0.0
-            data['cr'].values[np.isinf(data['cr'].values)] = 0.0
-            data['cr'] = data['cr'].values * 100
-            data.loc[:, 'cr-ma1'] = tl.MA(data['cr'].values, timeperiod=5)
-            data['cr-ma1'].values[np.isnan(data['cr-ma1'].values)] = 0.0
-            data.loc[:, 'cr-ma2'] = tl.MA(data['cr'].values, timeperiod=10)
-            data['cr-ma2'].values[np.isnan(data['cr-ma2'].values)] = 0.0
-            data.loc[:, 'cr-ma3'] = tl.MA(data['cr'].values, timeperiod=20)
-            data['cr-ma3'].values[np.isnan(data['cr-ma3'].values)] = 0.0
-
-            # rsi
-            data.loc[:, 'rsi'] = tl.RSI(data['close'].values, timeperiod=14)
-            data['rsi'].values[np.isnan(data['rsi'].values)] = 0.0
-            data.loc[:, 'rsi_6'] = tl.RSI(data['close'].values, timeperiod=6)
-            data['rsi_6'].values[np.isnan(data['rsi_6'].values)] = 0.0
-            data.loc[:, 'rsi_12'] = tl.RSI(data['close'].values, timeperiod=12)
-            data['rsi_12'].values[np.isnan(data['rsi_12'].values)] = 0.0
-            data.loc[:, 'rsi_24'] = tl.RSI(data['close'].values, timeperiod=24)
-            data['rsi_24'].values[np.isnan(data['rsi_24'].values)] = 0.0
-
-            # vr
-            data.loc[:, 'av'] = np.where(data['p_change'].values > 0, data['volume'].values, 0)
-            data.loc[:, 'avs'] = tl.SUM(data['av'].values, timeperiod=26)
-            data.loc[:, 'bv'] = np.where(data['p_change'].values < 0, data['volume'].values, 0)
-            data.loc[:, 'bvs'] = tl.SUM(data['bv'].values, timeperiod=26)
-            data.loc[:, 'cv'] = np.where(data['p_change'].values == 0, data['volume'].values, 0)
-            data.loc[:, 'cvs'] = tl.SUM(data['cv'].values, timeperiod=26)
-            data.loc[:, 'vr'] = (data['avs'].values + data['cvs'].values / 2) / (data['bvs'].values + data['cvs'].values / 2)
-            data['vr'].values[np.isnan(data['vr'].values)] = 0.0
-            data['vr'].values[np.isinf(data['vr'].values)] = 0.0
-            data['vr'] = data['vr'].values * 100
-            data.loc[:, 'vr_6_sma'] = tl.MA(data['vr'].values, timeperiod=6)
-            data['vr_6_sma'].values[np.isnan(data['vr_6_sma'].values)] = 0.0
-
-            # atr
-            data.loc[:, 'prev_close'] = data['close'].shift(1, fill_value=0.0).values
-            data.loc[:, 'h_l'] = data['high'].values - data['low'].values
-            data.loc[:, 'h_cy'] = data['high'].values - data['prev_close'].values
-            data.loc[:, 'cy_l'] = data['prev_close'].values - data['low'].values
-            data.loc[:, 'h_cy_a'] = abs(data['h_cy'].values)
-            data.loc[:, 'cy_l_a'] = abs(data['cy_l'].values)
-            data.loc[:, 'tr'] = data.loc[:, ['h_l', 'h_cy_a', 'cy_l_a']].T.max().values
-            data['tr'].values[np.isnan(data['tr'].values)] = 0.0
-            data.loc[:, 'atr'] = tl.ATR(data['high'].values, data['low'].values, data['close'].values, timeperiod=14)
-            data['atr'].values[np.isnan(data['atr'].values)] = 0.0
-
-            # DMI
-            # talib计算公式和stockstats不同
-            # talib计算公式
-            # data.loc[:, 'pdi'] = tl.PLUS_DI(data['high'].values, data['low'].values, data['close'].values, timeperiod=14)
-            # data['pdi'].values[np.isnan(data['pdi'].values)] = 0.0
-            # data.loc[:, 'mdi'] = tl.MINUS_DI(data['high'].values, data['low'].values, data['close'].values, timeperiod=14)
-            # data['mdi'].values[np.isnan(data['mdi'].values)] = 0.0
-            # data.loc[:, 'dx'] = tl.DX(data['high'].values, data['low'].values, data['close'].values, timeperiod=14)
-            # data['dx'].values[np.isnan(data['dx'].values)] = 0.0
-            # data.loc[:, 'adx'] = tl.ADX(data['high'].values, data['low'].values, data['close'].values, timeperiod=6)
-            # data['adx'].values[np.isnan(data['adx'].values)] = 0.0
-            # data.loc[:, 'adxr'] = tl.ADXR(data['high'].values, data['low'].values, data['close'].values, timeperiod=6)
-            # data['adxr'].values[np.isnan(data['adxr'].values)] = 0.0
-            # stockstats计算公式
-            data.loc[:, 'high_delta'] = np.insert(np.diff(data['high'].values), 0, 0.0)
-            data.loc[:, 'high_m'] = (data['high_delta'].values + abs(data['high_delta'].values)) / 2
-            data.loc[:, 'low_delta'] = np.insert(-np.diff(data['low'].values), 0, 0.0)
-            data.loc[:, 'low_m'] = (data['low_delta'].values + abs(data['low_delta'].values)) / 2
-            data.loc[:, 'pdm'] = tl.EMA(np.where(data['high_m'].values > data['low_m'].values, data['high_m'].values, 0), timeperiod=14)
-            data['pdm'].values[np.isnan(data['pdm'].values)] = 0.0
-            data.loc[:, 'pdi'] = data['pdm'].values / data['atr'].values
-            data['pdi'].values[np.isnan(data['pdi'].values)] = 0.0
-            data['pdi'].values[np.isinf(data['pdi'].values)] = 0.0
-            data['pdi'] = data['pdi'].values * 100
-            data.loc[:, 'mdm'] = tl.EMA(np.where(data['low_m'].values > data['high_m'].values, data['low_m'].values, 0), timeperiod=14)
-            data['mdm'].values[np.isnan(data['mdm'].values)] = 0.0
-            data.loc[:, 'mdi'] = data['mdm'].values / data['atr'].values
-            data['mdi'].values[np.isnan(data['mdi'].values)] = 0.0
-            data['mdi'].values[np.isinf(data['mdi'].values)] = 0.0
-            data['mdi'] = data['mdi'].values * 100
-            data.loc[:, 'dx'] = abs(data['pdi'].values - data['mdi'].values) / (data['pdi'].values + data['mdi'].values)
-            data['dx'].values[np.isnan(data['dx'].values)] = 0.0
-            data['dx'].values[np.isinf(data['dx'].values)] = 0.0
-            data['dx'] = data['dx'].values * 100
-            data.loc[:, 'adx'] = tl.EMA(data['dx'].values, timeperiod=6)
-            data['adx'].values[np.isnan(data['adx'].values)] = 0.0
-            data.loc[:, 'adxr'] = tl.EMA(data['adx'].values, timeperiod=6)
-            data['adxr'].values[np.isnan(data['adxr'].values)] = 0.0
-
-            # wr
-            data.loc[:, 'wr_6'] = tl.WILLR(data['high'].values, data['low'].values, data['close'].values, timeperiod=6)
-            data['wr_6'].values[np.isnan(data['wr_6'].values)] = 0.0
-            data.loc[:, 'wr_10'] = tl.WILLR(data['high'].values, data['low'].values, data['close'].values, timeperiod=10)
-            data['wr_10'].values[np.isnan(data['wr_10'].values)] = 0.0
-            data.loc[:, 'wr_14'] = tl.WILLR(data['high'].values, data['low'].values, data['close'].values, timeperiod=14)
-            data['wr_14'].values[np.isnan(data['wr_14'].values)] = 0.0
-
-            # cci 计算方法和结果和stockstats不同，stockstats典型价采用均价(总额/成交量)计算
-            data.loc[:, 'cci'] = tl.CCI(data['high'].values, data['low'].values, data['close'].values, timeperiod=14)
-            data['cci'].values[np.isnan(data['cci'].values)] = 0.0
-            data.loc[:, 'cci_84'] = tl.CCI(data['high'].values, data['low'].values, data['close'].values, timeperiod=84)
-            data['cci_84'].values[np.isnan(data['cci_84'].values)] = 0.0
-
-            # dma
-            data.loc[:, 'ma10'] = tl.MA(data['close'].values, timeperiod=10)
-            data['ma10'].values[np.isnan(data['ma10'].values)] = 0.0
-            data.loc[:, 'ma50'] = tl.MA(data['close'].values, timeperiod=50)
-            data['ma50'].values[np.isnan(data['ma50'].values)] = 0.0
-            data.loc[:, 'dma'] = data['ma10'].values - data['ma50'].values
-            data.loc[:, 'dma_10_sma'] = tl.MA(data['dma'].values, timeperiod=10)
-            data['dma_10_sma'].values[np.isnan(data['dma_10_sma'].values)] = 0.0
-
-            # tema
-            data.loc[:, 'tema'] = tl.TEMA(data['close'].values, timeperiod=14)
-            data['tema'].values[np.isnan(data['tema'].values)] = 0.0
-
-            # mfi 计算方法和结果和stockstats不同，stockstats典型价采用均价(总额/成交量)计算
-            data.loc[:, 'mfi'] = tl.MFI(data['high'].values, data['low'].values, data['close'].values, data['volume'].values, timeperiod=14)
-            data['mfi'].values[np.isnan(data['mfi'].values)] = 0.0
-            data.loc[:, 'mfisma'] = tl.MA(data['mfi'].values, timeperiod=6)
-
-            # vwma
-            data.loc[:, 'tpv_14'] = tl.SUM(data['amount'].values, timeperiod=14)
-            data.loc[:, 'vol_14'] = tl.SUM(data['volume'].values, timeperiod=14)
-            data.loc[:, 'vwma'] = data['tpv_14'].values / data['vol_14'].values
-            data['vwma'].values[np.isnan(data['vwma'].values)] = 0.0
-            data['vwma'].values[np.isinf(data['vwma'].values)] = 0.0
-            data.loc[:, 'mvwma'] = tl.MA(data['vwma'].values, timeperiod=6)
-
-            # ppo
-            data.loc[:, 'ppo'] = tl.PPO(data['close'].values, fastperiod=12, slowperiod=26, matype=1)
-            data['ppo'].values[np.isnan(data['ppo'].values)] = 0.0
-            data.loc[:, 'ppos'] = tl.EMA(data['ppo'].values, timeperiod=9)
-            data['ppos'].values[np.isnan(data['ppos'].values)] = 0.0
-            data.loc[:, 'ppoh'] = data['ppo'].values - data['ppos'].values
-
-            # stochrsi
-            # talib计算公式和stockstats不同
-            # talib计算公式
-            # data.loc[:, 'stochrsi_k'], data.loc[:, 'stochrsi_d'] = tl.STOCHRSI(data['close'].values, timeperiod=14, fastk_period=5, fastd_period=3, fastd_matype=0)
-            data.loc[:, 'rsi_min'] = tl.MIN(data['rsi'].values, timeperiod=14)
-            data.loc[:, 'rsi_max'] = tl.MAX(data['rsi'].values, timeperiod=14)
-            data.loc[:, 'stochrsi_k'] = (data['rsi'].values - data['rsi_min'].values) / (data['rsi_max'].values - data['rsi_min'].values)
-            data['stochrsi_k'].values[np.isnan(data['stochrsi_k'].values)] = 0.0
-            data['stochrsi_k'].values[np.isinf(data['stochrsi_k'].values)] = 0.0
-            data['stochrsi_k'] = data['stochrsi_k'].values * 100
-            data.loc[:, 'stochrsi_d'] = tl.MA(data['stochrsi_k'].values, timeperiod=3)
-
-            # wt
-            data.loc[:, 'esa'] = tl.EMA(data['m_price'].values, timeperiod=10)
-            data['esa'].values[np.isnan(data['esa'].values)] = 0.0
-            data.loc[:, 'esa_d'] = tl.EMA(abs(data['m_price'].values - data['esa'].values), timeperiod=10)
-            data.loc[:, 'esa_ci'] = (data['m_price'].values - data['esa'].values) / (0.015 * data['esa_d'].values)
-            data['esa_ci'].values[np.isnan(data['esa_ci'].values)] = 0.0
-            data['esa_ci'].values[np.isinf(data['esa_ci'].values)] = 0.0
-            data.loc[:, 'wt1'] = tl.EMA(data['esa_ci'].values, timeperiod=21)
-            data['wt1'].values[np.isnan(data['wt1'].values)] = 0.0
-            data.loc[:, 'wt2'] = tl.MA(data['wt1'].values, timeperiod=4)
-            data['wt2'].values[np.isnan(data['wt2'].values)] = 0.0
-
-            # Supertrend
-            data.loc[:, 'm_atr'] = data['atr'].values * 3
-            data.loc[:, 'hl_avg'] = (data['high'].values + data['low'].values) / 2.0
-            data.loc[:, 'b_ub'] = data['hl_avg'].values + data['m_atr'].values
-            data.loc[:, 'b_lb'] = data['hl_avg'].values - data['m_atr'].values
-            size = len(data.index)
-            ub = np.empty(size, dtype=np.float64)
-            lb = np.empty(size, dtype=np.float64)
-            st = np.empty(size, dtype=np.float64)
-            for i in range(size):
-                if i == 0:
-                    ub[i] = data['b_ub'].iloc[i]
-                    lb[i] = data['b_lb'].iloc[i]
-                    if data['close'].iloc[i] <= ub[i]:
-                        st[i] = ub[i]
-                    else:
-                        st[i] = lb[i]
-                    continue
-
-                last_close = data['close'].iloc[i - 1]
-                curr_close = data['close'].iloc[i]
-                last_ub = ub[i - 1]
-                last_lb = lb[i - 1]
-                last_st = st[i - 1]
-                curr_b_ub = data['b_ub'].iloc[i]
-                curr_b_lb = data['b_lb'].iloc[i]
-
-                # calculate current upper band
-                if curr_b_ub < last_ub or last_close > last_ub:
-                    ub[i] = curr_b_ub
-                else:
-                    ub[i] = last_ub
-
-                # calculate current lower band
-                if curr_b_lb > last_lb or last_close < last_lb:
-                    lb[i] = curr_b_lb
-                else:
-                    lb[i] = last_lb
-
-                # calculate supertrend
-                if last_st == last_ub:
-                    if curr_close <= ub[i]:
-                        st[i] = ub[i]
-                    else:
-                        st[i] = lb[i]
-                elif last_st == last_lb:
-                    if curr_close > lb[i]:
-                        st[i] = lb[i]
-                    else:
-                        st[i] = ub[i]
-
-            data.loc[:, 'supertrend_ub'] = ub
-            data.loc[:, 'supertrend_lb'] = lb
-            data.loc[:, 'supertrend'] = st
-            data = data.copy()
-            # ----------stockstats没有以下指标-----------------
-            # roc
-            data.loc[:, 'roc'] = tl.ROC(data['close'].values, timeperiod=12)
-            data['roc'].values[np.isnan(data['roc'].values)] = 0.0
-            data.loc[:, 'rocma'] = tl.MA(data['roc'].values, timeperiod=6)
-            data['rocma'].values[np.isnan(data['rocma'].values)] = 0.0
-            data.loc[:, 'rocema'] = tl.EMA(data['roc'].values, timeperiod=9)
-            data['rocema'].values[np.isnan(data['rocema'].values)] = 0.0
-
-            # obv
-            data.loc[:, 'obv'] = tl.OBV(data['close'].values, data['volume'].values)
-            data['obv'].values[np.isnan(data['obv'].values)] = 0.0
-
-            # sar
-            data.loc[:, 'sar'] = tl.SAR(data['high'].values, data['low'].values)
-            data['sar'].values[np.isnan(data['sar'].values)] = 0.0
-
-            # psy
-            data.loc[:, 'price_up'] = 0.0
-            data.loc[data['close'].values > data['prev_close'].values, 'price_up'] = 1.0
-            data.loc[:, 'price_up_sum'] = tl.SUM(data['price_up'].values, timeperiod=12)
-            data.loc[:, 'psy'] = data['price_up_sum'].values / 12.0
-            data['psy'].values[np.isnan(data['psy'].values)] = 0.0
-            data['psy'] = data['psy'].values * 100
-            data.loc[:, 'psyma'] = tl.MA(data['psy'].values, timeperiod=6)
-
-            # BRAR
-            data.loc[:, 'h_o'] = data['high'].values - data['open'].values
-            data.loc[:, 'o_l'] = data['open'].values - data['low'].values
-            data.loc[:, 'h_o_sum'] = tl.SUM(data['h_o'].values, timeperiod=26)
-            data.loc[:, 'o_l_sum'] = tl.SUM(data['o_l'].values, timeperiod=26)
-            data.loc[:, 'ar'] = data['h_o_sum'] .values / data['o_l_sum'].values
-            data['ar'].values[np.isnan(data['ar'].values)] = 0.0
-            data['ar'].values[np.isinf(data['ar'].values)] = 0.0
-            data['ar'] = data['ar'].values * 100
-            data.loc[:, 'h_cy_sum'] = tl.SUM(data['h_cy'].values, timeperiod=26)
-            data.loc[:, 'cy_l_sum'] = tl.SUM(data['cy_l'].values, timeperiod=26)
-            data.loc[:, 'br'] = data['h_cy_sum'].values / data['cy_l_sum'].values
-            data['br'].values[np.isnan(data['br'].values)] = 0.0
-            data['br'].values[np.isinf(data['br'].values)] = 0.0
-            data['br'] = data['br'].values * 100
-
-            # EMV
-            data.loc[:, 'prev_high'] = data['high'].shift(1, fill_value=0.0).values
-            data.loc[:, 'prev_low'] = data['low'].shift(1, fill_value=0.0).values
-            data.loc[:, 'phl_avg'] = (data['prev_high'].values + data['prev_low'].values) / 2.0
-            data.loc[:, 'emva_em'] = (data['hl_avg'].values - data['phl_avg'].values) * data['h_l'].values / data['amount'].values
-            data.loc[:, 'emv'] = tl.SUM(data['emva_em'].values, timeperiod=14)
-            data['emv'].values[np.isnan(data['emv'].values)] = 0.0
-            data.loc[:, 'emva'] = tl.MA(data['emv'].values, timeperiod=9)
-            data['emva'].values[np.isnan(data['emva'].values)] = 0.0
-
-            # BIAS
-            data.loc[:, 'ma6'] = tl.MA(data['close'].values, timeperiod=6)
-            data['ma6'].values[np.isnan(data['ma6'].values)] = 0.0
-            data.loc[:, 'ma12'] = tl.MA(data['close'].values, timeperiod=12)
-            data['ma12'].values[np.isnan(data['ma12'].values)] = 0.0
-            data.loc[:, 'ma24'] = tl.MA(data['close'].values, timeperiod=24)
-            data['ma24'].values[np.isnan(data['ma24'].values)] = 0.0
-            data.loc[:, 'bias'] = ((data['close'].values - data['ma6'].values) / data['ma6'].values)
-            data['bias'].values[np.isnan(data['bias'].values)] = 0.0
-            data['bias'].values[np.isinf(data['bias'].values)] = 0.0
-            data['bias'] = data['bias'].values * 100
-            data.loc[:, 'bias_12'] = (data['close'].values - data['ma12'].values) / data['ma12'].values
-            data['bias_12'].values[np.isnan(data['bias_12'].values)] = 0.0
-            data['bias_12'].values[np.isinf(data['bias_12'].values)] = 0.0
-            data['bias_12'] = data['bias_12'].values * 100
-            data.loc[:, 'bias_24'] = (data['close'].values - data['ma24'].values) / data['ma24'].values
-            data['bias_24'].values[np.isnan(data['bias_24'].values)] = 0.0
-            data['bias_24'].values[np.isinf(data['bias_24'].values)] = 0.0
-            data['bias_24'] = data['bias_24'].values * 100
-
-            # DPO
-            data.loc[:, 'c_m_11'] = tl.MA(data['close'].values, timeperiod=11)
-            data.loc[:, 'dpo'] = data['close'].values - data['c_m_11'].shift(1, fill_value=0.0).values
-            data['dpo'].values[np.isnan(data['dpo'].values)] = 0.0
-            data.loc[:, 'madpo'] = tl.MA(data['dpo'].values, timeperiod=6)
-            data['madpo'].values[np.isnan(data['madpo'].values)] = 0.0
-
-            # VHF
-            data.loc[:, 'hcp_lcp'] = tl.MAX(data['close'].values, timeperiod=28) - tl.MIN(data['close'].values, timeperiod=28)
-            data['hcp_lcp'].values[np.isnan(data['hcp_lcp'].values)] = 0.0
-            data.loc[:, 'vhf'] = np.divide(data['hcp_lcp'].values, tl.SUM(abs(data['close'].values - data['prev_close'].values), timeperiod=28))
-            data['vhf'].values[np.isnan(data['vhf'].values)] = 0.0
-
-            # RVI
-            data.loc[:, 'rvi_x'] = ((data['close'].values - data['open'].values) +
-                                    2 * (data['prev_close'].values - data['open'].shift(1, fill_value=0.0).values) +
-                                    2 * (data['close'].shift(2, fill_value=0.0).values - data['open'].shift(2, fill_value=0.0).values) +
-                                    (data['close'].shift(3, fill_value=0.0).values - data['open'].shift(3, fill_value=0.0).values)) / 6
-            data.loc[:, 'rvi_y'] = ((data['high'].values - data['low'].values) +
-                                    2 * (data['prev_high'].values - data['prev_low'].values) +
-                                    2 * (data['high'].shift(2, fill_value=0.0).values - data['low'].shift(2, fill_value=0.0).values) +
-                                    (data['high'].shift(3, fill_value=0.0).values - data['low'].shift(3, fill_value=0.0).values)) / 6
-            data.loc[:, 'rvi'] = tl.MA(data['rvi_x'].values, timeperiod=10) / tl.MA(data['rvi_y'].values, timeperiod=10)
-            data['rvi'].values[np.isnan(data['rvi'].values)] = 0.0
-            data['rvi'].values[np.isinf(data['rvi'].values)] = 0.0
-            data.loc[:, 'rvis'] = (data['rvi'].values +
-                                   2 * data['rvi'].shift(1, fill_value=0.0).values +
-                                   2 * data['rvi'].shift(2, fill_value=0.0).values +
-                                   data['rvi'].shift(3, fill_value=0.0).values) / 6
-
-            # FI
-            data.loc[:, 'fi'] = np.insert(np.diff(data['close'].values), 0, 0.0) * data['volume'].values
-            data.loc[:, 'force_2'] = tl.EMA(data['fi'].values, timeperiod=2)
-            data['force_2'].values[np.isnan(data['force_2'].values)] = 0.0
-            data.loc[:, 'force_13'] = tl.EMA(data['fi'].values, timeperiod=13)
-            data['force_13'].values[np.isnan(data['force_13'].values)] = 0.0
-
-            # ENE
-            data.loc[:, 'ene_ue'] = (1 + 11 / 100) * data['ma10'].values
-            data.loc[:, 'ene_le'] = (1 - 9 / 100) * data['ma10'].values
-            data.loc[:, 'ene'] = (data['ene_ue'].values + data['ene_le'].values) / 2
-
-            # VOL
-            data.loc[:, 'vol_5'] = tl.MA(data['volume'].values, timeperiod=5)
-            data['vol_5'].values[np.isnan(data['vol_5'].values)] = 0.0
-            data.loc[:, 'vol_10'] = tl.MA(data['volume'].values, timeperiod=10)
-            data['vol_10'].values[np.isnan(data['vol_10'].values)] = 0.0
-
-            # MA
-            data.loc[:, 'ma20'] = tl.MA(data['close'].values, timeperiod=20)
-            data['ma20'].values[np.isnan(data['ma20'].values)] = 0.0
-            data.loc[:, 'ma200'] = tl.MA(data['close'].values, timeperiod=200)
-            data['ma200'].values[np.isnan(data['ma200'].values)] = 0.0
+        data = _select(data, end_date, calc_threshold)
+        result = calculate(*_get_arrays(data), columns=columns)
 
+        # 最后一次生成返回的 DataFrame：原始列加指标列，只取最后 threshold 行
+        start = 0
         if threshold is not None:
-            data = data.tail(n=threshold).copy()
-        return data
+            start = max(len(data.index) - threshold, 0)
+        columns = {name: data[name].values[start:] for name in data.columns}
+        for name, values in result.items():
+            columns[name] = values[start:]
+        return pd.DataFrame(columns, index=data.index[start:])
     except Exception as e:
         logging.error(f"calculate_indicator.get_indicators处理异常：{data['code']}代码{e}")
     return None
@@ -428,7 +622,12 @@ def get_indicator(code_name, data, stock_column, date=None, calc_threshold=90):
                 stock_data_list.append(0)
             return pd.Series(stock_data_list, index=stock_column)
 
-        idr_data = get_indicators(data, end_date=end_date, threshold=1, calc_threshold=calc_threshold)
+        data = _select(data, end_date, calc_threshold)
+        try:
+            idr_data = calculate(*_get_arrays(data), columns=stock_column[2:])
+        except Exception as e:
+            logging.error(f"calculate_indicator.get_indicator处理异常：{code}代码{e}")
+            idr_data = None
 
         # 增加空判断，如果是空返回 0 数据。
         if idr_data is None:
@@ -439,7 +638,11 @@ def get_indicator(code_name, data, stock_column, date=None, calc_threshold=90):
         # 初始化统计类
         for i in range(columns_num):
             # 将数据的最后一个返回。
-            tmp_val = idr_data[stock_column[i + 2]].tail(1).values[0]
+            name = stock_column[i + 2]
+            if name in idr_data:
+                tmp_val = idr_data[name][-1]
+            else:
+                tmp_val = data[name].values[-1]
             # 解决值中存在INF NaN问题。
             if np.isinf(tmp_val) or np.isnan(tmp_val):
                 stock_data_list.append(0)
@@ -0,0 +1,1084 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import logging
+import datetime
+import numpy as np
+import pandas as pd
+import instock.lib.trade_time as trd
+import instock.core.storage.indicator_state as ist
+
+__author__ = 'myh '
+__date__ = '2026/10/18 '
+
+# 全市场指标计算：把所有股票的历史数据排成 日期 × 股票 的矩阵，按日期逐行计算，每一步是对全部股票的向量运算，
+# 代替 calculate_indicator.get_indicators 对每只股票各执行一次 pandas 流程。
+# talib 的函数按 TA-Lib 的 C 代码逐行实现(种子、累加顺序、开始位置都相同)，其余的按 get_indicators 的公式，
+# 计算结果和 get_indicators 一致(talib 编译时乘加合并等造成的最后几位差别除外)，用 instock/bench/panel_indicator_parity.py 检查。
+# 每只股票的数据靠下对齐，上面不足的行为 NaN，和 talib 跳过开头 NaN 的处理相同，
+# 每个算子从输入第一次全部有值的行开始计算，之后按行推进，状态可以保存下来，下一个交易日继续计算(增量计算)。
+# 增量计算的结果和起点有关(ORIGIN_COLUMNS)，每日作业默认不用。
+
+# 和 get_indicator 的 calc_threshold 相同，每只股票取最近90行计算
+WINDOW = 90
+
+# 每日指标作业是否增量计算(get_indicator_data_incremental)，默认按90行窗口计算，环境变量 indicator_incremental=1 时增量计算。
+# 增量计算的 ORIGIN_COLUMNS 和90行窗口的结果不同，见 get_indicator_data_incremental。
+incremental = False
+_env = os.environ.get('indicator_incremental')
+if _env is not None:
+    incremental = _env != '0'
+
+# 和开始计算的日期(起点)有关的指标：EMA、Wilder 平滑等递推的指标和 OBV、SAR 这类累计的指标，
+# 从不同的起点计算结果不同，其余指标只和最近的窗口有关，起点之后的行数足够时结果相同。
+ORIGIN_COLUMNS = ('macd', 'macds', 'macdh', 'trix', 'trix_20_sma', 'tema', 'rsi_6', 'rsi_12', 'rsi', 'rsi_24',
+                  'rocema', 'pdi', 'mdi', 'dx', 'adx', 'adxr', 'atr', 'obv', 'sar', 'ppo', 'ppos', 'ppoh',
+                  'wt1', 'wt2', 'supertrend_ub', 'supertrend', 'supertrend_lb', 'force_13',
+                  'stochrsi_k', 'stochrsi_d')
+
+# 基础数据字段
+FIELDS = ('open', 'close', 'high', 'low', 'volume', 'amount', 'p_change')
+
+_NAN = np.nan
+
+
+def _isnan_any(inputs):
+    invalid = np.isnan(inputs[0])
+    for x in inputs[1:]:
+        invalid = invalid | np.isnan(x)
+    return invalid
+
+
+# 按行计算的算子，count 为每只股票已经计算的行数，0 表示还没有开始。
+class _kernel:
+    def __init__(self, size):
+        self.count = np.zeros(size, dtype=np.int64)
+
+    # 已经开始的股票，或者这一行输入都有值的股票参与计算，和 talib 跳过开头的 NaN 相同。
+    def _active(self, *inputs):
+        return (self.count > 0) | ~_isnan_any(inputs)
+
+    def _next(self, active):
+        self.count += active
+
+
+# tl.SUM / tl.MA(SMA)：累加当前值后输出，再减去窗口最早的值
+class _sum(_kernel):
+    def __init__(self, size, period, mean=False):
+        super().__init__(size)
+        self.period = period
+        self.mean = mean
+        self.total = np.zeros(size)
+        self.ring = np.zeros((period, size))
+        self._cols = np.arange(size)
+
+    def step(self, x):
+        active = self._active(x)
+        c = self.count
+        n = self.period
+        self.ring[c % n, self._cols] = np.where(active, x, self.ring[c % n, self._cols])
+        total = self.total + x
+        ready = active & (c >= n - 1)
+        if self.mean:
+            out = np.where(ready, total / n, _NAN)
+        else:
+            out = np.where(ready, total, _NAN)
+        total = np.where(ready, total - self.ring[(c + 1) % n, self._cols], total)
+        self.total = np.where(active, total, self.total)
+        self._next(active)
+        return out
+
+
+def _ma(size, period):
+    return _sum(size, period, mean=True)
+
+
+# tl.MAX / tl.MIN
+class _extreme(_kernel):
+    def __init__(self, size, period, fun):
+        super().__init__(size)
+        self.period = period
+        self.fun = fun
+        self.ring = np.zeros((period, size))
+        self._cols = np.arange(size)
+
+    def step(self, x):
+        active = self._active(x)
+        c = self.count
+        pos = c % self.period
+        self.ring[pos, self._cols] = np.where(active, x, self.ring[pos, self._cols])
+        out = np.where(active & (c >= self.period - 1), self.fun(self.ring, axis=0), _NAN)
+        self._next(active)
+        return out
+
+
+# tl.EMA：前 period 个值的平均数作为种子
+class _ema(_kernel):
+    def __init__(self, size, period):
+        super().__init__(size)
+        self.period = period
+        self.k = 2.0 / (period + 1)
+        self.value = np.zeros(size)
+
+    def step(self, x):
+        active = self._active(x)
+        c = self.count
+        n = self.period
+        seed = self.value + x
+        seed = np.where(c == n - 1, seed / n, seed)
+        value = np.where(c < n, seed, ((x - self.value) * self.k) + self.value)
+        self.value = np.where(active, value, self.value)
+        out = np.where(active & (c >= n - 1), self.value, _NAN)
+        self._next(active)
+        return out
+
+
+# tl.ROC
+class _roc(_kernel):
+    def __init__(self, size, period):
+        super().__init__(size)
+        self.period = period
+        self.ring = np.zeros((period, size))
+        self._cols = np.arange(size)
+
+    def step(self, x):
+        active = self._active(x)
+        c = self.count
+        pos = c % self.period
+        prev = self.ring[pos, self._cols]
+        value = np.where(prev != 0.0, ((x / prev) - 1.0) * 100.0, 0.0)
+        out = np.where(active & (c >= self.period), value, _NAN)
+        self.ring[pos, self._cols] = np.where(active, x, prev)
+        self._next(active)
+        return out
+
+
+# tl.MACD：慢线从第一行开始，快线的种子是第14~26行的平均数(TA-Lib 的实现)，信号线从第26行开始
+class _macd(_kernel):
+    def __init__(self, size, fast=12, slow=26, signal=9):
+        super().__init__(size)
+        self.delay = slow - fast
+        self.start = slow - 1
+        self.lookback = slow - 1 + signal - 1
+        self.fast = _ema(size, fast)
+        self.slow = _ema(size, slow)
+        self.signal = _ema(size, signal)
+
+    def step(self, x):
+        active = self._active(x)
+        c = self.count
+        fast = self.fast.step(np.where(active & (c >= self.delay), x, _NAN))
+        slow = self.slow.step(np.where(active, x, _NAN))
+        macd = fast - slow
+        signal = self.signal.step(np.where(active & (c >= self.start), macd, _NAN))
+        ready = active & (c >= self.lookback)
+        self._next(active)
+        macd = np.where(ready, macd, _NAN)
+        return macd, signal, macd - signal
+
+
+# tl.STOCH(fastk_period=9, slowk_period=5, slowk_matype=1, slowd_period=5, slowd_matype=1)
+class _stoch(_kernel):
+    def __init__(self, size, fastk=9, slowk=5, slowd=5):
+        super().__init__(size)
+        self.high = _extreme(size, fastk, np.max)
+        self.low = _extreme(size, fastk, np.min)
+        self.slowk = _ema(size, slowk)
+        self.slowd = _ema(size, slowd)
+        self.lookback = fastk - 1 + slowk - 1 + slowd - 1
+        self.slowk_start = fastk - 1 + slowk - 1
+
+    def step(self, high, low, close):
+        active = self._active(high, low, close)
+        c = self.count
+        highest = self.high.step(np.where(active, high, _NAN))
+        lowest = self.low.step(np.where(active, low, _NAN))
+        diff = (highest - lowest) / 100.0
+        fastk = np.where(diff != 0.0, (close - lowest) / diff, 0.0)
+        fastk = np.where(np.isnan(highest), _NAN, fastk)
+        slowk = self.slowk.step(fastk)
+        slowd = self.slowd.step(np.where(active & (c >= self.slowk_start), slowk, _NAN))
+        ready = active & (c >= self.lookback)
+        self._next(active)
+        return np.where(ready, slowk, _NAN), slowd
+
+
+# tl.WILLR
+class _willr(_kernel):
+    def __init__(self, size, period):
+        super().__init__(size)
+        self.high = _extreme(size, period, np.max)
+        self.low = _extreme(size, period, np.min)
+
+    def step(self, high, low, close):
+        active = self._active(high, low, close)
+        highest = self.high.step(np.where(active, high, _NAN))
+        lowest = self.low.step(np.where(active, low, _NAN))
+        diff = (highest - lowest) / (-100.0)
+        out = np.where(diff != 0.0, (highest - close) / diff, 0.0)
+        self._next(active)
+        return np.where(np.isnan(highest), _NAN, out)
+
+
+# tl.BBANDS(matype=0)：标准差用平方和的移动平均减去均值的平方
+class _bbands(_kernel):
+    def __init__(self, size, period=20, nbdev=2.0):
+        super().__init__(size)
+        self.nbdev = nbdev
+        self.middle = _ma(size, period)
+        self.square = _ma(size, period)
+
+    def step(self, x):
+        active = self._active(x)
+        x = np.where(active, x, _NAN)
+        middle = self.middle.step(x)
+        mean2 = self.square.step(x * x) - middle * middle
+        std = np.where(mean2 < 0.00000001, 0.0, np.sqrt(np.maximum(mean2, 0.0)))
+        std = np.where(np.isnan(mean2), mean2, std) * self.nbdev
+        self._next(active)
+        return middle + std, middle, middle - std
+
+
+# tl.TRIX：三重 EMA 的1日变化率
+class _trix(_kernel):
+    def __init__(self, size, period):
+        super().__init__(size)
+        self.ema1 = _ema(size, period)
+        self.ema2 = _ema(size, period)
+        self.ema3 = _ema(size, period)
+        self.roc = _roc(size, 1)
+
+    def step(self, x):
+        return self.roc.step(self.ema3.step(self.ema2.step(self.ema1.step(x))))
+
+
+# tl.TEMA
+class _tema(_kernel):
+    def __init__(self, size, period):
+        super().__init__(size)
+        self.ema1 = _ema(size, period)
+        self.ema2 = _ema(size, period)
+        self.ema3 = _ema(size, period)
+
+    def step(self, x):
+        ema1 = self.ema1.step(x)
+        ema2 = self.ema2.step(ema1)
+        ema3 = self.ema3.step(ema2)
+        return ema3 + ((3.0 * ema1) - (3.0 * ema2))
+
+
+# tl.PPO(matype=1)
+class _ppo(_kernel):
+    def __init__(self, size, fast=12, slow=26):
+        super().__init__(size)
+        self.fast = _ema(size, fast)
+        self.slow = _ema(size, slow)
+
+    def step(self, x):
+        fast = self.fast.step(x)
+        slow = self.slow.step(x)
+        zero = (-0.00000001 < slow) & (slow < 0.00000001)
+        return np.where(zero, np.where(np.isnan(fast), _NAN, 0.0), ((fast - slow) / slow) * 100.0)
+
+
+# tl.RSI
+class _rsi(_kernel):
+    def __init__(self, size, period):
+        super().__init__(size)
+        self.period = period
+        self.prev = np.zeros(size)
+        self.gain = np.zeros(size)
+        self.loss = np.zeros(size)
+
+    def step(self, x):
+        active = self._active(x)
+        c = self.count
+        n = self.period
+        diff = x - self.prev
+        gain = np.where(c > n, self.gain * (n - 1), self.gain)
+        loss = np.where(c > n, self.loss * (n - 1), self.loss)
+        down = diff < 0
+        loss = np.where(down, loss - diff, loss)
+        gain = np.where(down, gain, gain + diff)
+        smooth = c >= n
+        gain = np.where(smooth, gain / n, gain)
+        loss = np.where(smooth, loss / n, loss)
+        first = c == 0
+        update = active & ~first
+        self.gain = np.where(update, gain, self.gain)
+        self.loss = np.where(update, loss, self.loss)
+        self.prev = np.where(active, x, self.prev)
+        total = self.gain + self.loss
+        zero = (-0.00000001 < total) & (total < 0.00000001)
+        out = np.where(zero, 0.0, 100.0 * (self.gain / total))
+        out = np.where(active & smooth, out, _NAN)
+        self._next(active)
+        return out
+
+
+# tl.ATR：真实波幅从第二行开始，前 period 个的平均数作为种子
+class _atr(_kernel):
+    def __init__(self, size, period):
+        super().__init__(size)
+        self.period = period
+        self.prev_close = np.zeros(size)
+        self.value = np.zeros(size)
+
+    def step(self, high, low, close):
+        active = self._active(high, low, close)
+        c = self.count
+        n = self.period
+        greatest = high - low
+        val2 = np.abs(self.prev_close - high)
+        greatest = np.where(val2 > greatest, val2, greatest)
+        val3 = np.abs(low - self.prev_close)
+        tr = np.where(val3 > greatest, val3, greatest)
+        seed = self.value + tr
+        seed = np.where(c == n, seed / n, seed)
+        value = np.where(c <= n, seed, ((self.value * (n - 1)) + tr) / n)
+        self.value = np.where(active & (c > 0), value, self.value)
+        self.prev_close = np.where(active, close, self.prev_close)
+        out = np.where(active & (c >= n), self.value, _NAN)
+        self._next(active)
+        return out
+
+
+# tl.CCI：典型价放在循环缓冲区，按缓冲区位置顺序求和(TA-Lib 的实现)
+class _cci(_kernel):
+    def __init__(self, size, period):
+        super().__init__(size)
+        self.period = period
+        self.ring = np.zeros((period, size))
+        self._cols = np.arange(size)
+
+    def step(self, high, low, close):
+        active = self._active(high, low, close)
+        c = self.count
+        n = self.period
+        last = (high + low + close) / 3
+        pos = c % n
+        self.ring[pos, self._cols] = np.where(active, last, self.ring[pos, self._cols])
+        average = self.ring[0].copy()
+        for j in range(1, n):
+            average += self.ring[j]
+        average = average / n
+        total = np.abs(self.ring[0] - average)
+        for j in range(1, n):
+            total += np.abs(self.ring[j] - average)
+        value = last - average
+        out = np.where((value != 0.0) & (total != 0.0), value / (0.015 * (total / n)), 0.0)
+        out = np.where(active & (c >= n - 1), out, _NAN)
+        self._next(active)
+        return out
+
+
+# tl.MFI
+class _mfi(_kernel):
+    def __init__(self, size, period):
+        super().__init__(size)
+        self.period = period
+        self.prev = np.zeros(size)
+        self.pos_sum = np.zeros(size)
+        self.neg_sum = np.zeros(size)
+        self.pos_ring = np.zeros((period, size))
+        self.neg_ring = np.zeros((period, size))
+        self._cols = np.arange(size)
+
+    def step(self, high, low, close, volume):
+        active = self._active(high, low, close, volume)
+        c = self.count
+        n = self.period
+        update = active & (c > 0)
+        pos = (c - 1) % n
+        old_pos = self.pos_ring[pos, self._cols]
+        old_neg = self.neg_ring[pos, self._cols]
+        remove = update & (c > n)
+        pos_sum = np.where(remove, self.pos_sum - old_pos, self.pos_sum)
+        neg_sum = np.where(remove, self.neg_sum - old_neg, self.neg_sum)
+        typical = (high + low + close) / 3.0
+        diff = typical - self.prev
+        money = typical * volume
+        # 典型价相同(含计算误差)时既不是流入也不是流出
+        down = diff <= -0.00000001
+        up = diff >= 0.00000001
+        new_pos = np.where(up, money, 0.0)
+        new_neg = np.where(down, money, 0.0)
+        pos_sum = np.where(up, pos_sum + money, pos_sum)
+        neg_sum = np.where(down, neg_sum + money, neg_sum)
+        self.pos_ring[pos, self._cols] = np.where(update, new_pos, old_pos)
+        self.neg_ring[pos, self._cols] = np.where(update, new_neg, old_neg)
+        self.pos_sum = np.where(update, pos_sum, self.pos_sum)
+        self.neg_sum = np.where(update, neg_sum, self.neg_sum)
+        self.prev = np.where(active, typical, self.prev)
+        total = self.pos_sum + self.neg_sum
+        out = np.where(total < 1.0, 0.0, 100.0 * (self.pos_sum / total))
+        out = np.where(active & (c >= n), out, _NAN)
+        self._next(active)
+        return out
+
+
+# tl.OBV
+class _obv(_kernel):
+    def __init__(self, size):
+        super().__init__(size)
+        self.prev = np.zeros(size)
+        self.value = np.zeros(size)
+
+    def step(self, close, volume):
+        active = self._active(close, volume)
+        first = self.count == 0
+        value = np.where(close > self.prev, self.value + volume,
+                         np.where(close < self.prev, self.value - volume, self.value))
+        value = np.where(first, volume, value)
+        self.value = np.where(active, value, self.value)
+        self.prev = np.where(active, close, self.prev)
+        out = np.where(active, self.value, _NAN)
+        self._next(active)
+        return out
+
+
+# tl.SAR(acceleration=0.02, maximum=0.2)
+class _sar(_kernel):
+    def __init__(self, size, acceleration=0.02, maximum=0.2):
+        super().__init__(size)
+        self.acceleration = acceleration
+        self.maximum = maximum
+        self.is_long = np.zeros(size, dtype=bool)
+        self.sar = np.zeros(size)
+        self.ep = np.zeros(size)
+        self.af = np.zeros(size)
+        self.last_high = np.zeros(size)
+        self.last_low = np.zeros(size)
+
+    def step(self, high, low):
+        active = self._active(high, low)
+        c = self.count
+        acc = self.acceleration
+        # 第二行用前两行的 -DM 确定初始方向
+        init = active & (c == 1)
+        diff_p = high - self.last_high
+        diff_m = self.last_low - low
+        is_long0 = ~((diff_m > 0) & (diff_p < diff_m))
+        is_long = np.where(init, is_long0, self.is_long)
+        ep = np.where(init, np.where(is_long0, high, low), self.ep)
+        sar = np.where(init, np.where(is_long0, self.last_low, self.last_high), self.sar)
+        af = np.where(init, acc, self.af)
+        prev_high = np.where(init, high, self.last_high)
+        prev_low = np.where(init, low, self.last_low)
+
+        # 多头
+        long_switch = low <= sar
+        ls_sar = np.maximum(np.maximum(ep, prev_high), high)
+        ls_out = ls_sar
+        ls_ep = low
+        ls_sar = ls_sar + acc * (ls_ep - ls_sar)
+        ls_sar = np.where(ls_sar < prev_high, prev_high, ls_sar)
+        ls_sar = np.where(ls_sar < high, high, ls_sar)
+        ln_up = high > ep
+        ln_ep = np.where(ln_up, high, ep)
+        ln_af = np.where(ln_up, np.minimum(af + acc, self.maximum), af)
+        ln_sar = sar + ln_af * (ln_ep - sar)
+        ln_sar = np.where(ln_sar > prev_low, prev_low, ln_sar)
+        ln_sar = np.where(ln_sar > low, low, ln_sar)
+
+        # 空头
+        short_switch = high >= sar
+        ss_sar = np.minimum(np.minimum(ep, prev_low), low)
+        ss_out = ss_sar
+        ss_ep = high
+        ss_sar = ss_sar + acc * (ss_ep - ss_sar)
+        ss_sar = np.where(ss_sar > prev_low, prev_low, ss_sar)
+        ss_sar = np.where(ss_sar > low, low, ss_sar)
+        sn_down = low < ep
+        sn_ep = np.where(sn_down, low, ep)
+        sn_af = np.where(sn_down, np.minimum(af + acc, self.maximum), af)
+        sn_sar = sar + sn_af * (sn_ep - sar)
+        sn_sar = np.where(sn_sar < prev_high, prev_high, sn_sar)
+        sn_sar = np.where(sn_sar < high, high, sn_sar)
+
+        out = np.where(is_long, np.where(long_switch, ls_out, sar), np.where(short_switch, ss_out, sar))
+        new_sar = np.where(is_long, np.where(long_switch, ls_sar, ln_sar), np.where(short_switch, ss_sar, sn_sar))
+        new_ep = np.where(is_long, np.where(long_switch, ls_ep, ln_ep), np.where(short_switch, ss_ep, sn_ep))
+        new_af = np.where(is_long, np.where(long_switch, acc, ln_af), np.where(short_switch, acc, sn_af))
+        new_long = np.where(is_long, ~long_switch, short_switch)
+
+        update = active & (c >= 1)
+        self.is_long = np.where(update, new_long, self.is_long)
+        self.sar = np.where(update, new_sar, self.sar)
+        self.ep = np.where(update, new_ep, self.ep)
+        self.af = np.where(update, new_af, self.af)
+        self.last_high = np.where(active, high, self.last_high)
+        self.last_low = np.where(active, low, self.last_low)
+        self._next(active)
+        return np.where(update, out, _NAN)
+
+
+# 前 N 行的值，第一行之前为 0.0，和 shift(n, fill_value=0.0) 相同
+class _lag(_kernel):
+    def __init__(self, size, depth=1):
+        super().__init__(size)
+        self.values = np.zeros((depth, size))
+
+    def step(self, x, valid):
+        out = [np.where(valid, v, _NAN) for v in self.values]
+        self.values = np.where(valid, np.concatenate((x[np.newaxis], self.values[:-1])), self.values)
+        return out
+
+
+# get_indicators 里的 Supertrend 循环
+class _supertrend(_kernel):
+    def __init__(self, size):
+        super().__init__(size)
+        self.ub = np.zeros(size)
+        self.lb = np.zeros(size)
+        self.st = np.zeros(size)
+        self.last_close = np.zeros(size)
+
+    def step(self, close, b_ub, b_lb, valid):
+        first = self.count == 0
+        ub = np.where(first | (b_ub < self.ub) | (self.last_close > self.ub), b_ub, self.ub)
+        lb = np.where(first | (b_lb > self.lb) | (self.last_close < self.lb), b_lb, self.lb)
+        st = np.where(self.st == self.ub, np.where(close <= ub, ub, lb),
+                      np.where(self.st == self.lb, np.where(close > lb, lb, ub), _NAN))
+        st = np.where(first, np.where(close <= ub, ub, lb), st)
+        self.ub = np.where(valid, ub, self.ub)
+        self.lb = np.where(valid, lb, self.lb)
+        self.st = np.where(valid, st, self.st)
+        self.last_close = np.where(valid, close, self.last_close)
+        self._next(valid)
+        return np.where(valid, ub, _NAN), np.where(valid, lb, _NAN), np.where(valid, st, _NAN)
+
+
+def _fill0(x, valid):
+    return np.where(valid & np.isnan(x), 0.0, x)
+
+
+def _fill0_inf(x, valid):
+    x = _fill0(x, valid)
+    return np.where(np.isinf(x), 0.0, x)
+
+
+# 全部股票的指标计算，step 每次输入一行(每只股票一个值)，返回这一行的全部指标。
+class indicator_engine:
+    def __init__(self, size):
+        self.size = size
+        self.count = np.zeros(size, dtype=np.int64)
+        self.kernels = {
+            'macd': _macd(size),
+            'stoch': _stoch(size),
+            'boll': _bbands(size),
+            'trix': _trix(size, 12),
+            'trix_20_sma': _ma(size, 20),
+            'm_price': _lag(size),
+            'h_m_sum': _sum(size, 26),
+            'm_l_sum': _sum(size, 26),
+            'cr-ma1': _ma(size, 5),
+            'cr-ma2': _ma(size, 10),
+            'cr-ma3': _ma(size, 20),
+            'rsi': _rsi(size, 14),
+            'rsi_6': _rsi(size, 6),
+            'rsi_12': _rsi(size, 12),
+            'rsi_24': _rsi(size, 24),
+            'avs': _sum(size, 26),
+            'bvs': _sum(size, 26),
+            'cvs': _sum(size, 26),
+            'vr_6_sma': _ma(size, 6),
+            'close': _lag(size, 3),
+            'open': _lag(size, 3),
+            'high': _lag(size, 3),
+            'low': _lag(size, 3),
+            'atr': _atr(size, 14),
+            'pdm': _ema(size, 14),
+            'mdm': _ema(size, 14),
+            'adx': _ema(size, 6),
+            'adxr': _ema(size, 6),
+            'wr_6': _willr(size, 6),
+            'wr_10': _willr(size, 10),
+            'wr_14': _willr(size, 14),
+            'cci': _cci(size, 14),
+            'cci_84': _cci(size, 84),
+            'ma10': _ma(size, 10),
+            'ma50': _ma(size, 50),
+            'dma_10_sma': _ma(size, 10),
+            'tema': _tema(size, 14),
+            'mfi': _mfi(size, 14),
+            'mfisma': _ma(size, 6),
+            'tpv_14': _sum(size, 14),
+            'vol_14': _sum(size, 14),
+            'mvwma': _ma(size, 6),
+            'ppo': _ppo(size),
+            'ppos': _ema(size, 9),
+            'rsi_min': _extreme(size, 14, np.min),
+            'rsi_max': _extreme(size, 14, np.max),
+            'stochrsi_d': _ma(size, 3),
+            'esa': _ema(size, 10),
+            'esa_d': _ema(size, 10),
+            'wt1': _ema(size, 21),
+            'wt2': _ma(size, 4),
+            'supertrend': _supertrend(size),
+            'roc': _roc(size, 12),
+            'rocma': _ma(size, 6),
+            'rocema': _ema(size, 9),
+            'obv': _obv(size),
+            'sar': _sar(size),
+            'price_up_sum': _sum(size, 12),
+            'psyma': _ma(size, 6),
+            'h_o_sum': _sum(size, 26),
+            'o_l_sum': _sum(size, 26),
+            'h_cy_sum': _sum(size, 26),
+            'cy_l_sum': _sum(size, 26),
+            'emv': _sum(size, 14),
+            'emva': _ma(size, 9),
+            'ma6': _ma(size, 6),
+            'c_m_11': _ma(size, 11),
+            'c_m_11_lag': _lag(size),
+            'madpo': _ma(size, 6),
+            'close_max': _extreme(size, 28, np.max),
+            'close_min': _extreme(size, 28, np.min),
+            'vhf_sum': _sum(size, 28),
+            'rvi_x': _ma(size, 10),
+            'rvi_y': _ma(size, 10),
+            'rvi': _lag(size, 3),
+            'force_2': _ema(size, 2),
+            'force_13': _ema(size, 13),
+        }
+
+    def get_state(self):
+        state = {'count': self.count}
+        for name, kernel in self.kernels.items():
+            _get_state(kernel, name, state)
+        return state
+
+    def set_state(self, state):
+        self.count = state['count']
+        for name, kernel in self.kernels.items():
+            _set_state(kernel, name, state)
+
+    def step(self, row):
+        k = self.kernels
+        r = {}
+        open, close, high, low = row['open'], row['close'], row['high'], row['low']
+        volume, amount, p_change = row['volume'], row['amount'], row['p_change']
+        valid = ~np.isnan(close)
+        first = self.count == 0
+        nan = _NAN
+        with np.errstate(divide='ignore', invalid='ignore'):
+            r['close'] = close
+
+            # macd
+            macd, macds, macdh = k['macd'].step(close)
+            r['macd'] = _fill0(macd, valid)
+            r['macds'] = _fill0(macds, valid)
+            r['macdh'] = _fill0(macdh, valid)
+
+            # kdj
+            kdjk, kdjd = k['stoch'].step(high, low, close)
+            r['kdjk'] = _fill0(kdjk, valid)
+            r['kdjd'] = _fill0(kdjd, valid)
+            r['kdjj'] = 3 * r['kdjk'] - 2 * r['kdjd']
+
+            # boll
+            boll_ub, boll, boll_lb = k['boll'].step(close)
+            r['boll_ub'] = _fill0(boll_ub, valid)
+            r['boll'] = _fill0(boll, valid)
+            r['boll_lb'] = _fill0(boll_lb, valid)
+
+            # trix
+            r['trix'] = _fill0(k['trix'].step(close), valid)
+            r['trix_20_sma'] = _fill0(k['trix_20_sma'].step(r['trix']), valid)
+
+            # cr
+            m_price = amount / volume
+            m_price_sf1, = k['m_price'].step(m_price, valid)
+            h_m = high - np.minimum(m_price_sf1, high)  # 和 values.min(axis=1) 相同，有 NaN 时为 NaN
+            m_l = m_price_sf1 - np.minimum(m_price_sf1, low)
+            cr = k['h_m_sum'].step(h_m) / k['m_l_sum'].step(m_l)
+            r['cr'] = _fill0_inf(cr, valid) * 100
+            r['cr-ma1'] = _fill0(k['cr-ma1'].step(r['cr']), valid)
+            r['cr-ma2'] = _fill0(k['cr-ma2'].step(r['cr']), valid)
+            r['cr-ma3'] = _fill0(k['cr-ma3'].step(r['cr']), valid)
+
+            # rsi
+            r['rsi'] = _fill0(k['rsi'].step(close), valid)
+            r['rsi_6'] = _fill0(k['rsi_6'].step(close), valid)
+            r['rsi_12'] = _fill0(k['rsi_12'].step(close), valid)
+            r['rsi_24'] = _fill0(k['rsi_24'].step(close), valid)
+
+            # vr
+            av = np.where(valid, np.where(p_change > 0, volume, 0), nan)
+            bv = np.where(valid, np.where(p_change < 0, volume, 0), nan)
+            cv = np.where(valid, np.where(p_change == 0, volume, 0), nan)
+            avs = k['avs'].step(av)
+            bvs = k['bvs'].step(bv)
+            cvs = k['cvs'].step(cv)
+            vr = (avs + cvs / 2) / (bvs + cvs / 2)
+            r['vr'] = _fill0_inf(vr, valid) * 100
+            r['vr_6_sma'] = _fill0(k['vr_6_sma'].step(r['vr']), valid)
+
+            # atr
+            prev_close, close_2, close_3 = k['close'].step(close, valid)
+            prev_open, open_2, open_3 = k['open'].step(open, valid)
+            prev_high, high_2, high_3 = k['high'].step(high, valid)
+            prev_low, low_2, low_3 = k['low'].step(low, valid)
+            h_l = high - low
+            h_cy = high - prev_close
+            cy_l = prev_close - low
+            tr = np.fmax(np.fmax(h_l, abs(h_cy)), abs(cy_l))
+            r['tr'] = _fill0(tr, valid)
+            r['atr'] = _fill0(k['atr'].step(high, low, close), valid)
+
+            # dmi
+            high_delta = np.where(first, 0.0, high - prev_high)
+            high_m = (high_delta + abs(high_delta)) / 2
+            low_delta = np.where(first, 0.0, -(low - prev_low))
+            low_m = (low_delta + abs(low_delta)) / 2
+            pdm = _fill0(k['pdm'].step(np.where(valid, np.where(high_m > low_m, high_m, 0), nan)), valid)
+            r['pdi'] = _fill0_inf(pdm / r['atr'], valid) * 100
+            mdm = _fill0(k['mdm'].step(np.where(valid, np.where(low_m > high_m, low_m, 0), nan)), valid)
+            r['mdi'] = _fill0_inf(mdm / r['atr'], valid) * 100
+            dx = abs(r['pdi'] - r['mdi']) / (r['pdi'] + r['mdi'])
+            r['dx'] = _fill0_inf(dx, valid) * 100
+            r['adx'] = _fill0(k['adx'].step(r['dx']), valid)
+            r['adxr'] = _fill0(k['adxr'].step(r['adx']), valid)
+
+            # wr
+            r['wr_6'] = _fill0(k['wr_6'].step(high, low, close), valid)
+            r['wr_10'] = _fill0(k['wr_10'].step(high, low, close), valid)
+            r['wr_14'] = _fill0(k['wr_14'].step(high, low, close), valid)
+
+            # cci
+            r['cci'] = _fill0(k['cci'].step(high, low, close), valid)
+            r['cci_84'] = _fill0(k['cci_84'].step(high, low, close), valid)
+
+            # dma
+            ma10 = _fill0(k['ma10'].step(close), valid)
+            ma50 = _fill0(k['ma50'].step(close), valid)
+            r['dma'] = ma10 - ma50
+            r['dma_10_sma'] = _fill0(k['dma_10_sma'].step(r['dma']), valid)
+
+            # tema
+            r['tema'] = _fill0(k['tema'].step(close), valid)
+
+            # mfi
+            r['mfi'] = _fill0(k['mfi'].step(high, low, close, volume), valid)
+            r['mfisma'] = k['mfisma'].step(r['mfi'])
+
+            # vwma
+            vwma = k['tpv_14'].step(amount) / k['vol_14'].step(volume)
+            r['vwma'] = _fill0_inf(vwma, valid)
+            r['mvwma'] = k['mvwma'].step(r['vwma'])
+
+            # ppo
+            r['ppo'] = _fill0(k['ppo'].step(close), valid)
+            r['ppos'] = _fill0(k['ppos'].step(r['ppo']), valid)
+            r['ppoh'] = r['ppo'] - r['ppos']
+
+            # stochrsi
+            rsi_min = k['rsi_min'].step(r['rsi'])
+            rsi_max = k['rsi_max'].step(r['rsi'])
+            stochrsi_k = (r['rsi'] - rsi_min) / (rsi_max - rsi_min)
+            r['stochrsi_k'] = _fill0_inf(stochrsi_k, valid) * 100
+            r['stochrsi_d'] = k['stochrsi_d'].step(r['stochrsi_k'])
+
+            # wt
+            esa = _fill0(k['esa'].step(m_price), valid)
+            esa_d = k['esa_d'].step(abs(m_price - esa))
+            esa_ci = _fill0_inf((m_price - esa) / (0.015 * esa_d), valid)
+            r['wt1'] = _fill0(k['wt1'].step(esa_ci), valid)
+            r['wt2'] = _fill0(k['wt2'].step(r['wt1']), valid)
+
+            # supertrend
+            m_atr = r['atr'] * 3
+            hl_avg = (high + low) / 2.0
+            b_ub = hl_avg + m_atr
+            b_lb = hl_avg - m_atr
+            r['supertrend_ub'], r['supertrend_lb'], r['supertrend'] = k['supertrend'].step(close, b_ub, b_lb, valid)
+
+            # roc
+            r['roc'] = _fill0(k['roc'].step(close), valid)
+            r['rocma'] = _fill0(k['rocma'].step(r['roc']), valid)
+            r['rocema'] = _fill0(k['rocema'].step(r['roc']), valid)
+
+            # obv
+            r['obv'] = _fill0(k['obv'].step(close, volume), valid)
+
+            # sar
+            r['sar'] = _fill0(k['sar'].step(high, low), valid)
+
+            # psy
+            price_up = np.where(valid, np.where(close > prev_close, 1.0, 0.0), nan)
+            psy = k['price_up_sum'].step(price_up) / 12.0
+            r['psy'] = _fill0(psy, valid) * 100
+            r['psyma'] = k['psyma'].step(r['psy'])
+
+            # brar
+            ar = k['h_o_sum'].step(high - open) / k['o_l_sum'].step(open - low)
+            r['ar'] = _fill0_inf(ar, valid) * 100
+            br = k['h_cy_sum'].step(h_cy) / k['cy_l_sum'].step(cy_l)
+            r['br'] = _fill0_inf(br, valid) * 100
+
+            # emv
+            phl_avg = (prev_high + prev_low) / 2.0
+            emva_em = (hl_avg - phl_avg) * h_l / amount
+            r['emv'] = _fill0(k['emv'].step(emva_em), valid)
+            r['emva'] = _fill0(k['emva'].step(r['emv']), valid)
+
+            # bias
+            ma6 = _fill0(k['ma6'].step(close), valid)
+            r['bias'] = _fill0_inf((close - ma6) / ma6, valid) * 100
+
+            # dpo
+            c_m_11 = k['c_m_11'].step(close)
+            c_m_11_sf1, = k['c_m_11_lag'].step(c_m_11, valid)
+            r['dpo'] = _fill0(close - c_m_11_sf1, valid)
+            r['madpo'] = _fill0(k['madpo'].step(r['dpo']), valid)
+
+            # vhf
+            hcp_lcp = _fill0(k['close_max'].step(close) - k['close_min'].step(close), valid)
+            r['vhf'] = _fill0(np.divide(hcp_lcp, k['vhf_sum'].step(abs(close - prev_close))), valid)
+
+            # rvi
+            rvi_x = ((close - open) + 2 * (prev_close - prev_open) + 2 * (close_2 - open_2) + (close_3 - open_3)) / 6
+            rvi_y = ((high - low) + 2 * (prev_high - prev_low) + 2 * (high_2 - low_2) + (high_3 - low_3)) / 6
+            rvi = k['rvi_x'].step(rvi_x) / k['rvi_y'].step(rvi_y)
+            r['rvi'] = _fill0_inf(rvi, valid)
+            rvi_1, rvi_2, rvi_3 = k['rvi'].step(r['rvi'], valid)
+            r['rvis'] = (r['rvi'] + 2 * rvi_1 + 2 * rvi_2 + rvi_3) / 6
+
+            # fi
+            r['fi'] = np.where(first, 0.0, close - prev_close) * volume
+            r['force_2'] = _fill0(k['force_2'].step(r['fi']), valid)
+            r['force_13'] = _fill0(k['force_13'].step(r['fi']), valid)
+
+            # ene
+            r['ene_ue'] = (1 + 11 / 100) * ma10
+            r['ene_le'] = (1 - 9 / 100) * ma10
+            r['ene'] = (r['ene_ue'] + r['ene_le']) / 2
+
+        self.count += valid
+        return r
+
+    # 逐行计算 fields(字段 -> [行, 股票] 矩阵)，返回最后一行的指标，history=True 时返回每一行的指标矩阵。
+    def run(self, fields, history=False):
+        rows = len(fields['close'])
+        result = {}
+        for i in range(rows):
+            r = self.step({name: fields[name][i] for name in FIELDS})
+            if history:
+                for name, value in r.items():
+                    result.setdefault(name, np.empty((rows, self.size)))[i] = value
+            else:
+                result = r
+        return result
+
+
+def _get_state(kernel, prefix, state):
+    for key, value in kernel.__dict__.items():
+        name = f"{prefix}.{key}"
+        if isinstance(value, np.ndarray) and key != '_cols':
+            state[name] = value
+        elif isinstance(value, _kernel):
+            _get_state(value, name, state)
+
+
+def _set_state(kernel, prefix, state):
+    for key, value in kernel.__dict__.items():
+        name = f"{prefix}.{key}"
+        if isinstance(value, np.ndarray) and key != '_cols':
+            setattr(kernel, key, state[name])
+        elif isinstance(value, _kernel):
+            _set_state(value, name, state)
+
+
+# 取状态中部分股票的数组，数组最后一维是股票
+def take_state(state, idx):
+    return {name: value[..., idx] for name, value in state.items()}
+
+
+# 取每只股票 end_date(含)之前最近 window 行的数据，靠下对齐成 [行, 股票] 矩阵。
+# 返回 (字段矩阵, 每只股票全部数据的行数，没有数据的为 -1)，with_dates=True 时再返回每行的日期(空行为'')。
+# 面板数据直接从面板矩阵取，不生成 DataFrame。
+def get_window(data, stocks, end_date, window=WINDOW, with_dates=False):
+    size = len(stocks)
+    fields = {name: np.full((window, size), np.nan) for name in FIELDS}
+    dates = np.full((window, size), '', dtype='<U10') if with_dates else None
+    lengths = np.full(size, -1, dtype=np.int64)
+    panel = getattr(data, 'panel', None)
+    if panel is not None:
+        cols = np.array([panel.code_index.get(s[1], -1) if s in data else -1 for s in stocks], dtype=np.int64)
+        found = np.flatnonzero(cols >= 0)
+        cols = cols[found]
+        valid = ~np.isnan(panel.fields['close'][:, cols])
+        counts = valid.sum(axis=0)
+        lengths[found] = np.where(counts > 0, counts, -1)
+        end = np.searchsorted(panel.dates.astype(str), end_date, side='right')
+        valid = valid[:end]
+        rank = np.cumsum(valid[::-1], axis=0)[::-1]  # 到 end_date 为止的倒数第几行
+        rows, j = np.nonzero(valid & (rank <= window))
+        pos = window - rank[rows, j]
+        for name in FIELDS:
+            fields[name][pos, found[j]] = panel.fields[name][rows, cols[j]]
+        if with_dates:
+            dates[pos, found[j]] = panel.dates[rows]
+    else:
+        for j, stock in enumerate(stocks):
+            frame = data.get(stock)
+            if frame is None:
+                continue
+            lengths[j] = len(frame.index)
+            frame = frame.loc[frame['date'] <= end_date].tail(n=window)
+            n = len(frame.index)
+            if n == 0:
+                continue
+            for name in FIELDS:
+                fields[name][window - n:, j] = frame[name].values
+            if with_dates:
+                dates[window - n:, j] = frame['date'].values
+    if with_dates:
+        return fields, lengths, dates
+    return fields, lengths
+
+
+def _get_end_date(stocks, date):
+    if date is None:
+        return stocks[0][0]
+    return date.strftime("%Y-%m-%d")
+
+
+# 和 get_indicator 相同：数据只有一行的返回 0，end_date 之前没有数据的不返回，NaN 和 inf 为 0。
+def _to_series(stocks, lengths, has_rows, last, stock_column, end_date):
+    columns = stock_column[2:]
+    values = np.empty((len(stocks), len(columns)))
+    for i, name in enumerate(columns):
+        values[:, i] = last[name]
+    values[~np.isfinite(values)] = 0
+    result = {}
+    for j, stock in enumerate(stocks):
+        if lengths[j] < 0:
+            continue
+        if lengths[j] <= 1:
+            result[stock] = pd.Series([end_date, stock[1]] + [0] * len(columns), index=stock_column)
+        elif has_rows[j]:
+            result[stock] = pd.Series([end_date, stock[1]] + values[j].tolist(), index=stock_column)
+    return result
+
+
+# 全部股票最后一天的指标，返回 {股票: pd.Series}，和对每只股票调用 calculate_indicator.get_indicator 的结果一致。
+def get_indicator_data(data, stock_column, date=None, stocks=None, window=WINDOW):
+    if stocks is None:
+        stocks = list(data)
+    if not stocks:
+        return {}
+    end_date = _get_end_date(stocks, date)
+    try:
+        fields, lengths = get_window(data, stocks, end_date, window)
+        last = indicator_engine(len(stocks)).run(fields)
+        return _to_series(stocks, lengths, ~np.isnan(fields['close'][-1]), last, stock_column, end_date)
+    except Exception as e:
+        logging.error(f"panel_indicator.get_indicator_data处理异常：{e}")
+    return None
+
+
+# 增量计算：从前一个交易日保存的状态继续计算新的行，结果和从每只股票的起点开始计算全部历史数据相同，和窗口大小无关。
+# 起点是第一次计算这只股票时历史数据的第一行，保存在状态的 origin 里。历史数据的开始日期每天后移，
+# 起点不随着后移，所以 ORIGIN_COLUMNS 的指标和90行窗口(get_indicator_data)的结果不同，其余指标相同。
+# 下列股票重新计算：没有状态的(新股、第一次运行)，状态最后一行和历史数据不一致的(前复权价格因为除权变化、历史数据补齐等)。
+# 重新计算从保存的起点开始，历史数据已经不包含起点时从现有的第一行开始，起点随之改变。
+# 收盘后的数据计算完成后保存状态，盘中的数据只计算不保存。
+def get_indicator_data_incremental(data, stock_column, date=None, stocks=None):
+    if stocks is None:
+        stocks = list(data)
+    if not stocks:
+        return {}
+    end_date = _get_end_date(stocks, date)
+    try:
+        saved = ist.load_state(end_date)
+        if saved is not None and 'origin' not in saved[2]:
+            saved = None  # 没有记录起点的旧状态，全部重新计算
+        size = len(stocks)
+        if saved is None:
+            state_date, saved_index, saved_state = '', {}, {}
+            window = 1
+        else:
+            state_date, codes, saved_state = saved
+            saved_index = {c: i for i, c in enumerate(codes)}
+            # 状态日期之后的交易日不会超过自然日天数
+            window = (datetime.date.fromisoformat(end_date) - datetime.date.fromisoformat(state_date)).days + 1
+
+        # 每只股票状态日期之后的新行，加上状态的最后一行
+        fields, lengths, dates = get_window(data, stocks, end_date, window, with_dates=True)
+        has_rows = dates[-1] != ''
+        pos = np.array([saved_index.get(s[1], -1) for s in stocks], dtype=np.int64)
+        steps = np.sum(dates > state_date, axis=0)
+        ok = (pos >= 0) & has_rows & (steps < window)
+        if ok.any():
+            # 状态的最后一行：日期和数据都要和现在的历史数据一致
+            prev = np.maximum(window - 1 - steps, 0)
+            cols = np.arange(size)
+            bar_pos = np.where(ok, pos, 0)
+            ok &= dates[prev, cols] == saved_state['bar.date'][bar_pos]
+            for name in FIELDS:
+                value = fields[name][prev, cols]
+                bar = saved_state[f"bar.{name}"][bar_pos]
+                ok &= (value == bar) | (np.isnan(value) & np.isnan(bar))
+
+        origin = np.full(size, '', dtype='<U10')
+        if saved is not None:
+            known = pos >= 0
+            origin[known] = saved_state['origin'][pos[known]]
+        groups = [(k, np.flatnonzero(ok & (steps == k))) for k in np.unique(steps[ok])]
+        rebuild = np.flatnonzero(~ok & has_rows)
+        parts = []
+        for k, idx in groups:
+            part_state = take_state(saved_state, pos[idx])
+            engine = indicator_engine(len(idx))
+            engine.set_state(part_state)
+            part_last = {name[5:]: value for name, value in part_state.items() if name.startswith('last.')}
+            if k > 0:
+                part_last = engine.run({name: fields[name][-k:, idx] for name in FIELDS})
+            parts.append((idx, engine, part_last))
+        moved = 0
+        if len(rebuild) > 0:
+            window = int(max(lengths[rebuild].max(), 1))
+            sub_stocks = [stocks[j] for j in rebuild]
+            full_fields, _, full_dates = get_window(data, sub_stocks, end_date, window, with_dates=True)
+            # 起点之前的行置为 NaN，和从起点开始计算相同
+            before = (full_dates != '') & (full_dates < origin[rebuild])
+            for name in FIELDS:
+                full_fields[name][before] = np.nan
+            usable = (full_dates != '') & ~before
+            used = full_dates[np.argmax(usable, axis=0), np.arange(len(rebuild))]  # 日期从上到下递增
+            moved = int(np.sum((origin[rebuild] != '') & (used != origin[rebuild])))
+            origin[rebuild] = used
+            engine = indicator_engine(len(rebuild))
+            parts.append((rebuild, engine, engine.run(full_fields)))
+
+        keep = np.flatnonzero(has_rows)
+        last = {}
+        state = {}
+        for idx, engine, part_last in parts:
+            part_state = engine.get_state()
+            for name, value in part_state.items():
+                state.setdefault(name, np.zeros(value.shape[:-1] + (size,), dtype=value.dtype))[..., idx] = value
+            for name, value in part_last.items():
+                last.setdefault(name, np.full(size, np.nan))[idx] = value
+        if not last:
+            return {}
+        result = _to_series(stocks, lengths, has_rows, last, stock_column, end_date)
+
+        if trd.get_trade_hist_interval(end_date)[1]:
+            state = take_state(state, keep)
+            for name, value in last.items():
+                state[f"last.{name}"] = value[keep]
+            state['bar.date'] = dates[-1, keep]
+            state['origin'] = origin[keep]
+            for name in FIELDS:
+                state[f"bar.{name}"] = fields[name][-1, keep]
+            ist.save_state(end_date, [stocks[j][1] for j in keep], state)
+        logging.info(f"panel_indicator.get_indicator_data_incremental：{end_date}增量计算{int(ok.sum())}只，"
+                     f"重新计算{len(rebuild)}只，起点后移{moved}只")
+        return result
+    except Exception as e:
+        logging.error(f"panel_indicator.get_indicator_data_incremental处理异常：{e}")
+    return None
@@ -2,21 +2,41 @@
 # -*- coding: utf-8 -*-
 
 import logging
-import concurrent.futures
+import functools
 import instock.core.stockfetch as stf
 import instock.core.tablestructure as tbs
 import instock.lib.trade_time as trd
-from instock.lib.singleton_type import singleton_type
+import instock.core.storage.hist_panel as hpl
+import instock.core.storage.hist_lazy as hlz
+from instock.lib.singleton_type import keyed_singleton_type
 
 __author__ = 'myh '
 __date__ = '2023/3/10 '
 
 
-# 读取当天股票数据
-class stock_data(metaclass=singleton_type):
-    def __init__(self, date):
+# 日期为空时使用最近的交易日，和 run_with_args 不带参数时的日期一致。
+def get_date(date):
+    if date is None:
+        date = trd.get_trade_date_last()[1]
+    return date
+
+
+def get_filters_key(filters):
+    if filters is None:
+        return None
+    return tuple(sorted(filters.items()))
+
+
+# 读取当天股票数据，按 (日期, 过滤条件) 缓存
+class stock_data(metaclass=keyed_singleton_type):
+    @staticmethod
+    def cache_key(date=None, filters=None):
+        return get_date(date), get_filters_key(filters)
+
+    def __init__(self, date=None, filters=None):
+        self.data = None
         try:
-            self.data = stf.fetch_stocks(date)
+            self.data = stf.fetch_stocks(get_date(date), filters)
         except Exception as e:
             logging.error(f"singleton.stock_data处理异常：{e}")
 
@@ -24,36 +44,37 @@ class stock_data(metaclass=singleton_type):
         return self.data
 
 
-# 读取股票历史数据
-class stock_hist_data(metaclass=singleton_type):
-    def __init__(self, date=None, stocks=None, workers=9):
-        if stocks is None:
-            _subset = stock_data(date).get_data()[list(tbs.TABLE_CN_STOCK_FOREIGN_KEY['columns'])]
-            stocks = [tuple(x) for x in _subset.values]
+# 读取股票历史数据，按 (日期, 复权, 过滤条件, 股票, 是否按需读取) 缓存
+# lazy=True 时返回按需读取的 LazyHistData，已经发布了全市场面板时直接使用面板。
+class stock_hist_data(metaclass=keyed_singleton_type):
+    @staticmethod
+    def cache_key(date=None, stocks=None, adjust='qfq', filters=None, lazy=False):
+        return get_date(date), adjust, get_filters_key(filters), None if stocks is None else tuple(stocks), lazy
+
+    def __init__(self, date=None, stocks=None, adjust='qfq', filters=None, lazy=False):
         if stocks is None:
+            _data = stock_data(date, filters).get_data()
+            if _data is not None:
+                _subset = _data[list(tbs.TABLE_CN_STOCK_FOREIGN_KEY['columns'])]
+                stocks = [tuple(x) for x in _subset.values]
+        if not stocks:
             self.data = None
             return
         date_start, is_cache = trd.get_trade_hist_interval(stocks[0][0])  # 提高运行效率，只运行一次
-        _data = {}
-        try:
-            # max_workers是None还是没有给出，将默认为机器cup个数*5
-            with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
-                future_to_stock = {executor.submit(stf.fetch_stock_hist, stock, date_start, is_cache): stock for stock
-                                   in stocks}
-                for future in concurrent.futures.as_completed(future_to_stock):
-                    stock = future_to_stock[future]
-                    try:
-                        __data = future.result()
-                        if __data is not None:
-                            _data[stock] = __data
-                    except Exception as e:
-                        logging.error(f"singleton.stock_hist_data处理异常：{stock[1]}代码{e}")
-        except Exception as e:
-            logging.error(f"singleton.stock_hist_data处理异常：{e}")
-        if not _data:
-            self.data = None
+        if lazy:
+            _data = hpl.load_hist(stocks, date_start) if is_cache and adjust == 'qfq' else None
+            if _data is None:
+                # 盘中数据不写缓存，不能先同步到缓存再交给计算进程池的子进程读取
+                sync = functools.partial(stf.sync_stock_hist_many, date_start=date_start) if is_cache else None
+                _data = hlz.LazyHistData(stocks, functools.partial(
+                    stf.fetch_stock_hist_many, date_start=date_start, is_cache=is_cache, adjust=adjust), sync=sync)
+        elif is_cache and adjust == 'qfq':
+            # 收盘后使用全市场面板，只有第一个进程下载并发布，其他作业进程直接映射。
+            _data = hpl.publish(stocks, date_start,
+                                lambda: stf.fetch_stock_hist_many(stocks, date_start, is_cache, adjust))
         else:
-            self.data = _data
+            _data = stf.fetch_stock_hist_many(stocks, date_start, is_cache, adjust)
+        self.data = _data if _data else None
 
     def get_data(self):
         return self.data
@@ -2,16 +2,22 @@
 # -*- coding: utf-8 -*-
 
 import logging
+import datetime
 import instock.core.stockfetch as stf
-from instock.lib.singleton_type import singleton_type
+from instock.lib.singleton_type import keyed_singleton_type
 
 __author__ = 'myh '
 __date__ = '2023/3/10 '
 
 
-# 读取股票交易日历数据
-class stock_trade_date(metaclass=singleton_type):
+# 读取股票交易日历数据，按当天日期缓存，长时间运行的进程每天重新读取
+class stock_trade_date(metaclass=keyed_singleton_type):
+    @staticmethod
+    def cache_key():
+        return datetime.date.today()
+
     def __init__(self):
+        self.data = None
         try:
             self.data = stf.fetch_stocks_trade_date()
         except Exception as e:
@@ -1,11 +1,11 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import json
 import logging
 import os.path
 import datetime
 import numpy as np
-import pandas as pd
 import talib as tl
 import instock.core.tablestructure as tbs
 import instock.lib.trade_time as trd
@@ -18,6 +18,8 @@ import instock.core.crawling.stock_dzjy_em as sde
 import instock.core.crawling.stock_hist_em as she
 import instock.core.crawling.stock_fund_em as sff
 import instock.core.crawling.stock_fhps_em as sfe
+import instock.core.storage.hist_store as hst
+import instock.core.storage.hist_bulk as hbk
 
 __author__ = 'myh '
 __date__ = '2023/3/10 '
@@ -28,6 +30,10 @@ stock_hist_cache_path = os.path.join(cpath_current, 'cache', 'hist')
 if not os.path.exists(stock_hist_cache_path):
     os.makedirs(stock_hist_cache_path)  # 创建多个文件夹结构。
 
+# 交易日历缓存文件，日历最后一天距今少于 TRADE_DATE_REFRESH_DAYS 天时重新下载，新浪一般在年底公布下一年的日历。
+stock_trade_date_file = os.path.join(cpath_current, 'cache', 'trade_date.json')
+TRADE_DATE_REFRESH_DAYS = 30
+
 
 # 600 601 603 605开头的股票是上证A股
 # 600开头的股票是上证A股，属于大盘股，其中6006开头的股票是最早上市的股票，
@@ -66,19 +72,44 @@ def is_deal_amount_gt_200000000(deal_amount):
     return deal_amount > 200000000
 
 
-# 读取股票交易日历数据
+# 读取股票交易日历数据，优先使用缓存文件，快到期时重新下载，下载失败时使用缓存文件。
 def fetch_stocks_trade_date():
+    cache_date = _load_trade_date()
+    if cache_date and max(cache_date) - datetime.date.today() > datetime.timedelta(days=TRADE_DATE_REFRESH_DAYS):
+        return cache_date
     try:
         data = tdh.tool_trade_date_hist_sina()
         if data is None or len(data.index) == 0:
-            return None
+            return cache_date
         data_date = set(data['trade_date'].values.tolist())
+        _save_trade_date(data_date)
         return data_date
     except Exception as e:
         logging.error(f"stockfetch.fetch_stocks_trade_date处理异常：{e}")
+    return cache_date
+
+
+def _load_trade_date():
+    if not os.path.isfile(stock_trade_date_file):
+        return None
+    try:
+        with open(stock_trade_date_file, 'r', encoding='utf-8') as f:
+            return set(datetime.date.fromisoformat(d) for d in json.load(f))
+    except Exception as e:
+        logging.error(f"stockfetch._load_trade_date处理异常：{e}")
     return None
 
 
+def _save_trade_date(data_date):
+    tmp_file = f"{stock_trade_date_file}.tmp{os.getpid()}"
+    try:
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(sorted(d.isoformat() for d in data_date), f)
+        os.replace(tmp_file, stock_trade_date_file)
+    except Exception as e:
+        logging.error(f"stockfetch._save_trade_date处理异常：{e}")
+
+
 # 读取当天股票数据
 def fetch_etfs(date):
     try:
@@ -144,7 +175,7 @@ def filter_stock_data(data, filters=None):
 
 
 # 读取当天股票数据
-def fetch_stocks(date):
+def fetch_stocks(date, filters=None):
     try:
         data = she.stock_zh_a_spot_em()
         if data is None or len(data.index) == 0:
@@ -155,7 +186,7 @@ def fetch_stocks(date):
             data.insert(0, 'date', date.strftime("%Y-%m-%d"))
         data.columns = list(tbs.TABLE_CN_STOCK_SPOT['columns'])
         # 使用统一的过滤方法
-        data = filter_stock_data(data)
+        data = filter_stock_data(data, filters)
         if data is not None:
             logging.info(f"当前股票数量: {len(data.index)}")
  
@@ -301,28 +332,17 @@ def fetch_stock_blocktrade_data(date):
     return None
 
 
-# 读取股票历史数据
-def fetch_etf_hist(data_base, date_start=None, date_end=None, adjust='qfq'):
+# 读取ETF历史数据，和股票使用同一个滚动缓存。
+def fetch_etf_hist(data_base, date_start=None, date_end=None, adjust='qfq', is_cache=True):
     date = data_base[0]
     code = data_base[1]
 
     if date_start is None:
         date_start, is_cache = trd.get_trade_hist_interval(date)  # 提高运行效率，只运行一次
     try:
-        if date_end is not None:
-            data = fee.fund_etf_hist_em(symbol=code, period="daily", start_date=date_start, end_date=date_end,
-                                        adjust=adjust)
-        else:
-            data = fee.fund_etf_hist_em(symbol=code, period="daily", start_date=date_start, adjust=adjust)
-
-        if data is None or len(data.index) == 0:
-            return None
-        data.columns = tuple(tbs.CN_STOCK_HIST_DATA['columns'])
-        data = data.sort_index()  # 将数据按照日期排序下。
+        data = hst.fetch_hist(code, date_start, date_end, is_cache, adjust, source='etf')
         if data is not None:
-            data.loc[:, 'p_change'] = tl.ROC(data['close'].values, 1)
-            data['p_change'].values[np.isnan(data['p_change'].values)] = 0.0
-            data["volume"] = data['volume'].values.astype('double') * 100  # 成交量单位从手变成股。
+            _add_p_change(data)
         return data
     except Exception as e:
         logging.error(f"stockfetch.fetch_etf_hist处理异常：{e}")
@@ -340,47 +360,53 @@ def fetch_stock_hist(data_base, date_start=None, is_cache=True):
     try:
         data = stock_hist_cache(code, date_start, None, is_cache, 'qfq')
         if data is not None:
-            data.loc[:, 'p_change'] = tl.ROC(data['close'].values, 1)
-            data['p_change'].values[np.isnan(data['p_change'].values)] = 0.0
-            data["volume"] = data['volume'].values.astype('double') * 100  # 成交量单位从手变成股。
+            _add_p_change(data)
         return data
     except Exception as e:
         logging.error(f"stockfetch.fetch_stock_hist处理异常：{e}")
     return None
 
 
+# 批量读取股票历史数据，异步并发下载，返回 {(日期, 代码, 名称): DataFrame}，和 stock_hist_data 的数据一致。
+def fetch_stock_hist_many(stocks, date_start=None, is_cache=True, adjust='qfq'):
+    if not stocks:
+        return None
+    if date_start is None:
+        date_start, is_cache = trd.get_trade_hist_interval(stocks[0][0])  # 提高运行效率，只运行一次
+    try:
+        hists = hbk.fetch_hist_many([stock[1] for stock in stocks], date_start, None, is_cache, adjust)
+        data = {}
+        for stock in stocks:
+            _data = hists.get(stock[1])
+            if _data is not None:
+                data[stock] = _add_p_change(_data)
+        return data
+    except Exception as e:
+        logging.error(f"stockfetch.fetch_stock_hist_many处理异常：{e}")
+    return None
+
+
+# 把股票历史数据同步到本地缓存，不返回数据。计算进程池的子进程只读取缓存，下载在当前进程里统一限流。
+def sync_stock_hist_many(stocks, date_start):
+    try:
+        hbk.sync_hist_many([stock[1] for stock in stocks], date_start)
+    except Exception as e:
+        logging.error(f"stockfetch.sync_stock_hist_many处理异常：{e}")
+
+
+def _add_p_change(data):
+    data.loc[:, 'p_change'] = tl.ROC(data['close'].values, 1)
+    data['p_change'].values[np.isnan(data['p_change'].values)] = 0.0
+    data["volume"] = data['volume'].values.astype('double') * 100  # 成交量单位从手变成股。
+    return data
+
+
 # 增加读取股票缓存方法。加快处理速度。多线程解决效率
+# 使用按股票滚动的缓存，本地已有的K线不再重复下载，只请求最后缓存日期之后的数据。
+# 缓存的是不复权数据，adjust 为 qfq/hfq 时在本地计算复权价格。
 def stock_hist_cache(code, date_start, date_end=None, is_cache=True, adjust=''):
-    cache_dir = os.path.join(stock_hist_cache_path, date_start[0:6], date_start)
-    # 如果没有文件夹创建一个。月文件夹和日文件夹。方便删除。
     try:
-        if not os.path.exists(cache_dir):
-            os.makedirs(cache_dir)
-    except Exception:
-        pass
-    cache_file = os.path.join(cache_dir, "%s%s.gzip.pickle" % (code, adjust))
-    # 如果缓存存在就直接返回缓存数据。压缩方式。
-    try:
-        if os.path.isfile(cache_file):
-            return pd.read_pickle(cache_file, compression="gzip")
-        else:
-            if date_end is not None:
-                stock = she.stock_zh_a_hist(symbol=code, period="daily", start_date=date_start, end_date=date_end,
-                                            adjust=adjust)
-            else:
-                stock = she.stock_zh_a_hist(symbol=code, period="daily", start_date=date_start, adjust=adjust)
-
-            if stock is None or len(stock.index) == 0:
-                return None
-            stock.columns = tuple(tbs.CN_STOCK_HIST_DATA['columns'])
-            stock = stock.sort_index()  # 将数据按照日期排序下。
-            try:
-                if is_cache:
-                    stock.to_pickle(cache_file, compression="gzip")
-            except Exception:
-                pass
-            # time.sleep(1)
-            return stock
+        return hst.fetch_hist(code, date_start, date_end, is_cache, adjust)
     except Exception as e:
         logging.error(f"stockfetch.stock_hist_cache处理异常：{code}代码{e}")
     return None
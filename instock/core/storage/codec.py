@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import pickle
+import importlib
+import pandas as pd
+
+__author__ = 'myh '
+__date__ = '2026/10/18 '
+
+# 历史数据缓存的序列化方式。多线程同时读取时 gzip 解压是主要耗时，可以用环境变量 hist_cache_codec 换成更快的方式，
+# 用 instock/bench/hist_codec_bench.py 在本机磁盘上测试后选择。
+# zstd/lz4/feather/parquet 依赖 zstandard、lz4、pyarrow，已经加到 requirements.txt 和 Dockerfile。
+# 配置的方式不存在或者依赖没有安装时导入模块就报错，不会悄悄换成 gzip 写缓存。
+DEFAULT_CODEC = 'gzip'
+codec_name = os.environ.get('hist_cache_codec', DEFAULT_CODEC)
+
+
+class codec:
+    def __init__(self, name, suffix, read, write, modules=()):
+        self.name = name
+        self.suffix = suffix  # 缓存文件扩展名
+        self.read = read  # read(path) -> DataFrame
+        self.write = write  # write(data, path)
+        self.modules = modules  # 依赖的可选模块
+
+    def is_available(self):
+        for module in self.modules:
+            try:
+                importlib.import_module(module)
+            except ImportError:
+                return False
+        return True
+
+
+CODECS = {}
+
+
+def register(name, suffix, read, write, modules=()):
+    CODECS[name] = codec(name, suffix, read, write, modules)
+
+
+def _read_lz4(path):
+    import lz4.frame
+    with lz4.frame.open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+def _write_lz4(data, path):
+    import lz4.frame
+    with lz4.frame.open(path, 'wb') as f:
+        pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+register('gzip', 'gzip.pickle', lambda p: pd.read_pickle(p, compression='gzip'),
+         lambda d, p: d.to_pickle(p, compression='gzip'))
+register('pickle', 'pickle', lambda p: pd.read_pickle(p, compression=None),
+         lambda d, p: d.to_pickle(p, compression=None))
+register('zstd', 'zstd.pickle', lambda p: pd.read_pickle(p, compression='zstd'),
+         lambda d, p: d.to_pickle(p, compression='zstd'), ('zstandard',))
+register('lz4', 'lz4.pickle', _read_lz4, _write_lz4, ('lz4',))
+register('feather', 'feather', pd.read_feather,
+         lambda d, p: d.to_feather(p, compression='uncompressed'), ('pyarrow',))
+register('parquet', 'parquet', lambda p: pd.read_parquet(p, engine='pyarrow'),
+         lambda d, p: d.to_parquet(p, engine='pyarrow', index=False), ('pyarrow',))
+
+_resolved = {}
+
+
+# 取序列化方式，name 为空使用配置的方式，不存在时抛出 ValueError，依赖没有安装时抛出 ImportError。
+def get_codec(name=None):
+    if name is None:
+        name = codec_name
+    c = _resolved.get(name)
+    if c is None:
+        c = CODECS.get(name)
+        if c is None:
+            raise ValueError(f"hist_cache_codec={name}不存在，可选：{','.join(CODECS)}")
+        if not c.is_available():
+            raise ImportError(f"hist_cache_codec={name}需要安装{','.join(c.modules)}")
+        _resolved[name] = c
+    return c
+
+
+get_codec()  # 启动时检查配置的序列化方式
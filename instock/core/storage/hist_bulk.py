@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import asyncio
+import logging
+import aiohttp
+import instock.core.crawling.stock_hist_em as she
+import instock.core.crawling.http_client as hc
+import instock.core.storage.hist_store as hst
+
+__author__ = 'myh '
+__date__ = '2026/10/18 '
+
+# 全市场历史数据异步批量下载：一个事件循环里同时发出几百个请求，按主机限制并发连接数，
+# 每只股票下载完成就合并进滚动缓存，不再受线程池9个线程的限制。
+# 并发数可以用环境变量 hist_async_limit 覆盖。
+limit_per_host = 64
+_env = os.environ.get('hist_async_limit')
+if _env is not None:
+    limit_per_host = int(_env)
+
+
+async def _fetch(session, code, date_start):
+    url, params = she.stock_zh_a_hist_params(symbol=code, period="daily", start_date=date_start, adjust='')
+    data_json = await hc.get_json_async(session, url, params, retry_if=hc.empty_klines)
+    return hst.normalize(she.stock_zh_a_hist_parse(data_json))
+
+
+# 按 hist_store.sync_steps 的流程同步，这里只负责下载，读写缓存文件放到线程里执行，不阻塞事件循环。
+async def _sync(session, code, date_start, is_cache):
+    loop = asyncio.get_running_loop()
+    steps = hst.sync_steps(code, date_start, is_cache)
+    done, value = await loop.run_in_executor(None, hst.advance, steps)
+    while not done:
+        new_data = await _fetch(session, code, value)
+        done, value = await loop.run_in_executor(None, hst.advance, steps, new_data)
+    return value
+
+
+async def _sync_all(codes, date_start, date_end, is_cache, adjust, limit):
+    results = {}
+    connector = aiohttp.TCPConnector(limit=0, limit_per_host=limit)
+    timeout = aiohttp.ClientTimeout(sock_connect=hc.connect_timeout, sock_read=hc.read_timeout)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        loop = asyncio.get_running_loop()
+
+        async def _one(code):
+            try:
+                data = await _sync(session, code, date_start, is_cache)
+                if adjust is None:
+                    return  # 只同步缓存
+                # 分红送转数据第一次使用时需要下载，放到线程里执行
+                events = await loop.run_in_executor(None, hst.get_adjust_events, code, data, adjust)
+                data = hst.view(data, date_start, date_end, adjust, events)
+                if data is not None:
+                    results[code] = data
+            except Exception as e:
+                logging.error(f"hist_bulk.fetch_hist_many处理异常：{code}代码{e}")
+
+        await asyncio.gather(*(_one(code) for code in codes))
+    return results
+
+
+# 批量读取股票历史数据，返回 {代码: DataFrame}，没有数据的股票不在结果里。
+# 使用 asyncio.run，不能在已经运行的事件循环里调用。
+def fetch_hist_many(codes, date_start, date_end=None, is_cache=True, adjust='', limit=None):
+    if limit is None:
+        limit = limit_per_host
+    # 先在同步代码里加载代码和市场对照表，有代码不在缓存的对照表里(新股)时重新下载一次，协程里不再请求
+    code_id_dict = she.code_id_map_em()
+    if any(code not in code_id_dict for code in codes):
+        she.refresh_code_id_map_em()
+    return asyncio.run(_sync_all(codes, date_start, date_end, is_cache, adjust, limit))
+
+
+# 只把历史数据同步到本地缓存，不返回数据，已经同步到最后收盘交易日的股票不请求。
+def sync_hist_many(codes, date_start, limit=None):
+    codes = [code for code in codes if not hst.is_synced(code, date_start)]
+    hst.load_bonus(date_start)  # 复权用的分红送转也在当前进程下载，计算进程池的子进程读取 http 缓存
+    if codes:
+        fetch_hist_many(codes, date_start, None, True, None, limit)
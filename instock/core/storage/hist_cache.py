@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os.path
+import re
+import time
+import shutil
+import logging
+import instock.core.storage.hist_store as hst
+import instock.core.storage.hist_panel as hpl
+
+__author__ = 'myh '
+__date__ = '2026/10/18 '
+
+# 历史数据缓存管理：按容量和天数上限淘汰最久没有使用的缓存，删除旧版按日期分目录的缓存。
+cpath_current = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+stock_hist_cache_path = os.path.join(cpath_current, 'cache', 'hist')
+stock_hist_legacy_archive_path = os.path.join(stock_hist_cache_path, 'archive')  # 以前版本合并的月归档
+
+# 缓存总容量上限(字节)和最长保留天数，可以用环境变量覆盖。
+max_bytes = 10 * 1024 * 1024 * 1024
+max_days = 90
+_max_bytes = os.environ.get('hist_cache_max_bytes')
+if _max_bytes is not None:
+    max_bytes = int(_max_bytes)
+_max_days = os.environ.get('hist_cache_max_days')
+if _max_days is not None:
+    max_days = int(_max_days)
+
+# 旧版缓存目录 cache/hist/202303/20230310
+_MONTH_DIR = re.compile(r'^\d{6}$')
+
+
+class _entry:
+    def __init__(self, kind, path, size, used, key=None):
+        self.kind = kind  # store / panel / daily
+        self.path = path
+        self.size = size
+        self.used = used  # 最近使用时间
+        self.key = key
+
+
+def _dir_size(path):
+    size, used = 0, 0
+    for root, dirs, files in os.walk(path):
+        for name in files:
+            try:
+                st = os.stat(os.path.join(root, name))
+            except OSError:
+                continue
+            size += st.st_size
+            used = max(used, st.st_mtime)
+    return size, used
+
+
+def _month_dirs():
+    if not os.path.isdir(stock_hist_cache_path):
+        return []
+    return sorted(name for name in os.listdir(stock_hist_cache_path)
+                  if _MONTH_DIR.match(name) and os.path.isdir(os.path.join(stock_hist_cache_path, name)))
+
+
+# 列出全部缓存项。
+def _entries():
+    entries = []
+    if os.path.isdir(hst.stock_hist_store_path):
+        with os.scandir(hst.stock_hist_store_path) as it:
+            for f in it:
+                if f.is_file() and f.path != hst._manifest_file and hst.TMP_MARK not in f.name:
+                    st = f.stat()
+                    entries.append(_entry('store', f.path, st.st_size, st.st_mtime, f.name.split('.')[0]))
+    if os.path.isdir(hpl.stock_hist_panel_path):
+        with os.scandir(hpl.stock_hist_panel_path) as it:
+            for f in it:
+                if not f.is_dir():
+                    continue
+                size, used = _dir_size(f.path)
+                meta_file = os.path.join(f.path, hpl._META_FILE)
+                if os.path.isfile(meta_file):
+                    used = os.stat(meta_file).st_mtime
+                entries.append(_entry('panel', f.path, size, used))
+    for month in _month_dirs():
+        month_path = os.path.join(stock_hist_cache_path, month)
+        for name in os.listdir(month_path):
+            path = os.path.join(month_path, name)
+            if os.path.isdir(path):
+                size, used = _dir_size(path)
+                entries.append(_entry('daily', path, size, used))
+    return entries
+
+
+def _remove(entry):
+    try:
+        if entry.kind == 'store':
+            hst.remove(entry.key)
+        elif entry.kind == 'panel':
+            return hpl.remove_panel(entry.path)
+        elif os.path.isdir(entry.path):
+            shutil.rmtree(entry.path)
+        elif os.path.isfile(entry.path):
+            os.remove(entry.path)
+    except Exception as e:
+        logging.error(f"hist_cache._remove处理异常：{entry.path}{e}")
+        return False
+    return True
+
+
+# 淘汰缓存：先删除超过保留天数没有使用的，再按最近使用时间从旧到新删除，直到总容量不超过上限。
+def evict(limit_bytes=None, limit_days=None):
+    if limit_bytes is None:
+        limit_bytes = max_bytes
+    if limit_days is None:
+        limit_days = max_days
+    entries = sorted(_entries(), key=lambda x: x.used)
+    total = sum(e.size for e in entries)
+    expire = time.time() - limit_days * 86400
+    count, freed = 0, 0
+    for e in entries:
+        if e.used >= expire and total <= limit_bytes:
+            break
+        if _remove(e):
+            total -= e.size
+            freed += e.size
+            count += 1
+    for month in _month_dirs():
+        month_path = os.path.join(stock_hist_cache_path, month)
+        if not os.listdir(month_path):
+            os.rmdir(month_path)
+    logging.info(f"hist_cache.evict淘汰缓存：{count}项，释放{freed / 1024 / 1024:.1f}MB")
+    return count, freed
+
+
+# 删除旧版按日期分目录的缓存和以前合并的月归档，不再合并归档：
+# 旧缓存是按 date_start 下载的前复权数据，hist_store 保存不复权K线和复权因子，旧数据不能导入 hist_store，
+# 也没有任何读取归档的地方，合并归档只是把不会再用的数据换个格式继续占用磁盘。
+def remove_legacy():
+    paths = [os.path.join(stock_hist_cache_path, month) for month in _month_dirs()]
+    if os.path.isdir(stock_hist_legacy_archive_path):
+        paths.append(stock_hist_legacy_archive_path)
+    count = 0
+    for path in paths:
+        try:
+            shutil.rmtree(path)
+            count += 1
+        except Exception as e:
+            logging.error(f"hist_cache.remove_legacy处理异常：{path}{e}")
+    logging.info(f"hist_cache.remove_legacy删除旧版缓存目录：{count}个")
+    return count
+
+
+# 输出缓存统计：本进程命中率，各类缓存的文件数和容量。
+def log_stats():
+    total = sum(hst.stats.values())
+    if total > 0:
+        logging.info(f"hist_cache缓存命中率：{hst.stats['hit'] / total:.2%}，"
+                     f"命中{hst.stats['hit']}，增量{hst.stats['update']}，全量{hst.stats['miss']}")
+    entries = _entries()
+    for kind in ('store', 'panel', 'daily'):
+        items = [e for e in entries if e.kind == kind]
+        size = sum(e.size for e in items)
+        logging.info(f"hist_cache缓存{kind}：{len(items)}项，{size / 1024 / 1024:.1f}MB")
+    size = sum(e.size for e in entries)
+    logging.info(f"hist_cache缓存合计：{len(entries)}项，{size / 1024 / 1024:.1f}MB，上限{max_bytes / 1024 / 1024:.0f}MB")
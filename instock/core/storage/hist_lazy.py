@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import logging
+import threading
+import concurrent.futures
+from collections import OrderedDict
+from collections.abc import Mapping
+
+__author__ = 'myh '
+__date__ = '2026/10/18 '
+
+# 按需读取的股票历史数据：和 stock_hist_data 的数据一样按 {(日期, 代码, 名称): DataFrame} 使用，
+# 第一次取某只股票时才从本地缓存或者网络读取，只用到部分股票的作业不用下载全市场的数据。
+# 最多保留 max_frames 只股票的数据，超过时淘汰最久没有使用的，再次使用时从本地缓存重新读取。
+# prefetch(keys) 在后台按批读取接下来要用的股票，取数据时不用逐只等待下载。
+# 读取成功但没有数据的股票记为没有数据，以后不再读取；读取失败(网络超时、限流、熔断等)的不记录，下次使用时重新读取。
+# 计算进程池(compute_pool)的子进程不下载数据：share(stocks) 在当前进程把数据下载到本地缓存，子进程只从缓存读取；
+# 不能写缓存(盘中)时没有 sync，share 在当前进程读取数据，compute_pool 保存成临时面板交给子进程。
+max_frames = 2000
+_env = os.environ.get('hist_lazy_max_frames')
+if _env is not None:
+    max_frames = int(_env)
+
+# 每批预读的股票数量，fetch_stock_hist_many 每批内部异步并发下载
+prefetch_batch = 100
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = concurrent.futures.ThreadPoolExecutor(max_workers=2, thread_name_prefix='hist_lazy')
+        return _executor
+
+
+class LazyHistData(Mapping):
+    # load(stocks) 读取一批股票，返回 {股票: DataFrame}，没有数据的股票不返回。
+    # sync(stocks) 把一批股票的数据下载到本地缓存，不返回数据。
+    def __init__(self, stocks, load, frames=None, sync=None):
+        self._stocks = list(stocks)
+        self._keys = set(self._stocks)
+        self._load = load
+        self._sync = sync
+        self.max_frames = max_frames if frames is None else frames
+        self._lock = threading.Lock()
+        self._frames = OrderedDict()
+        self._pending = {}  # 股票 -> Future，正在读取
+        self._missing = set()  # 读取成功但是没有数据
+
+    # 传给子进程时只传股票列表和读取方法，子进程按需读取。
+    def __reduce__(self):
+        return LazyHistData, (self._stocks, self._load, self.max_frames, self._sync)
+
+    # compute_pool 分块前调用，返回交给子进程的数据：有 sync 时把股票数据下载到本地缓存后返回自己，
+    # 否则在当前进程读取，返回 {股票: DataFrame}。
+    def share(self, keys):
+        keys = [k for k in keys if k in self._keys]
+        if self._sync is not None:
+            with self._lock:
+                todo = [k for k in keys if k not in self._missing and k not in self._frames]
+            if todo:
+                self._sync(todo)
+            return self
+        data = {}
+        for i in range(0, len(keys), prefetch_batch * 2):
+            batch = keys[i:i + prefetch_batch * 2]
+            self.prefetch(batch)
+            for k in batch:
+                try:
+                    data[k] = self[k]
+                except Exception:
+                    continue  # 没有数据或者读取失败，读取失败已经记录日志
+        return data
+
+    # 部分股票的数据，不包含已经读取的 DataFrame。
+    def subset(self, keys):
+        return LazyHistData([k for k in keys if k in self._keys], self._load, self.max_frames, self._sync)
+
+    # 登记需要读取的股票，返回 ({股票: Future}, 由调用者读取的股票)
+    def _request(self, keys):
+        futures = {}
+        owned = []
+        with self._lock:
+            for key in keys:
+                if key not in self._keys or key in self._missing or key in self._frames:
+                    continue
+                future = self._pending.get(key)
+                if future is None:
+                    future = self._pending[key] = concurrent.futures.Future()
+                    owned.append(key)
+                futures[key] = future
+        return futures, owned
+
+    # 读取失败(抛出异常或者返回 None)时异常交给等待的调用者，这些股票不记为没有数据，下次使用时重新读取。
+    def _fetch(self, keys, futures):
+        data, error = None, None
+        try:
+            data = self._load(keys)
+            if data is None:
+                error = IOError(f"读取{len(keys)}只股票失败")
+        except Exception as e:
+            error = e
+        if error is not None:
+            logging.error(f"hist_lazy.LazyHistData处理异常：{error}")
+        with self._lock:
+            for key in keys:
+                if error is None:
+                    frame = data.get(key)
+                    if frame is None:
+                        self._missing.add(key)
+                    else:
+                        self._frames[key] = frame
+                del self._pending[key]
+            while len(self._frames) > self.max_frames:
+                self._frames.popitem(last=False)
+        for key in keys:
+            if error is None:
+                futures[key].set_result(data.get(key))
+            else:
+                futures[key].set_exception(error)
+
+    # 预读股票，不在列表中或者已经读取的股票忽略。
+    def prefetch(self, keys):
+        futures, owned = self._request(keys)
+        executor = _get_executor()
+        for i in range(0, len(owned), prefetch_batch):
+            executor.submit(self._fetch, owned[i:i + prefetch_batch], futures)
+
+    def __getitem__(self, key):
+        while True:
+            with self._lock:
+                frame = self._frames.get(key)
+                if frame is not None:
+                    self._frames.move_to_end(key)
+                    return frame
+                if key not in self._keys or key in self._missing:
+                    raise KeyError(key)
+            futures, owned = self._request([key])
+            if owned:
+                self._fetch(owned, futures)
+            future = futures.get(key)
+            if future is None:
+                continue  # 其他线程刚读取完成
+            try:
+                frame = future.result()
+            except Exception:
+                if owned:
+                    raise
+                continue  # 预读或者其他线程读取失败，自己重新读取一次
+            if frame is None:
+                raise KeyError(key)
+            return frame
+
+    # 已经读取的数据占用的内存，singleton_type.get_size 使用
+    @property
+    def nbytes(self):
+        with self._lock:
+            frames = list(self._frames.values())
+        return sum(int(frame.memory_usage(index=True, deep=False).sum()) for frame in frames)
+
+    # 不读取数据：已知没有数据的股票返回 False，还没有读取的股票返回 True，读取后没有数据时 data[key] 仍然报 KeyError。
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._keys and key not in self._missing
+
+    def __iter__(self):
+        return iter(self._stocks)
+
+    def __len__(self):
+        return len(self._stocks)
@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os.path
+import json
+import shutil
+import logging
+import itertools
+import contextlib
+from collections.abc import Mapping
+import numpy as np
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+__author__ = 'myh '
+__date__ = '2026/10/18 '
+
+# 全市场历史数据面板：交易日期 × 股票代码 对齐的矩阵，每个字段一个 .npy 文件，可以内存映射读取。
+# 矩阵按列存储(Fortran order)，每只股票的数据在文件中是连续的，取单只股票不需要复制。
+# 面板由第一个需要它的进程发布，之后的作业进程和进程池子进程都只做内存映射，共用操作系统的同一份页缓存。
+# 可以用环境变量 hist_panel_path 把面板放到 /dev/shm 这类内存文件系统。
+# 面板按 date_start 保存，每个交易日生成新的面板。发布新面板后删除更早的面板，只保留最近 max_panels 个，
+# 打开面板的进程持有 <面板>.readers 文件的共享锁，还有进程在使用的面板不删除，留到下次发布时再删。
+cpath_current = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+stock_hist_panel_path = os.path.join(cpath_current, 'cache', 'hist', 'panel')
+_panel_path = os.environ.get('hist_panel_path')
+if _panel_path is not None:
+    stock_hist_panel_path = _panel_path
+if not os.path.exists(stock_hist_panel_path):
+    os.makedirs(stock_hist_panel_path)  # 创建多个文件夹结构。
+
+# 面板保存的字段，和 stockfetch.fetch_stock_hist 返回的列一致(成交量单位已经是股)。
+FIELDS = ('open', 'close', 'high', 'low', 'volume', 'amount', 'amplitude', 'quote_change', 'ups_downs',
+          'turnover', 'p_change')
+
+# 保留最近的面板个数，可以用环境变量 hist_panel_max 设置
+max_panels = 2
+_env = os.environ.get('hist_panel_max')
+if _env is not None:
+    max_panels = max(1, int(_env))
+
+_META_FILE = 'meta.json'
+_READERS_SUFFIX = '.readers'
+_DATES_FILE = 'dates.npy'
+_temp_ids = itertools.count()
+
+
+class HistPanel:
+    def __init__(self, path, dates, codes, names, missing, fields):
+        self.path = path
+        self.dates = dates  # 日期字符串数组 object
+        self.codes = codes
+        self.names = names
+        self.missing = missing  # 下载过但是没有历史数据的股票
+        self.fields = fields  # 字段名 -> 矩阵 [日期, 代码]
+        self.code_index = {c: i for i, c in enumerate(codes)}
+        self._readers = None  # 持有共享锁的 readers 文件，面板对象释放时关闭
+
+    # 传给子进程时只传路径，子进程重新映射文件，不复制数据。
+    def __reduce__(self):
+        return _open_panel, (self.path,)
+
+    # 是否包含全部股票，没有数据的股票也算包含。
+    def covers(self, codes):
+        for code in codes:
+            if code not in self.code_index and code not in self.missing:
+                return False
+        return True
+
+    # 单只股票的历史数据，去掉上市前和停牌的空行。连续的数据直接使用矩阵的视图。
+    def get_frame(self, code):
+        j = self.code_index.get(code)
+        if j is None:
+            return None
+        close = self.fields['close'][:, j]
+        valid = ~np.isnan(close)
+        idx = np.flatnonzero(valid)
+        if len(idx) == 0:
+            return None
+        first, last = idx[0], idx[-1] + 1
+        if last - first == len(idx):
+            rows = slice(first, last)
+        else:
+            rows = idx
+        columns = {'date': self.dates[rows]}
+        for name in FIELDS:
+            columns[name] = self.fields[name][:, j][rows]
+        return pd.DataFrame(columns, copy=False)
+
+    # 转成 stock_hist_data 使用的字典，key 为 (日期, 代码, 名称)
+    def to_dict(self, stocks):
+        return PanelHistData(self, stocks)
+
+
+# 按字典方式使用的面板数据，第一次取某只股票的时候才生成 DataFrame，之后复用。
+class PanelHistData(Mapping):
+    def __init__(self, panel, stocks):
+        self.panel = panel
+        self._stocks = [s for s in stocks if s[1] in panel.code_index]
+        self._keys = set(self._stocks)
+        self._frames = {}
+
+    def __reduce__(self):
+        return PanelHistData, (self.panel, self._stocks)
+
+    # 部分股票的数据，传给子进程时只传面板路径和这些股票。
+    def subset(self, keys):
+        return PanelHistData(self.panel, [k for k in keys if k in self._keys])
+
+    def __getitem__(self, key):
+        frame = self._frames.get(key)
+        if frame is None:
+            if key not in self._keys:
+                raise KeyError(key)
+            frame = self.panel.get_frame(key[1])
+            if frame is None:
+                raise KeyError(key)
+            self._frames[key] = frame
+        return frame
+
+    # 已经生成的 DataFrame 占用的内存，面板文件是内存映射，不计算，singleton_type.get_size 使用
+    @property
+    def nbytes(self):
+        frames = list(self._frames.values())
+        return sum(int(frame.memory_usage(index=True, deep=False).sum()) for frame in frames)
+
+    def __contains__(self, key):
+        return key in self._keys
+
+    def __iter__(self):
+        return iter(self._stocks)
+
+    def __len__(self):
+        return len(self._stocks)
+
+
+def get_path(date_start):
+    return os.path.join(stock_hist_panel_path, date_start)
+
+
+# 打开面板，mmap 方式只映射文件不读取，数据在访问的时候才从磁盘读入。
+def load_panel(date_start, mmap_mode='r'):
+    return _open_panel(get_path(date_start), mmap_mode)
+
+
+def _open_panel(path, mmap_mode='r'):
+    meta_file = os.path.join(path, _META_FILE)
+    if not os.path.isfile(meta_file):
+        return None
+    readers = _open_readers(path)
+    try:
+        if not os.path.isfile(meta_file):
+            return None  # 等待共享锁期间面板被删除
+        with open(meta_file, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        dates = np.load(os.path.join(path, _DATES_FILE)).astype(object)
+        fields = {}
+        for name in FIELDS:
+            fields[name] = np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode)
+        panel = HistPanel(path, dates, meta['codes'], meta['names'], set(meta['missing']), fields)
+        panel._readers, readers = readers, None
+        return panel
+    except Exception as e:
+        logging.error(f"hist_panel.load_panel处理异常：{path}{e}")
+    finally:
+        if readers is not None:
+            readers.close()
+    return None
+
+
+# 打开面板的进程持有 readers 文件的共享锁，直到面板对象释放。没有 fcntl 的系统不加锁，
+# Windows 上映射中的文件不能删除，删除面板时改名目录失败就跳过。
+def _open_readers(path):
+    if fcntl is None:
+        return None
+    try:
+        f = open(f"{path}{_READERS_SUFFIX}", 'a+')
+    except OSError:
+        return None
+    fcntl.flock(f.fileno(), fcntl.LOCK_SH)
+    return f
+
+
+# 删除面板，有进程在使用时不删除，返回是否删除。
+def remove_panel(path):
+    readers = None
+    try:
+        if fcntl is not None:
+            readers = open(f"{path}{_READERS_SUFFIX}", 'a+')
+            try:
+                fcntl.flock(readers.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                return False  # 有进程在使用
+        # 先改名，之后打开面板的进程找不到它；Windows 上有文件在映射时改名失败
+        tmp_path = f"{path}.del{os.getpid()}"
+        os.rename(path, tmp_path)
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        for suffix in ('.lock', _READERS_SUFFIX):
+            try:
+                os.remove(f"{path}{suffix}")
+            except OSError:
+                pass
+        return True
+    except OSError as e:
+        logging.error(f"hist_panel.remove_panel处理异常：{path}{e}")
+    finally:
+        if readers is not None:
+            readers.close()
+    return False
+
+
+# 已经保存的面板的 date_start，从旧到新。
+def get_dates():
+    dates = []
+    with os.scandir(stock_hist_panel_path) as it:
+        for f in it:
+            if f.is_dir() and '.' not in f.name:
+                dates.append(f.name)
+    return sorted(dates)
+
+
+# 发布 date_start 的面板后删除更早的面板，包括它在内只保留最近 max_panels 个。
+def prune(date_start):
+    dates = [d for d in get_dates() if d < date_start]
+    removed = 0
+    for d in dates[:max(0, len(dates) - (max_panels - 1))]:
+        if remove_panel(get_path(d)):
+            removed += 1
+    if removed > 0:
+        logging.info(f"hist_panel.prune删除旧面板：{removed}个")
+    return removed
+
+
+# 把每只股票的历史数据字典转成面板矩阵，并保存到 date_start 目录。
+def save_panel(data, date_start, stocks=None):
+    if not _write_panel(data, get_path(date_start), date_start, stocks):
+        return None
+    return load_panel(date_start)
+
+
+def _write_panel(data, path, date_start, stocks=None):
+    stock_keys = list(data.keys())
+    codes = [k[1] for k in stock_keys]
+    names = [k[2] for k in stock_keys]
+    missing = []
+    if stocks is not None:
+        missing = [s[1] for s in stocks if s not in data]
+
+    all_dates = np.unique(np.concatenate([data[k]['date'].values.astype(str) for k in stock_keys]))
+    size = (len(all_dates), len(codes))
+    fields = {name: np.full(size, np.nan, dtype=np.float64, order='F') for name in FIELDS}
+    for j, k in enumerate(stock_keys):
+        frame = data[k]
+        rows = np.searchsorted(all_dates, frame['date'].values.astype(str))
+        values = frame[list(FIELDS)].to_numpy(dtype=np.float64)
+        for i, name in enumerate(FIELDS):
+            fields[name][rows, j] = values[:, i]
+
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    try:
+        if os.path.exists(tmp_path):
+            shutil.rmtree(tmp_path)
+        os.makedirs(tmp_path)
+        np.save(os.path.join(tmp_path, _DATES_FILE), all_dates)
+        for name in FIELDS:
+            np.save(os.path.join(tmp_path, f"{name}.npy"), fields[name])
+        # meta 最后写，有 meta 的目录才是完整的面板。
+        with open(os.path.join(tmp_path, _META_FILE), 'w', encoding='utf-8') as f:
+            json.dump({'date_start': date_start, 'codes': codes, 'names': names, 'missing': missing}, f)
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        os.replace(tmp_path, path)
+    except Exception as e:
+        logging.error(f"hist_panel.save_panel处理异常：{path}{e}")
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        return False
+    return True
+
+
+# 计算进程池使用的临时面板：盘中的历史数据不写缓存，先保存成临时面板，子进程按路径映射读取，不复制 DataFrame。
+# 返回 PanelHistData，退出时删除面板。数据有面板以外的列或者保存失败时返回 None，由调用者直接使用字典。
+@contextlib.contextmanager
+def temp_panel(data):
+    columns = {'date', *FIELDS}
+    if not data or any(not columns.issuperset(frame.columns) for frame in data.values()):
+        yield None
+        return
+    path = os.path.join(stock_hist_panel_path, f"pool.{os.getpid()}.{next(_temp_ids)}")  # 带'.'，不是按日期发布的面板
+    panel = None
+    try:
+        if _write_panel(data, path, ''):
+            panel = _open_panel(path)
+        yield None if panel is None else panel.to_dict(list(data))
+    finally:
+        if panel is not None and panel._readers is not None:
+            panel._readers.close()
+        # 进程池的计算已经结束，Linux 上即使还有映射也可以删除
+        shutil.rmtree(path, ignore_errors=True)
+        try:
+            os.remove(f"{path}{_READERS_SUFFIX}")
+        except OSError:
+            pass
+
+
+# stock_hist_data 一次调用读取全部股票，面板不存在或者股票不全返回 None。
+def load_hist(stocks, date_start):
+    panel = load_panel(date_start)
+    if panel is None or not panel.covers([s[1] for s in stocks]):
+        return None
+    try:
+        os.utime(os.path.join(panel.path, _META_FILE))  # 最近使用时间，缓存淘汰使用
+    except OSError:
+        pass
+    return panel.to_dict(stocks)
+
+
+# 跨进程的发布锁，同一个 date_start 只有一个进程生成面板，其他进程等待后直接映射。
+@contextlib.contextmanager
+def _publish_lock(date_start):
+    with open(f"{get_path(date_start)}.lock", 'a+') as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue  # LK_LOCK 最多等待10秒，继续等待
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+# 读取已发布的面板，没有的话由 build 生成股票历史数据字典并发布。
+# 发布后返回映射面板的数据，进程内存里只保留页缓存中的一份。
+def publish(stocks, date_start, build):
+    data = load_hist(stocks, date_start)
+    if data is not None:
+        return data
+    try:
+        with _publish_lock(date_start):
+            data = load_hist(stocks, date_start)  # 等待期间其他进程可能已经发布
+            if data is not None:
+                return data
+            data = build()
+            if not data:
+                return data
+            panel = save_panel(data, date_start, stocks)
+            if panel is None:
+                return data
+        prune(date_start)
+        return panel.to_dict(stocks)
+    except OSError as e:
+        logging.error(f"hist_panel.publish处理异常：{date_start}{e}")
+    if data is None:
+        data = build()
+    return data
@@ -0,0 +1,566 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os.path
+import json
+import time
+import zlib
+import logging
+import threading
+import numpy as np
+import pandas as pd
+import instock.core.tablestructure as tbs
+import instock.lib.trade_time as trd
+import instock.core.crawling.stock_hist_em as she
+import instock.core.crawling.fund_etf_em as fee
+import instock.core.crawling.stock_fhps_em as sfe
+import instock.core.storage.codec as cdc
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+__author__ = 'myh '
+__date__ = '2026/10/18 '
+
+# 股票历史数据滚动缓存：每只股票一个文件，保留已下载的K线，每次只向东方财富请求最后缓存日期之后的数据。
+# 原来按 date_start 分目录缓存，date_start 每天后移一天，导致每天都要重新下载约730根K线。
+# 缓存保存不复权K线和复权因子，前复权、后复权在读取时计算，除权除息不需要重新下载历史数据，一份缓存支持全部复权方式。
+# 复权按东方财富的方式：除权除息日之前的价格 P 换算成 (P - 每股现金分红) / (1 + 每股送转股)，分红送转数据来自 stock_fhps_em。
+# 没有分红送转记录的除权日(配股等)按前收盘价的比值等比复权。和接口的前复权价格相差在 ADJUST_API_TOLERANCE 以内，
+# 用 instock/bench/hist_adjust_parity.py 检查。
+cpath_current = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+stock_hist_store_path = os.path.join(cpath_current, 'cache', 'hist', 'store')
+if not os.path.exists(stock_hist_store_path):
+    os.makedirs(stock_hist_store_path)  # 创建多个文件夹结构。
+
+# 重叠K线价格比对的容差，东方财富返回的价格保留2位小数。
+ADJUST_TOLERANCE = 0.001
+
+# 接口的复权价格保留2位小数，本地计算的复权价格和接口相差不超过这个值。
+ADJUST_API_TOLERANCE = 0.01
+
+# 复权时需要换算的价格列，涨跌额只乘以比例，成交量、成交额、换手率和涨跌幅、振幅不变。
+ADJUST_COLUMNS = ('open', 'close', 'high', 'low')
+_ADJUST_INDEX = [list(tbs.CN_STOCK_HIST_DATA['columns'])[1:].index(col) for col in ADJUST_COLUMNS]
+_UPS_DOWNS_INDEX = list(tbs.CN_STOCK_HIST_DATA['columns'])[1:].index('ups_downs')
+
+# 分红送转：报告期 -> {代码: [(除权除息日, 每股现金分红, 每股送转股)]}，本进程读取过的报告期
+_bonus = {}
+_bonus_failed = {}  # 报告期 -> 读取失败的时间，BONUS_RETRY 秒内不再读取
+_bonus_lock = threading.Lock()
+BONUS_RETRY = 600
+
+# 数据来源：股票和ETF日K线接口
+_SOURCES = {
+    'stock': she.stock_zh_a_hist,
+    'etf': fee.fund_etf_hist_em,
+}
+
+# 缓存文件先写临时文件再改名，进程被杀只会留下临时文件，不会有写了一半的缓存文件。
+TMP_MARK = '.tmp'
+# 超过这个时间的临时文件是被杀进程留下的，启动时删除。
+TMP_EXPIRE = 3600
+
+_manifest_file = os.path.join(stock_hist_store_path, 'manifest.jsonl')
+_manifest = None
+_manifest_lines = 0
+_lock = threading.RLock()
+
+# 本进程的缓存命中统计：hit 缓存已是最新，update 增量下载，miss 全量下载。
+stats = {'hit': 0, 'update': 0, 'miss': 0}
+
+
+def _count(name):
+    with _lock:
+        stats[name] += 1
+
+
+# 读取缓存清单，清单是追加写的json lines，同一个key以最后一行为准。
+# 每行记录：key, begin(请求过的最早开始日期), last(最后一根K线日期), synced(已同步到的收盘交易日), rows,
+# codec(序列化方式), size(文件字节数), crc(文件crc32)
+def _read_manifest():
+    manifest = {}
+    lines = 0
+    if os.path.isfile(_manifest_file):
+        with open(_manifest_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                lines += 1
+                try:
+                    item = json.loads(line)
+                except ValueError:
+                    continue  # 进程被杀时可能留下不完整的一行
+                if item.get('deleted'):
+                    manifest.pop(item['key'], None)
+                else:
+                    manifest[item['key']] = item
+    return manifest, lines
+
+
+# 进程第一次使用缓存时读取清单，检查并修复缓存文件，清单行数太多时压缩。
+def _load_manifest():
+    global _manifest, _manifest_lines
+    with _lock:
+        if _manifest is None:
+            try:
+                _manifest, _manifest_lines = _read_manifest()
+            except Exception as e:
+                logging.error(f"hist_store._load_manifest处理异常：{e}")
+                _manifest, _manifest_lines = {}, 0
+            validate()
+            if _manifest_lines > 2 * len(_manifest) + 1000:
+                compact_manifest()
+        return _manifest
+
+
+def get_meta(key):
+    return _load_manifest().get(key)
+
+
+# 清单文件被压缩替换后，已经打开的旧文件不能再写。
+def _is_current(f):
+    try:
+        return os.fstat(f.fileno()).st_ino == os.stat(_manifest_file).st_ino
+    except OSError:
+        return False
+
+
+# 多个进程同时追加清单，用文件锁保证每行完整，并且不会写到压缩前的旧文件。
+def _append_manifest(text):
+    global _manifest_lines
+    while True:
+        with open(_manifest_file, 'a', encoding='utf-8') as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+                if not _is_current(f):
+                    continue
+            f.write(text)
+            _manifest_lines += 1
+            return
+
+
+def _put_meta(item):
+    with _lock:
+        _load_manifest()[item['key']] = item
+        try:
+            _append_manifest(json.dumps(item) + '\n')
+        except Exception as e:
+            logging.error(f"hist_store._put_meta处理异常：{item['key']}{e}")
+
+
+# 压缩清单：每个key只保留最后一行，写临时文件后替换。
+def compact_manifest():
+    global _manifest, _manifest_lines
+    with _lock:
+        try:
+            with open(_manifest_file, 'a', encoding='utf-8') as f:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+                manifest, lines = _read_manifest()  # 在锁内重新读取，包含其他进程追加的行
+                tmp_file = f"{_manifest_file}{TMP_MARK}{os.getpid()}"
+                with open(tmp_file, 'w', encoding='utf-8') as t:
+                    for item in manifest.values():
+                        t.write(json.dumps(item) + '\n')
+                    t.flush()
+                    os.fsync(t.fileno())
+                os.replace(tmp_file, _manifest_file)
+            _manifest, _manifest_lines = manifest, len(manifest)
+            logging.info(f"hist_store.compact_manifest压缩清单：{lines}行 -> {len(manifest)}行")
+        except Exception as e:
+            logging.error(f"hist_store.compact_manifest处理异常：{e}")
+
+
+def _checksum(path):
+    crc = 0
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            crc = zlib.crc32(chunk, crc)
+    return crc
+
+
+def _is_valid(key, meta, full=False):
+    cache_file = get_file(key, meta.get('codec', cdc.DEFAULT_CODEC))
+    try:
+        if 'size' in meta and os.path.getsize(cache_file) != meta['size']:
+            return False
+        if full and 'crc' in meta and _checksum(cache_file) != meta['crc']:
+            return False
+    except OSError:
+        return False
+    return True
+
+
+# 检查缓存文件和清单是否一致：文件不存在、大小不对(full 时还检查crc32)的删除，下次只重新下载这一只股票。
+# 同时删除被杀进程留下的临时文件和清单里没有记录的文件。返回修复的数量。
+def validate(full=False):
+    repaired = 0
+    with _lock:
+        manifest = _load_manifest()
+        suspects = [key for key, meta in manifest.items() if not _is_valid(key, meta, full)]
+        try:
+            # 其他进程可能刚刚更新过，按最新的清单再确认一次。
+            latest, lines = _read_manifest()
+        except Exception as e:
+            logging.error(f"hist_store.validate处理异常：{e}")
+            return repaired
+        for key in suspects:
+            meta = latest.get(key)
+            if meta is not None and meta != manifest.get(key) and _is_valid(key, meta, full):
+                manifest[key] = meta
+                continue
+            logging.error(f"hist_store.validate缓存文件损坏：{key}")
+            remove(key)
+            repaired += 1
+
+        names = set(os.path.basename(get_file(key, meta.get('codec', cdc.DEFAULT_CODEC)))
+                    for key, meta in latest.items())
+        expire = time.time() - TMP_EXPIRE
+        try:
+            with os.scandir(stock_hist_store_path) as it:
+                for f in it:
+                    if not f.is_file() or f.path == _manifest_file or f.name in names:
+                        continue
+                    if f.stat().st_mtime < expire:
+                        os.remove(f.path)  # 被杀进程留下的临时文件，清单里没有记录的文件
+                        repaired += 1
+        except Exception as e:
+            logging.error(f"hist_store.validate处理异常：{e}")
+    if repaired > 0:
+        logging.info(f"hist_store.validate修复缓存：{repaired}个")
+    return repaired
+
+
+def get_key(code, source='stock'):
+    if source == 'stock':
+        return code
+    return f"{source}_{code}"
+
+
+def get_file(key, codec=None):
+    return os.path.join(stock_hist_store_path, f"{key}.{cdc.get_codec(codec).suffix}")
+
+
+# 按清单记录的序列化方式读取，切换序列化方式后旧文件仍然可以读取，下次保存时转换。
+def load(key):
+    meta = get_meta(key)
+    codec = cdc.get_codec(meta.get('codec', cdc.DEFAULT_CODEC) if meta is not None else None)
+    cache_file = get_file(key, codec.name)
+    if not os.path.isfile(cache_file):
+        return None
+    try:
+        data = codec.read(cache_file)
+    except Exception as e:
+        # 文件损坏，删除后按没有缓存处理。
+        logging.error(f"hist_store.load处理异常：{key}缓存损坏{e}")
+        remove(key)
+        return None
+    touch(cache_file)
+    return data
+
+
+# 更新文件时间作为最近使用时间，缓存淘汰按这个时间，不依赖文件系统的 atime。
+def touch(path):
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+# 先写临时文件再原子替换，读取的线程和进程只会看到完整的旧文件或者新文件。
+def save(key, data, begin, synced):
+    codec = cdc.get_codec()
+    cache_file = get_file(key, codec.name)
+    tmp_file = f"{cache_file}{TMP_MARK}{os.getpid()}_{threading.get_ident()}"
+    try:
+        codec.write(data, tmp_file)
+        size = os.path.getsize(tmp_file)
+        crc = _checksum(tmp_file)
+        os.replace(tmp_file, cache_file)
+    except Exception:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+        raise
+    meta = get_meta(key)
+    old_codec = meta.get('codec', cdc.DEFAULT_CODEC) if meta is not None else codec.name
+    _put_meta({'key': key, 'begin': begin, 'last': data['date'].iloc[-1], 'synced': synced,
+               'rows': len(data.index), 'codec': codec.name, 'size': size, 'crc': crc})
+    if old_codec != codec.name:
+        _remove_files(key, codec.name)
+
+
+# 删除其他序列化方式的旧文件
+def _remove_files(key, keep=None):
+    for c in cdc.CODECS.values():
+        if c.name == keep:
+            continue
+        cache_file = os.path.join(stock_hist_store_path, f"{key}.{c.suffix}")
+        if os.path.isfile(cache_file):
+            os.remove(cache_file)
+
+
+# 删除一只股票的缓存，清单里追加删除标记。
+def remove(key):
+    with _lock:
+        try:
+            _remove_files(key)
+        except Exception as e:
+            logging.error(f"hist_store.remove处理异常：{key}{e}")
+            return
+        if key in _load_manifest():
+            _put_meta({'key': key, 'deleted': True})
+            _manifest.pop(key, None)
+
+
+# 20230310 -> 2023-03-10
+def _dash_date(date):
+    return f"{date[0:4]}-{date[4:6]}-{date[6:8]}"
+
+
+# 2023-03-10 -> 20230310
+def _compact_date(date):
+    return date.replace('-', '')
+
+
+# 当前已经收盘的最后一个交易日，缓存同步到这一天就不需要再请求。
+def _closed_date():
+    run_date, run_date_nph = trd.get_trade_date_last()
+    return run_date.strftime("%Y-%m-%d")
+
+
+# 下载不复权K线
+def _fetch(code, date_start, source='stock'):
+    return normalize(_SOURCES[source](symbol=code, period="daily", start_date=date_start, adjust=''))
+
+
+# 接口返回的中文列名换成缓存使用的列名
+def normalize(data):
+    if data is None or len(data.index) == 0:
+        return None
+    data.columns = tuple(tbs.CN_STOCK_HIST_DATA['columns'])
+    return data.sort_values(by='date', ignore_index=True)  # 将数据按照日期排序下。
+
+
+# 复权因子(后复权，第一根K线为1)。不复权K线的涨跌额是相对交易所除权后的前收盘价计算的，
+# 前收盘价 = 收盘价 - 涨跌额，和上一根K线收盘价不同的那天就是除权除息日，两者的比值就是当天的复权系数。
+def _add_factor(data):
+    close = data['close'].values.astype(np.float64)
+    pre_close = close - data['ups_downs'].values.astype(np.float64)
+    ratio = np.ones(len(close))
+    if len(close) > 1:
+        last_close = close[:-1]
+        ratio[1:] = np.where(np.abs(pre_close[1:] - last_close) > 1e-6, pre_close[1:] / last_close, 1.0)
+    ratio[~np.isfinite(ratio) | (ratio <= 0)] = 1.0
+    data['factor'] = np.cumprod(1.0 / ratio)
+    return data
+
+
+# first_date 所在年份的上一年年报之后，到最近一个报告期的全部报告期(每年0630、1231)。
+def _report_dates(first_date):
+    last = trd.get_bonus_report_date()
+    dates = []
+    for year in range(int(first_date[0:4]) - 1, int(last[0:4]) + 1):
+        for month_day in ('0630', '1231'):
+            date = f"{year}{month_day}"
+            if date <= last:
+                dates.append(date)
+    return dates
+
+
+def _load_bonus_report(date):
+    data = sfe.stock_fhps_em(date=date)
+    data = data.loc[data['除权除息日'].notna()]
+    bonus = {}
+    for code, ex_date, shares, cash in zip(data['代码'].values, data['除权除息日'].values,
+                                          data['送转股份-送转总比例'].values, data['现金分红-现金分红比例'].values):
+        shares = 0.0 if pd.isna(shares) else float(shares) / 10  # 每10股
+        cash = 0.0 if pd.isna(cash) else float(cash) / 10
+        bonus.setdefault(code, []).append((ex_date.strftime("%Y-%m-%d"), cash, shares))
+    return bonus
+
+
+# 读取 first_date 之后的分红送转数据，读取失败的报告期记录日志，BONUS_RETRY 秒后再读取，这期间按前收盘价的比值复权。
+def load_bonus(first_date):
+    with _bonus_lock:
+        for date in _report_dates(first_date):
+            if date in _bonus or time.monotonic() - _bonus_failed.get(date, -BONUS_RETRY) < BONUS_RETRY:
+                continue
+            try:
+                _bonus[date] = _load_bonus_report(date)
+                _bonus_failed.pop(date, None)
+            except Exception as e:
+                _bonus_failed[date] = time.monotonic()
+                logging.error(f"hist_store.load_bonus处理异常：{date}报告期{e}")
+
+
+# 股票 first_date 之后的分红送转，按除权除息日排序。
+def get_events(code, first_date):
+    load_bonus(first_date)
+    events = set()
+    with _bonus_lock:
+        for date in _report_dates(first_date):
+            events.update(_bonus.get(date, {}).get(code, ()))
+    return sorted(event for event in events if event[0] > first_date)
+
+
+# 每根K线到复权价格的换算 A * P + B。每个除权日 t 把之前的价格 P 换算成 a[t] * P + b[t]：
+# 默认 a 是前收盘价的比值(复权因子的比值)、b 为0，有分红送转记录的按 (P - 现金分红) / (1 + 送转股)。
+# 前复权依次应用之后的每个除权日，后复权依次应用之前每个除权日的逆运算。
+def _adjust_coef(data, adjust, events):
+    factor = data['factor'].values
+    n = len(factor)
+    a = np.ones(n)
+    b = np.zeros(n)
+    a[1:] = factor[:-1] / factor[1:]
+    if events:
+        rows = np.searchsorted(data['date'].values, [e[0] for e in events], side='left')
+        for row, (ex_date, cash, shares) in zip(rows, events):
+            if 0 < row < n:
+                a[row] = 1.0 / (1.0 + shares)
+                b[row] = -cash / (1.0 + shares)
+    if adjust == 'qfq':
+        coef_a = np.ones(n)
+        coef_b = np.zeros(n)
+        coef_a[:-1] = np.cumprod(a[::-1])[::-1][1:]
+        coef_b[:-1] = np.cumsum((coef_a * b)[::-1])[::-1][1:]
+    else:
+        coef_a = np.cumprod(1.0 / a)
+        coef_b = -np.cumsum(coef_a * b)
+    return coef_a, coef_b
+
+
+# 按复权方式计算价格，前复权以最后一根K线为基准，后复权以缓存的第一根K线为基准。
+# events 是 get_events 返回的分红送转，None 时全部按前收盘价的比值复权(ETF)。
+# begin/end 是返回的行区间，复权基准不受区间影响。数值列统一为 float64。
+def adjust_hist(data, adjust='', begin=0, end=None, events=None):
+    if 'factor' not in data.columns:
+        data = _add_factor(data.copy())
+    columns = list(tbs.CN_STOCK_HIST_DATA['columns'])
+    values = data[columns[1:]].to_numpy(dtype=np.float64)[begin:end]
+    if adjust in ('qfq', 'hfq'):
+        coef_a, coef_b = _adjust_coef(data, adjust, events)
+        coef_a = coef_a[begin:end, np.newaxis]
+        values[:, _ADJUST_INDEX] = values[:, _ADJUST_INDEX] * coef_a + coef_b[begin:end, np.newaxis]
+        values[:, _UPS_DOWNS_INDEX] *= coef_a[:, 0]
+    result = pd.DataFrame(values, columns=columns[1:])
+    result.insert(0, columns[0], data[columns[0]].values[begin:end])
+    return result
+
+
+# 判断重叠的那根K线前后是否一致，不复权数据一般不会变，不一致说明数据源修正过历史数据，需要全部重新下载。
+def _is_changed(data, new_data):
+    last = data.iloc[-1]
+    overlap = new_data.loc[new_data['date'] == last['date']]
+    if len(overlap.index) == 0:
+        return True
+    overlap = overlap.iloc[0]
+    for col in ('open', 'close', 'high', 'low'):
+        if abs(overlap[col] - last[col]) > ADJUST_TOLERANCE:
+            return True
+    return False
+
+
+# 计算需要下载的开始日期，None 表示缓存已经是最新的。
+# 返回 (缓存数据, 下载开始日期, 是否全量下载)
+def plan(code, date_start, is_cache=True, source='stock'):
+    key = get_key(code, source)
+    meta = get_meta(key)
+    data = None
+    if meta is not None and meta['begin'] <= date_start:
+        try:
+            data = load(key)
+        except Exception as e:
+            logging.error(f"hist_store.plan处理异常：{key}缓存{e}")
+    if data is None or len(data.index) == 0:
+        _count('miss')
+        return None, date_start, True
+    if is_cache and meta['synced'] >= _closed_date():
+        _count('hit')
+        return data, None, False
+    _count('update')
+    return data, _compact_date(data['date'].iloc[-1]), False
+
+
+# 缓存是否已经同步到最后收盘的交易日，只查清单不读文件。
+def is_synced(code, date_start, source='stock'):
+    meta = get_meta(get_key(code, source))
+    return meta is not None and meta['begin'] <= date_start and meta['synced'] >= _closed_date()
+
+
+# 把新下载的K线合并到缓存并计算复权因子。返回合并后的数据，历史数据不一致时返回 None，需要全量下载。
+def merge(code, date_start, data, new_data, is_full, is_cache=True, source='stock'):
+    key = get_key(code, source)
+    if is_full:
+        if new_data is None:
+            return None
+        data = _add_factor(new_data)
+        begin = date_start
+    else:
+        if new_data is None:
+            # 停牌、退市或者接口没有返回，保留原缓存，下次再同步。
+            return data
+        if _is_changed(data, new_data):
+            return None
+        new_data = new_data.loc[new_data['date'] > data['date'].iloc[-1]]
+        if len(new_data.index) > 0:
+            data = _add_factor(pd.concat([data, new_data], ignore_index=True))
+        begin = get_meta(key)['begin']
+    if is_cache:
+        try:
+            save(key, data, begin, _closed_date())
+        except Exception as e:
+            logging.error(f"hist_store.merge处理异常：{key}缓存{e}")
+    return data
+
+
+# 同步一只股票缓存的流程，不做网络请求：每次 yield 需要下载的开始日期，调用者下载后用 send 传回新数据，
+# 结束时返回合并后的数据。同步版本 fetch_hist 和异步批量下载 hist_bulk 共用，调用者只负责下载。
+def sync_steps(code, date_start, is_cache=True, source='stock'):
+    data, fetch_start, is_full = plan(code, date_start, is_cache, source)
+    if fetch_start is not None:
+        new_data = yield fetch_start
+        data = merge(code, date_start, data, new_data, is_full, is_cache, source)
+        if data is None and not is_full:
+            # 历史数据有修正，从最早的开始日期重新下载。
+            begin = get_meta(get_key(code, source))['begin']
+            new_data = yield begin
+            data = merge(code, begin, None, new_data, True, is_cache, source)
+    return data
+
+
+# 推进 sync_steps 一步，返回 (是否结束, 下载开始日期或者最后的数据)。
+# 不把 StopIteration 抛给调用者，可以放到 run_in_executor 里执行。
+def advance(steps, new_data=None):
+    try:
+        return False, steps.send(new_data)
+    except StopIteration as e:
+        return True, e.value
+
+
+# 读取股票或ETF历史数据，本地已有的K线直接使用，只下载缺少的交易日，再按 adjust 计算复权价格。
+def fetch_hist(code, date_start, date_end=None, is_cache=True, adjust='', source='stock'):
+    steps = sync_steps(code, date_start, is_cache, source)
+    done, value = advance(steps)
+    while not done:
+        done, value = advance(steps, _fetch(code, value, source))
+    return view(value, date_start, date_end, adjust, get_adjust_events(code, value, adjust, source))
+
+
+# 复权用的分红送转，股票才有，不复权时不需要。
+def get_adjust_events(code, data, adjust, source='stock'):
+    if source != 'stock' or adjust not in ('qfq', 'hfq') or data is None or len(data.index) == 0:
+        return None
+    return get_events(code, data['date'].iloc[0])
+
+
+# 缓存数据按复权方式和日期区间返回，缓存按日期排序，用二分查找定位区间。
+def view(data, date_start, date_end=None, adjust='', events=None):
+    if data is None or len(data.index) == 0:
+        return None
+    dates = data['date'].values
+    begin = np.searchsorted(dates, _dash_date(date_start), side='left')
+    end = len(dates) if date_end is None else np.searchsorted(dates, _dash_date(date_end), side='right')
+    return adjust_hist(data, adjust, begin, end, events)
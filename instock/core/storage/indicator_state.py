@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os.path
+import json
+import shutil
+import logging
+import numpy as np
+
+__author__ = 'myh '
+__date__ = '2026/10/18 '
+
+# 指标计算状态：每个交易日计算完成后保存全部股票的计算状态(EMA的值、移动求和、循环缓冲区等)，
+# 下一个交易日从状态继续计算新的一行，不用从历史数据重新计算。
+# 每个日期一个目录，meta.json 记录日期和股票代码，state.npz 保存状态数组，数组最后一维是股票。
+# 只保留最近 max_states 个日期，重新计算某一天时使用它前一个日期的状态。
+cpath_current = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+indicator_state_path = os.path.join(cpath_current, 'cache', 'indicator', 'state')
+_state_path = os.environ.get('indicator_state_path')
+if _state_path is not None:
+    indicator_state_path = _state_path
+if not os.path.exists(indicator_state_path):
+    os.makedirs(indicator_state_path)  # 创建多个文件夹结构。
+
+max_states = 10
+
+_META_FILE = 'meta.json'
+_STATE_FILE = 'state.npz'
+
+
+def get_path(date):
+    return os.path.join(indicator_state_path, date)
+
+
+# 已经保存状态的日期，从旧到新
+def get_dates():
+    dates = []
+    with os.scandir(indicator_state_path) as it:
+        for f in it:
+            if f.is_dir() and os.path.isfile(os.path.join(f.path, _META_FILE)):
+                dates.append(f.name)
+    return sorted(dates)
+
+
+# 保存 date 计算完成后的状态，codes 为股票代码，state 为 名称 -> 数组。
+def save_state(date, codes, state):
+    path = get_path(date)
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    try:
+        if os.path.exists(tmp_path):
+            shutil.rmtree(tmp_path)
+        os.makedirs(tmp_path)
+        np.savez(os.path.join(tmp_path, _STATE_FILE), **state)
+        # meta 最后写，有 meta 的目录才是完整的状态。
+        with open(os.path.join(tmp_path, _META_FILE), 'w', encoding='utf-8') as f:
+            json.dump({'date': date, 'codes': list(codes)}, f)
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        os.replace(tmp_path, path)
+    except Exception as e:
+        logging.error(f"indicator_state.save_state处理异常：{path}{e}")
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        return False
+
+    for old in get_dates()[:-max_states]:
+        shutil.rmtree(get_path(old), ignore_errors=True)
+    return True
+
+
+# 读取 date 之前最近一个日期的状态，返回 (日期, 股票代码, 状态)，没有时返回 None。
+def load_state(date):
+    dates = [d for d in get_dates() if d < date]
+    if not dates:
+        return None
+    path = get_path(dates[-1])
+    try:
+        with open(os.path.join(path, _META_FILE), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        with np.load(os.path.join(path, _STATE_FILE)) as f:
+            state = {name: f[name] for name in f.files}
+        return meta['date'], meta['codes'], state
+    except Exception as e:
+        logging.error(f"indicator_state.load_state处理异常：{path}{e}")
+    return None
@@ -14,6 +14,7 @@ cpath = os.path.abspath(os.path.join(cpath_current, os.pardir))
 sys.path.append(cpath)
 import instock.core.tablestructure as tbs
 import instock.lib.database as mdb
+import instock.lib.compute_pool as cpl
 import instock.core.backtest.rate_stats as rate
 from instock.core.singleton_stock import stock_hist_data
 
@@ -30,7 +31,8 @@ def prepare():
     backtest_columns.insert(0, 'date')
     backtest_column = backtest_columns
 
-    stocks_data = stock_hist_data().get_data()
+    # 只需要有未完成回归测试记录的股票，按需读取历史数据
+    stocks_data = stock_hist_data(lazy=True).get_data()
     if stocks_data is None:
         return
     for k in stocks_data:
@@ -71,21 +73,11 @@ def process(table, data_all, date, backtest_column):
         logging.error(f"backtest_data_daily_job.process处理异常：{table}表{e}")
 
 
-def run_check(stocks, data_all, date, backtest_column, workers=9):
+def run_check(stocks, data_all, date, backtest_column):
     data = {}
     try:
-        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
-            future_to_data = {executor.submit(rate.get_rates, stock,
-                                              data_all.get((date, stock[1], stock[2])), backtest_column,
-                                              len(backtest_column) - 1): stock for stock in stocks}
-            for future in concurrent.futures.as_completed(future_to_data):
-                stock = future_to_data[future]
-                try:
-                    _data_ = future.result()
-                    if _data_ is not None:
-                        data[stock] = _data_
-                except Exception as e:
-                    logging.error(f"backtest_data_daily_job.run_check处理异常：{stock[1]}代码{e}")
+        data = cpl.map_stocks(rate.get_rates, data_all, backtest_column, len(backtest_column) - 1, keys=stocks,
+                              data_key=lambda stock: (date, stock[1], stock[2]))
     except Exception as e:
         logging.error(f"backtest_data_daily_job.run_check处理异常：{e}")
     if not data:
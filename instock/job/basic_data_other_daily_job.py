@@ -43,141 +43,86 @@ def save_nph_stock_top_data(date, before=True):
     stock_spot_buy(date)
 
 
-# 每日股票资金流向
+# 每日股票、行业、概念资金流向：全部时间段的排行一起并发下载，下载时间约等于一次请求，限速由 http_client 按主机控制。
 def save_nph_stock_fund_flow_data(date, before=True):
     if before:
         return
 
     try:
-        times = tuple(range(4))
-        results = run_check_stock_fund_flow(times)
+        results = run_check_fund_flow()
         if results is None:
             return
 
-        for t in times:
-            if t == 0:
-                data = results.get(t)
-            else:
-                r = results.get(t)
-                if r is not None:
-                    r.drop(columns=['name', 'new_price'], inplace=True)
-                    data = pd.merge(data, r, on=['code'], how='left')
+        times = tuple(range(len(tbs.CN_STOCK_FUND_FLOW)))
+        data = join_fund_flow([results.get(('stock', t)) for t in times], 'code', ['name', 'new_price'])
+        save_fund_flow(date, data, tbs.TABLE_CN_STOCK_FUND_FLOW, "`date`,`code`")
 
-        if data is None or len(data.index) == 0:
-            return
-
-        data.insert(0, 'date', date.strftime("%Y-%m-%d"))
-
-        table_name = tbs.TABLE_CN_STOCK_FUND_FLOW['name']
-        # 删除老数据。
-        if mdb.checkTableIsExist(table_name):
-            del_sql = f"DELETE FROM `{table_name}` where `date` = '{date}'"
-            mdb.executeSql(del_sql)
-            cols_type = None
-        else:
-            cols_type = tbs.get_field_types(tbs.TABLE_CN_STOCK_FUND_FLOW['columns'])
-
-        mdb.insert_db_from_df(data, table_name, cols_type, False, "`date`,`code`")
+        times = tuple(range(len(tbs.CN_STOCK_SECTOR_FUND_FLOW[1])))
+        for index_sector, tbs_table in ((0, tbs.TABLE_CN_STOCK_FUND_FLOW_INDUSTRY),
+                                        (1, tbs.TABLE_CN_STOCK_FUND_FLOW_CONCEPT)):
+            data = join_fund_flow([results.get((index_sector, t)) for t in times], 'name')
+            save_fund_flow(date, data, tbs_table, "`date`,`name`")
     except Exception as e:
         logging.error(f"basic_data_other_daily_job.save_nph_stock_fund_flow_data处理异常：{e}")
 
 
-def run_check_stock_fund_flow(times):
+# 并发下载股票和行业、概念各时间段的资金流向排行，key 为 ('stock', 时间段) 或者 (板块类型, 时间段)
+def run_check_fund_flow():
+    tasks = {('stock', t): (stf.fetch_stocks_fund_flow, t) for t in range(len(tbs.CN_STOCK_FUND_FLOW))}
+    for index_sector in range(len(tbs.CN_STOCK_SECTOR_FUND_FLOW[0])):
+        for t in range(len(tbs.CN_STOCK_SECTOR_FUND_FLOW[1])):
+            tasks[(index_sector, t)] = (stf.fetch_stocks_sector_fund_flow, index_sector, t)
     data = {}
     try:
-        for k in times :
-            _data = stf.fetch_stocks_fund_flow(k)
-            if _data is not None:
-                data[k] = _data
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(tasks)) as executor:
+            future_to_data = {executor.submit(*v): k for k, v in tasks.items()}
+            for future in concurrent.futures.as_completed(future_to_data):
+                _key = future_to_data[future]
+                try:
+                    _data_ = future.result()
+                    if _data_ is not None:
+                        data[_key] = _data_
+                except Exception as e:
+                    logging.error(f"basic_data_other_daily_job.run_check_fund_flow处理异常：{_key}{e}")
     except Exception as e:
-        logging.error(f"basic_data_other_daily_job.run_check_stock_fund_flow处理异常：{e}")
-    # try:
-    #     with concurrent.futures.ThreadPoolExecutor(max_workers=len(times)) as executor:
-    #         future_to_data = {executor.submit(stf.fetch_stocks_fund_flow, k): k for k in times}
-    #         for future in concurrent.futures.as_completed(future_to_data):
-    #             _time = future_to_data[future]
-    #             try:
-    #                 _data_ = future.result()
-    #                 if _data_ is not None:
-    #                     data[_time] = _data_
-    #             except Exception as e:
-    #                 logging.error(f"basic_data_other_daily_job.run_check_stock_fund_flow处理异常：代码{e}")
-    # except Exception as e:
-    #     logging.error(f"basic_data_other_daily_job.run_check_stock_fund_flow处理异常：{e}")
+        logging.error(f"basic_data_other_daily_job.run_check_fund_flow处理异常：{e}")
     if not data:
         return None
     else:
         return data
 
 
-# 每日行业资金流向
-def save_nph_stock_sector_fund_flow_data(date, before=True):
-    if before:
+# 各时间段的排行按 key 对齐，一次 join 合并，第一个时间段是主表，其他时间段去掉 drop 列。
+def join_fund_flow(frames, key, drop=()):
+    if not frames or frames[0] is None:
+        return None
+    base = frames[0].drop_duplicates(key, keep='last').set_index(key)
+    others = [f.drop(columns=list(drop)).drop_duplicates(key, keep='last').set_index(key)
+              for f in frames[1:] if f is not None]
+    columns = list(frames[0].columns)
+    for f in others:
+        columns.extend(f.columns)
+    if others:
+        base = base.join(others, how='left')
+    return base.reset_index()[columns]
+
+
+def save_fund_flow(date, data, tbs_table, primary_keys):
+    if data is None or len(data.index) == 0:
         return
 
-    # times = tuple(range(2))
-    # with concurrent.futures.ThreadPoolExecutor(max_workers=len(times)) as executor:
-    #     {executor.submit(stock_sector_fund_flow_data, date, k): k for k in times}
-    stock_sector_fund_flow_data(date, 0)
-    stock_sector_fund_flow_data(date, 1)
+    data.insert(0, 'date', date.strftime("%Y-%m-%d"))
 
-def stock_sector_fund_flow_data(date, index_sector):
-    try:
-        times = tuple(range(3))
-        results = run_check_stock_sector_fund_flow(index_sector, times)
-        if results is None:
-            return
-
-        for t in times:
-            if t == 0:
-                data = results.get(t)
-            else:
-                r = results.get(t)
-                if r is not None:
-                    data = pd.merge(data, r, on=['name'], how='left')
-
-        if data is None or len(data.index) == 0:
-            return
-
-        data.insert(0, 'date', date.strftime("%Y-%m-%d"))
-
-        if index_sector == 0:
-            tbs_table = tbs.TABLE_CN_STOCK_FUND_FLOW_INDUSTRY
-        else:
-            tbs_table = tbs.TABLE_CN_STOCK_FUND_FLOW_CONCEPT
-        table_name = tbs_table['name']
-        # 删除老数据。
-        if mdb.checkTableIsExist(table_name):
-            del_sql = f"DELETE FROM `{table_name}` where `date` = '{date}'"
-            mdb.executeSql(del_sql)
-            cols_type = None
-        else:
-            cols_type = tbs.get_field_types(tbs_table['columns'])
-
-        mdb.insert_db_from_df(data, table_name, cols_type, False, "`date`,`name`")
-    except Exception as e:
-        logging.error(f"basic_data_other_daily_job.stock_sector_fund_flow_data处理异常：{e}")
-
-
-def run_check_stock_sector_fund_flow(index_sector, times):
-    data = {}
-    try:
-        with concurrent.futures.ThreadPoolExecutor(max_workers=len(times)) as executor:
-            future_to_data = {executor.submit(stf.fetch_stocks_sector_fund_flow, index_sector, k): k for k in times}
-            for future in concurrent.futures.as_completed(future_to_data):
-                _time = future_to_data[future]
-                try:
-                    _data_ = future.result()
-                    if _data_ is not None:
-                        data[_time] = _data_
-                except Exception as e:
-                    logging.error(f"basic_data_other_daily_job.run_check_stock_sector_fund_flow处理异常：代码{e}")
-    except Exception as e:
-        logging.error(f"basic_data_other_daily_job.run_check_stock_sector_fund_flow处理异常：{e}")
-    if not data:
-        return None
+    table_name = tbs_table['name']
+    # 删除老数据。
+    if mdb.checkTableIsExist(table_name):
+        del_sql = f"DELETE FROM `{table_name}` where `date` = '{date}'"
+        mdb.executeSql(del_sql)
+        cols_type = None
     else:
-        return data
+        cols_type = tbs.get_field_types(tbs_table['columns'])
+
+    mdb.insert_db_from_df(data, table_name, cols_type, False, primary_keys)
 
 
 # 每日股票分红配送
@@ -236,7 +181,6 @@ def main():
     # runt.run_with_args(save_nph_stock_bonus)
     # 暂时不需要上面2个数据
     runt.run_with_args(save_nph_stock_fund_flow_data)
-    runt.run_with_args(save_nph_stock_sector_fund_flow_data)
 
 
 # main函数入口
@@ -27,6 +27,7 @@ import backtest_data_daily_job as bdj
 # import klinepattern_data_daily_job as kdj
 import selection_data_daily_job as sddj
 import strategy_merge_job as mergejb
+import hist_cache_manage_job as hcmj
 
 __author__ = 'myh '
 __date__ = '2023/3/10 '
@@ -112,6 +113,12 @@ def main():
     acdj.main()
     print_step_info("第7步：创建股票闭盘后才有的数据", step_start)
 
+    # 第8步：历史数据缓存淘汰和统计
+    step_start = time.time()
+    logging.info("######## 开始第8步：历史数据缓存淘汰和统计 #######")
+    hcmj.main()
+    print_step_info("第8步：历史数据缓存淘汰和统计", step_start)
+
     logging.info("######## 完成所有任务, 总耗时: %.2f 秒 #######" % (time.time() - start))
 
     # 完成以后,将日志读取发送到邮件
@@ -0,0 +1,37 @@
+#!/usr/local/bin/python3
+# -*- coding: utf-8 -*-
+
+import logging
+import os.path
+import sys
+
+cpath_current = os.path.dirname(os.path.dirname(__file__))
+cpath = os.path.abspath(os.path.join(cpath_current, os.pardir))
+sys.path.append(cpath)
+import instock.core.storage.hist_store as hst
+import instock.core.storage.hist_cache as hcm
+import instock.core.crawling.http_cache as hcc
+
+__author__ = 'myh '
+__date__ = '2026/10/18 '
+
+
+# 历史数据缓存维护：校验缓存文件，删除旧版的按日期缓存，按容量和天数淘汰，压缩清单，删除过期的响应缓存，输出缓存统计。
+# 每日作业(execute_daily_job 第8步)只按清单检查文件大小，full=True 时读取全部缓存文件检查crc32，由每月任务执行：
+# python hist_cache_manage_job.py --full
+def main(full=False):
+    try:
+        hst.validate(full=full)
+        hcm.remove_legacy()
+        hcm.evict()
+        hst.compact_manifest()
+        hcc.evict()
+    except Exception as e:
+        logging.error(f"hist_cache_manage_job.main处理异常：{e}")
+    hcm.log_stats()
+    hcc.log_stats()
+
+
+# main函数入口
+if __name__ == '__main__':
+    main(full='--full' in sys.argv[1:])
@@ -0,0 +1,62 @@
+#!/usr/local/bin/python3
+# -*- coding: utf-8 -*-
+
+import logging
+import concurrent.futures
+import os.path
+import sys
+import time
+
+cpath_current = os.path.dirname(os.path.dirname(__file__))
+cpath = os.path.abspath(os.path.join(cpath_current, os.pardir))
+sys.path.append(cpath)
+import instock.lib.trade_time as trd
+import instock.core.stockfetch as stf
+import instock.core.storage.hist_store as hst
+
+__author__ = 'myh '
+__date__ = '2026/10/18 '
+
+
+# 历史数据缓存预热：夜间或开盘前运行，按下一个交易日需要的开始日期提前下载并校验历史数据，
+# 收盘后的作业只需要下载当天一根K线。成交额大的股票先下载；缓存清单记录了每只股票同步到的交易日，
+# 中断后重新运行会跳过已经同步的股票。
+def prepare(workers=9):
+    run_date, run_date_nph = trd.get_trade_date_last()
+    next_date = trd.get_next_trade_date(run_date)
+    date_start, is_cache = trd.get_trade_hist_interval(next_date.strftime("%Y-%m-%d"))
+
+    hst.validate(full=True)
+    stocks = stf.fetch_stocks(run_date)
+    if stocks is None:
+        return
+    codes = stocks.sort_values(by='deal_amount', ascending=False, na_position='last')['code'].tolist()
+    todo = [code for code in codes if not hst.is_synced(code, date_start)]
+    logging.info(f"hist_cache_warmup_job.prepare预热{next_date}：共{len(codes)}只，需要下载{len(todo)}只")
+
+    start = time.time()
+    done = 0
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            future_to_code = {executor.submit(hst.fetch_hist, code, date_start): code for code in todo}
+            for future in concurrent.futures.as_completed(future_to_code):
+                code = future_to_code[future]
+                try:
+                    future.result()
+                except Exception as e:
+                    logging.error(f"hist_cache_warmup_job.prepare处理异常：{code}代码{e}")
+                done += 1
+                if done % 500 == 0:
+                    logging.info(f"hist_cache_warmup_job.prepare进度：{done}/{len(todo)}，耗时{time.time() - start:.0f}秒")
+    except Exception as e:
+        logging.error(f"hist_cache_warmup_job.prepare处理异常：{e}")
+    logging.info(f"hist_cache_warmup_job.prepare完成：{done}只，耗时{time.time() - start:.0f}秒")
+
+
+def main():
+    prepare()
+
+
+# main函数入口
+if __name__ == '__main__':
+    main()
@@ -3,7 +3,6 @@
 
 
 import logging
-import concurrent.futures
 import pandas as pd
 import os.path
 import sys
@@ -14,7 +13,7 @@ sys.path.append(cpath)
 import instock.lib.run_template as runt
 import instock.core.tablestructure as tbs
 import instock.lib.database as mdb
-import instock.core.indicator.calculate_indicator as idr
+import instock.core.indicator.panel_indicator as pid
 from instock.core.singleton_stock import stock_hist_data
 
 __author__ = 'myh '
@@ -48,33 +47,25 @@ def prepare(date):
 
         data = pd.merge(dataKey, dataVal, on=['code'], how='left')
         # data.set_index('code', inplace=True)
-        # 单例，时间段循环必须改时间
-        date_str = date.strftime("%Y-%m-%d")
-        if date.strftime("%Y-%m-%d") != data.iloc[0]['date']:
-            data['date'] = date_str
         mdb.insert_db_from_df(data, table_name, cols_type, False, "`date`,`code`")
 
     except Exception as e:
         logging.error(f"indicators_data_daily_job.prepare处理异常：{e}")
 
 
-def run_check(stocks, date=None, workers=9):
-    data = {}
+def run_check(stocks, date=None):
     columns = list(tbs.STOCK_STATS_DATA['columns'])
     columns.insert(0, 'code')
     columns.insert(0, 'date')
     data_column = columns
+    data = {}
     try:
-        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
-            future_to_data = {executor.submit(idr.get_indicator, k, stocks[k], data_column, date=date): k for k in stocks}
-            for future in concurrent.futures.as_completed(future_to_data):
-                stock = future_to_data[future]
-                try:
-                    _data_ = future.result()
-                    if _data_ is not None:
-                        data[stock] = _data_
-                except Exception as e:
-                    logging.error(f"indicators_data_daily_job.run_check处理异常：{stock[1]}代码{e}")
+        if pid.incremental:
+            # 从前一个交易日的计算状态继续计算，pid.ORIGIN_COLUMNS 的指标和90行窗口计算的结果不同
+            data = pid.get_indicator_data_incremental(stocks, data_column, date=date)
+        else:
+            # 全部股票按日期矩阵一次计算，结果和逐只股票 calculate_indicator.get_indicator 相同
+            data = pid.get_indicator_data(stocks, data_column, date=date)
     except Exception as e:
         logging.error(f"indicators_data_daily_job.run_check处理异常：{e}")
     if not data:
@@ -13,6 +13,7 @@ sys.path.append(cpath)
 import instock.lib.run_template as runt
 import instock.core.tablestructure as tbs
 import instock.lib.database as mdb
+import instock.lib.compute_pool as cpl
 from instock.core.singleton_stock import stock_hist_data
 from instock.core.stockfetch import fetch_stock_top_entity_data
 
@@ -44,17 +45,13 @@ def prepare(date, strategy):
         data.columns = columns
         _columns_backtest = tuple(tbs.TABLE_CN_STOCK_BACKTEST_DATA['columns'])
         data = pd.concat([data, pd.DataFrame(columns=_columns_backtest)])
-        # 单例，时间段循环必须改时间
-        date_str = date.strftime("%Y-%m-%d")
-        if date.strftime("%Y-%m-%d") != data.iloc[0]['date']:
-            data['date'] = date_str
         mdb.insert_db_from_df(data, table_name, cols_type, False, "`date`,`code`")
 
     except Exception as e:
         logging.error(f"strategy_data_daily_job.prepare处理异常：{strategy}策略{e}")
 
 
-def run_check(strategy_fun, table_name, stocks, date, workers=9):
+def run_check(strategy_fun, table_name, stocks, date):
     is_check_high_tight = False
     if strategy_fun.__name__ == 'check_high_tight':
         stock_tops = fetch_stock_top_entity_data(date)
@@ -62,18 +59,13 @@ def run_check(strategy_fun, table_name, stocks, date, workers=9):
             is_check_high_tight = True
     data = []
     try:
-        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
-            if is_check_high_tight:
-                future_to_data = {executor.submit(strategy_fun, k, stocks[k], date=date, istop=(k[1] in stock_tops)): k for k in stocks}
-            else:
-                future_to_data = {executor.submit(strategy_fun, k, stocks[k], date=date): k for k in stocks}
-            for future in concurrent.futures.as_completed(future_to_data):
-                stock = future_to_data[future]
-                try:
-                    if future.result():
-                        data.append(stock)
-                except Exception as e:
-                    logging.error(f"strategy_data_daily_job.run_check处理异常：{stock[1]}代码{e}策略{table_name}")
+        if is_check_high_tight:
+            # 高而窄的旗形只检查龙虎榜上的股票，其他股票不用读取历史数据
+            results = cpl.map_stocks(strategy_fun, stocks, keys=[k for k in stocks if k[1] in stock_tops],
+                                     date=date, istop=True)
+        else:
+            results = cpl.map_stocks(strategy_fun, stocks, date=date)
+        data = [stock for stock, result in results.items() if result]
     except Exception as e:
         logging.error(f"strategy_data_daily_job.run_check处理异常：{e}策略{table_name}")
     if not data:
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import math
+import logging
+import threading
+import multiprocessing
+import concurrent.futures
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
+import pandas as pd
+import instock.core.storage.hist_panel as hpl
+
+__author__ = 'myh '
+__date__ = '2026/10/18 '
+
+# 指标、K线形态、策略、回归测试按股票循环计算，都是 pandas/talib 的 CPU 计算，线程池受 GIL 限制只能用到一个核。
+# 这里用共用的进程池，把股票分成多块交给子进程计算：
+#   历史数据只把每块的子集传给子进程，面板数据(PanelHistData)只传面板路径和股票列表，子进程内存映射读取，
+#   按需读取的数据(LazyHistData)在子进程里从本地缓存读取，只有普通字典才会复制 DataFrame。
+#   子进程不下载数据：http_client 按主机限流是每个进程各自计数的，几个子进程同时下载合起来会超过限制，
+#   分块前由当前进程调用 data.share 把要用的股票下载到本地缓存，盘中不写缓存时在当前进程读取。
+#   普通字典(盘中的数据)先保存成临时面板，子进程和面板数据一样只收到面板路径和股票列表。
+#   每块的 pd.Series 结果按列打包返回，父进程再按原来的类型拆成每只股票的结果。
+# 可以用环境变量 compute_workers 设置进程数，设置为 1 时在当前进程里计算。
+workers = os.cpu_count() or 1
+_env = os.environ.get('compute_workers')
+if _env is not None:
+    workers = int(_env)
+
+# 每个进程分到的块数，块越多负载越均衡，传输和调度的开销也越多
+chunks_per_worker = 4
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # 作业进程里已经有线程池在运行，fork 会复制其他线程持有的锁，使用 forkserver
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+            _executor = concurrent.futures.ProcessPoolExecutor(max_workers=workers, mp_context=context)
+        return _executor
+
+
+def _reset_executor(executor):
+    global _executor
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+# 取历史数据的子集，传给子进程
+def get_subset(data, keys):
+    subset = getattr(data, 'subset', None)
+    if subset is not None:
+        return subset(keys)
+    return {k: data[k] for k in keys if k in data}
+
+
+# 每块的结果都是索引相同的 pd.Series 时按列打包：布尔、整数、浮点数的列打包成 numpy 数组，序列化时整块复制，
+# 其他列(字符串、日期、混合类型等)保留列表。同时记录每个 Series 的类型，拆开时还原。
+def _pack(keys, results):
+    series = [r for r in results if r is not None]
+    if series and all(isinstance(r, pd.Series) for r in series):
+        index = series[0].index
+        if len(index) > 0 and all(r.index.equals(index) for r in series):
+            keys = [k for k, r in zip(keys, results) if r is not None]
+            rows = [r.tolist() for r in series]
+            columns = [_pack_column([row[i] for row in rows]) for i in range(len(index))]
+            return keys, (list(index), columns, [r.dtype for r in series])
+    return keys, results
+
+
+def _pack_column(values):
+    if all(isinstance(v, (bool, np.bool_)) for v in values):
+        return np.array(values, dtype=bool)
+    if all(isinstance(v, (int, np.integer)) and not isinstance(v, (bool, np.bool_)) for v in values):
+        try:
+            return np.array(values, dtype=np.int64)
+        except OverflowError:
+            return values
+    if all(isinstance(v, (float, np.floating)) for v in values):
+        return np.array(values, dtype=np.float64)
+    return values
+
+
+# 数值类型的 Series 从按列的数组合成的矩阵取一行，不生成 Python 对象；object 类型的按行还原。
+def _unpack(keys, packed, data):
+    if isinstance(packed, tuple):
+        index, columns, dtypes = packed
+        matrix = None
+        if all(isinstance(c, np.ndarray) for c in columns):
+            matrix = np.column_stack(columns)
+        rows = None
+        for i, (key, dtype) in enumerate(zip(keys, dtypes)):
+            if matrix is not None and dtype != object:
+                data[key] = pd.Series(matrix[i].astype(dtype, copy=False), index=index)
+                continue
+            if rows is None:
+                rows = list(zip(*[c.tolist() if isinstance(c, np.ndarray) else c for c in columns]))
+            data[key] = pd.Series(list(rows[i]), index=index, dtype=dtype)
+    else:
+        for key, result in zip(keys, packed):
+            if result is not None:
+                data[key] = result
+
+
+def _run_chunk(fun, data, items, args, kwargs):
+    prefetch = getattr(data, 'prefetch', None)
+    if prefetch is not None:
+        prefetch([data_key for _, data_key in items])
+    keys = []
+    results = []
+    for key, data_key in items:
+        try:
+            result = fun(key, data.get(data_key), *args, **kwargs)
+        except Exception as e:
+            logging.error(f"compute_pool.{fun.__name__}处理异常：{key[1]}代码{e}")
+            result = None
+        keys.append(key)
+        results.append(result)
+    return _pack(keys, results)
+
+
+# 对每只股票计算 fun(股票, 历史数据, *args, **kwargs)，返回 {股票: 结果}，结果为 None 的不返回。
+# keys 默认是历史数据的全部股票；data_key 把股票转换成历史数据的 key，比如回归测试用记录的日期。
+# fun 和参数要能传给子进程，即模块级的函数。
+def map_stocks(fun, data, *args, keys=None, data_key=None, **kwargs):
+    if keys is None:
+        keys = list(data)
+    items = [(k, k if data_key is None else data_key(k)) for k in keys]
+    result = {}
+    if not items:
+        return result
+    if workers <= 1:
+        _unpack(*_run_chunk(fun, data, items, args, kwargs), result)
+        return result
+
+    share = getattr(data, 'share', None)
+    if share is not None:
+        data = share([data_key for _, data_key in items])
+    if isinstance(data, dict):
+        with hpl.temp_panel(data) as panel_data:
+            return _map_pool(fun, data if panel_data is None else panel_data, items, args, kwargs)
+    return _map_pool(fun, data, items, args, kwargs)
+
+
+def _map_pool(fun, data, items, args, kwargs):
+    result = {}
+    size = math.ceil(len(items) / (workers * chunks_per_worker))
+    chunks = [items[i:i + size] for i in range(0, len(items), size)]
+    executor = _get_executor()
+    try:
+        futures = {executor.submit(_run_chunk, fun, get_subset(data, [dk for _, dk in chunk]), chunk, args, kwargs):
+                   chunk for chunk in chunks}
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                _unpack(*future.result(), result)
+            except BrokenProcessPool:
+                raise
+            except Exception as e:
+                logging.error(f"compute_pool.map_stocks处理异常：{fun.__name__}{e}")
+    except BrokenProcessPool as e:
+        # 子进程异常退出，例如内存不足被杀掉，在当前进程里重新计算
+        logging.error(f"compute_pool.map_stocks处理异常：{fun.__name__}进程池{e}")
+        _reset_executor(executor)
+        result = {}
+        _unpack(*_run_chunk(fun, data, items, args, kwargs), result)
+    return result
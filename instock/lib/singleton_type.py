@@ -1,8 +1,13 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-
-from threading import RLock
+import os
+import sys
+import logging
+from collections import OrderedDict
+from concurrent.futures import Future
+from threading import RLock, Lock
+import pandas as pd
 
 
 __author__ = 'myh '
@@ -18,3 +23,81 @@ class singleton_type(type):
                 cls._instance = super(singleton_type, cls).__call__(*args, **kwargs)  # 创建cls的对象
 
         return cls._instance
+
+
+# 按 key 缓存的单例：类定义 cache_key(*args, **kwargs) 返回 key，同一个 key 的对象只创建一次。
+# 多个线程同时取同一个 key 时只有一个线程创建，其他线程等待同一个结果；不同 key 之间互不等待。
+# 对象数据总大小超过 max_bytes 时淘汰最久没有使用的对象，最近使用的一个总是保留。
+# 区间作业每个日期各自创建对象，不再沿用第一个日期的数据。
+max_bytes = 4 * 1024 * 1024 * 1024
+_max_bytes = os.environ.get('singleton_max_bytes')
+if _max_bytes is not None:
+    max_bytes = int(_max_bytes)
+
+
+# 估算对象数据占用的内存。按需生成数据的对象(LazyHistData、PanelHistData)用 nbytes 返回已经生成的数据大小，
+# 内存映射的面板文件不计算。
+def get_size(data):
+    if data is None:
+        return 0
+    if isinstance(data, pd.DataFrame):
+        return int(data.memory_usage(index=True, deep=False).sum())
+    if type(data) is dict:
+        return sum(get_size(v) for v in data.values())
+    nbytes = getattr(data, 'nbytes', None)
+    if isinstance(nbytes, int):
+        return nbytes
+    return sys.getsizeof(data)
+
+
+class keyed_singleton_type(type):
+    def __init__(cls, name, bases, attrs):
+        super(keyed_singleton_type, cls).__init__(name, bases, attrs)
+        cls._lock = Lock()
+        cls._instances = OrderedDict()  # key -> 对象，按使用顺序
+        cls._pending = {}  # key -> Future，正在创建的对象
+
+    def __call__(cls, *args, **kwargs):
+        key = cls.cache_key(*args, **kwargs)
+        with cls._lock:
+            instance = cls._instances.get(key)
+            if instance is not None:
+                cls._instances.move_to_end(key)
+                return instance
+            future = cls._pending.get(key)
+            owner = future is None
+            if owner:
+                future = cls._pending[key] = Future()
+        if not owner:
+            return future.result()
+
+        try:
+            instance = super(keyed_singleton_type, cls).__call__(*args, **kwargs)
+        except BaseException as e:
+            with cls._lock:
+                del cls._pending[key]
+            future.set_exception(e)
+            raise
+        with cls._lock:
+            del cls._pending[key]
+            cls._instances[key] = instance
+            cls._evict()
+        future.set_result(instance)
+        return instance
+
+    # 按需读取的数据创建后还会增加，每次淘汰时重新计算大小。
+    def _evict(cls):
+        sizes = {key: get_size(getattr(instance, 'data', None)) for key, instance in cls._instances.items()}
+        total = sum(sizes.values())
+        while total > max_bytes and len(cls._instances) > 1:
+            key, _ = cls._instances.popitem(last=False)
+            total -= sizes[key]
+            logging.info(f"{cls.__name__}淘汰缓存：{str(key)[:100]}")
+
+    # 删除缓存的对象，key 为 None 时全部删除。
+    def clear(cls, key=None):
+        with cls._lock:
+            if key is None:
+                cls._instances.clear()
+            else:
+                cls._instances.pop(key, None)